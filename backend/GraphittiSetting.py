@@ -1,16 +1,23 @@
+import asyncio
+from collections import Counter
 from datetime import datetime
-import json
+import time
+from typing import AsyncIterator, Iterable, List, Optional, Tuple, Union
 from graphiti_core import Graphiti
-
-# from graphiti.graphiti_core.nodes import EpisodeType
-# from graphiti.graphiti_core.utils.bulk_utils import RawEpisode
-from graphiti_core.nodes import EntityNode
-from graphiti_core.edges import EntityEdge
+from graphiti_core.driver.driver import GraphDriver
+from graphiti_core.driver.neo4j_driver import Neo4jDriver
+from neo4j import AsyncGraphDatabase
+
+from graphiti_core.llm_client.errors import RateLimitError
+from graphiti_core.nodes import EntityNode, EpisodeType, create_entity_node_embeddings
+from graphiti_core.edges import EntityEdge, create_entity_edge_embeddings
+from graphiti_core.utils.bulk_utils import add_nodes_and_edges_bulk
 import uuid
 
 from models import (
     Agente,
     Cliente,
+    CumplioPromesa,
     DataSetInteracciones,
     IncumplioPromesa,
     Interaccion,
@@ -20,91 +27,258 @@ from models import (
     RealizoPago,
     RenegocioPlan,
 )
-from config import NEO4J_PASSWORD, NEO4J_URI, NEO4J_USERNAME
+from config import (
+    EMBEDDER,
+    EMBEDDINGS_CACHE,
+    EMBEDDINGS_CACHE_ENTRADAS,
+    LLM,
+    NEO4J_CONEXIONES_CALENTAMIENTO,
+    NEO4J_MAX_POOL_SIZE,
+    NEO4J_PASSWORD,
+    NEO4J_TIMEOUT_ADQUISICION,
+    NEO4J_URI,
+    NEO4J_USERNAME,
+    validar_config,
+)
+from services.construccion_grafo import (
+    ETIQUETAS_COMPARTIDAS,
+    ConstructorGrafo,
+    Registro,
+    Triplete,
+    clave_cliente,
+    entidad_registro,
+    etiqueta_registro,
+    registros_de,
+)
+from services.bitacora import Bitacora
+from services.embeddings import crear_embedder
+from services.episodios import Episodio, agrupar_episodios
+from services.ingesta_incremental import FiltroIncremental, Watermark
+from services.ingesta_particionada import ConstruccionParticionada, Elemento
+from services.metricas import ESCRITURAS_EN_CURSO, ETAPA_SEGUNDOS, REGISTROS
+from services.promesas import ResultadoPromesa
+from services.saldos import MotorSaldos
+from services.llm_local import LLMLocal
+from services.planificador_escritura import ERRORES_TRANSITORIOS, PlanificadorEscritura
+
+GRUPO_CARGA = "carga_2.0"
+
+# Tipos que Graphiti usa para clasificar lo que extrae de los episodios
+TIPOS_ENTIDAD = {
+    "Cliente": Cliente,
+    "Interaccion": Interaccion,
+    "Agente": Agente,
+    "NuevoPlanPago": NuevoPlanPago,
+    "PromesaPago": PromesaPago,
+}
+TIPOS_ARISTA = {
+    "InteractuoCon": InteractuoCon,
+    "PromesaPago": PromesaPago,
+    "RealizoPago": RealizoPago,
+    "RenegocioPlan": RenegocioPlan,
+    "IncumplioPromesa": IncumplioPromesa,
+    "CumplioPromesa": CumplioPromesa,
+}
+MAPA_ARISTAS = {
+    ("Agente", "Cliente"): ["InteractuoCon"],
+    ("Cliente", "PromesaPago"): ["PromesaPago"],
+    ("Cliente", "Pago"): ["RealizoPago"],
+    ("Cliente", "Deuda"): ["RenegocioPlan"],
+    ("PromesaPago", "Pago"): [
+        "IncumplioPromesa",  # Si el pago no se realizó a tiempo
+        "CumplioPromesa",  # Si el pago llegó antes de fecha_promesa
+    ],
+}
+
+
+async def _elementos_locales(
+    construidos: Iterable[Tuple[Registro, List[Triplete]]]
+) -> AsyncIterator[Elemento]:
+    # Mismo formato que entregan las particiones: (registro, nodos, aristas)
+    for registro, tripletes in construidos:
+        if not tripletes:
+            yield registro, None, None
+            continue
+        nodos = [nodo for origen, _, destino in tripletes for nodo in (origen, destino)]
+        yield registro, nodos, [arista for _, arista, _ in tripletes]
+
+
+class DriverNeo4j(Neo4jDriver):
+    """`Neo4jDriver` con el tamaño del pool y el timeout de adquisición
+    configurables (el de graphiti_core usa los valores por defecto)."""
+
+    def __init__(
+        self,
+        uri: str,
+        user: Optional[str],
+        password: Optional[str],
+        max_pool_size: int,
+        timeout_adquisicion: float,
+        database: str = "neo4j",
+    ):
+        GraphDriver.__init__(self)
+        self.client = AsyncGraphDatabase.driver(
+            uri=uri,
+            auth=(user or "", password or ""),
+            max_connection_pool_size=max_pool_size,
+            connection_acquisition_timeout=timeout_adquisicion,
+        )
+        self._database = database
 
 
 class GraphittiSetting:
-    def __init__(self):
-        self.graphiti = Graphiti(
-            uri=NEO4J_URI,
-            user=NEO4J_USERNAME,
-            password=NEO4J_PASSWORD,
-        )
+    def __init__(
+        self,
+        max_pool_size: int = NEO4J_MAX_POOL_SIZE,
+        timeout_adquisicion: float = NEO4J_TIMEOUT_ADQUISICION,
+        saldos: Optional[MotorSaldos] = None,
+        graphiti: Optional[Graphiti] = None,
+    ):
+        self.max_pool_size = max_pool_size
+        self.timeout_adquisicion = timeout_adquisicion
+        # `graphiti` permite inyectar otra implementación (p. ej. el escritor en
+        # memoria de los benchmarks); si no, se conecta a Neo4j
+        if graphiti is None:
+            validar_config()
+            graphiti = Graphiti(
+                graph_driver=DriverNeo4j(
+                    NEO4J_URI,
+                    NEO4J_USERNAME,
+                    NEO4J_PASSWORD,
+                    max_pool_size=max_pool_size,
+                    timeout_adquisicion=timeout_adquisicion,
+                ),
+                llm_client=LLMLocal() if LLM == "local" else None,
+                embedder=crear_embedder(EMBEDDER, EMBEDDINGS_CACHE, EMBEDDINGS_CACHE_ENTRADAS),
+            )
+        self.graphiti = graphiti
+        self.observadores = []
+        # Saldos en el tiempo: se alimenta con la lectura completa (ver main.py)
+        # o registrándolo como observador
+        self.saldos = saldos if saldos is not None else MotorSaldos()
+        # Generación de ingesta: sube con cada escritura para invalidar las
+        # respuestas cacheadas de la API
+        self.generacion = 0
+
+    async def iniciar(
+        self, conexiones: int = NEO4J_CONEXIONES_CALENTAMIENTO, timeout: float = 10.0
+    ):
+        """Calienta el pool abriendo `conexiones` conexiones antes de recibir
+        tráfico. Si Neo4j no responde se avisa y se sigue: `salud()` lo reporta."""
+        conexiones = max(1, min(conexiones, self.max_pool_size))
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(
+                    *(self.graphiti.driver.execute_query("RETURN 1") for _ in range(conexiones))
+                ),
+                timeout,
+            )
+        except Exception as e:
+            print(f"[WARN] No se pudo calentar el pool de Neo4j: {str(e) or type(e).__name__}")
+
+    async def cerrar(self):
+        await self.graphiti.close()
+        cerrar_embedder = getattr(self.graphiti.embedder, "cerrar", None)
+        if cerrar_embedder is not None:
+            cerrar_embedder()
+
+    async def salud(self, timeout: float = 2.0) -> dict:
+        inicio = time.perf_counter()
+        try:
+            await asyncio.wait_for(self.graphiti.driver.execute_query("RETURN 1"), timeout)
+        except Exception as e:
+            return {"neo4j": "error", "detalle": str(e) or type(e).__name__}
+        return {
+            "neo4j": "ok",
+            "latencia_ms": (time.perf_counter() - inicio) * 1e3,
+            "max_pool_size": self.max_pool_size,
+            "timeout_adquisicion": self.timeout_adquisicion,
+        }
 
-    async def cargar_datos(self, data: DataSetInteracciones, auto_extract=True):
+    def registrar_observador(self, observador):
+        """Registra un objeto con método `aplicar_lote(registros)` que recibe los
+        clientes e interacciones ya escritos en el grafo (KPIs, índices, etc.)."""
+        self.observadores.append(observador)
+
+    def _notificar(self, registros):
+        self.saldos.marcar(registros)
+        for observador in self.observadores:
+            observador.aplicar_lote(registros)
+        self.generacion += 1
+
+    async def cargar_datos(
+        self,
+        data: Union[DataSetInteracciones, Iterable[Registro]],
+        concurrencia: int = 4,
+        max_interacciones: int = 50,
+        max_caracteres: int = 20_000,
+        max_reintentos: int = 3,
+    ):
+        """Carga por episodios: Graphiti extrae entidades y aristas con el LLM.
+
+        En lugar de un único episodio con todo el dataset (que no entra en el
+        contexto del LLM en cuanto los datos crecen), cada cliente se envía en
+        episodios de hasta `max_interacciones` interacciones o `max_caracteres`
+        de JSON (ver `agrupar_episodios`), con el timestamp real como
+        `reference_time`. Hasta `concurrencia` episodios de clientes distintos
+        se procesan a la vez; las partes de un mismo cliente van en orden y
+        cada una recibe la anterior como contexto. Cada episodio se reintenta
+        por separado ante errores transitorios o de rate limit del LLM, y los
+        que fallan se reportan en el resumen sin detener la carga.
+        """
         if not self.graphiti:
             raise RuntimeError("Graphiti no está inicializado")
 
-        entity_types = {
-            "Cliente": Cliente,
-            "Interaccion": Interaccion,
-            "Agente": Agente,
-            "NuevoPlanPago": NuevoPlanPago,
-            "PromesaPago": PromesaPago,
-        }
-        edge_types = {
-            "InteractuoCon": InteractuoCon,
-            "PromesaPago": PromesaPago,
-            "RealizoPago": RealizoPago,
-            "RenegocioPlan": RenegocioPlan,
-            "IncumplioPromesa": IncumplioPromesa,
-        }
-
-        edge_type_map = {
-            ("Agente", "Cliente"): ["InteractuoCon"],
-            ("Cliente", "PromesaPago"): ["PromesaPago"],
-            ("Cliente", "Pago"): ["RealizoPago"],
-            ("Cliente", "Deuda"): ["RenegocioPlan"],
-            ("PromesaPago", "Pago"): [
-                "IncumplioPromesa"
-            ],  # Si el pago no se realizó a tiempo
-        }
-
-        episodio_completo = {
-            "clientes": [c.model_dump() for c in data.clientes],
-            "interacciones": [i.model_dump() for i in data.interacciones],
-        }
-
-        # Si auto_extract=False, Graphiti no llama al LLM y solo crea el episodio
-        await self.graphiti.add_episode(
-            name="Dataset completo",
-            episode_body=json.dumps(episodio_completo, default=str),
-            source_description="Carga completa de clientes, interacciones y metadatos",
-            reference_time=datetime.now(),
-            entity_types=entity_types,
-            edge_types=edge_types,
-            edge_type_map=edge_type_map,
+        anteriores: dict[str, str] = {}
+
+        async def escribir(episodio: Episodio):
+            with ESCRITURAS_EN_CURSO.en_curso(tipo="episodio"):
+                with ETAPA_SEGUNDOS.medir(etapa="escritura_episodio"):
+                    resultado = await self.graphiti.add_episode(
+                        name=episodio.nombre,
+                        episode_body=episodio.cuerpo,
+                        source_description="Cliente e interacciones de cobranza",
+                        reference_time=episodio.reference_time,
+                        source=EpisodeType.json,
+                        group_id=GRUPO_CARGA,
+                        previous_episode_uuids=(
+                            [anteriores[episodio.cliente_id]]
+                            if episodio.cliente_id in anteriores
+                            else []
+                        ),
+                        entity_types=TIPOS_ENTIDAD,
+                        edge_types=TIPOS_ARISTA,
+                        edge_type_map=MAPA_ARISTAS,
+                    )
+            anteriores[episodio.cliente_id] = resultado.episode.uuid
+            for entidad, cantidad in Counter(map(entidad_registro, episodio.registros)).items():
+                REGISTROS.inc(cantidad, etapa="escritura", entidad=entidad, estado="procesado")
+            self._notificar(episodio.registros)
+
+        planificador = PlanificadorEscritura(
+            escribir,
+            concurrencia=concurrencia,
+            tamano_cola=concurrencia * 4,
+            max_reintentos=max_reintentos,
+            errores_transitorios=ERRORES_TRANSITORIOS + (RateLimitError,),
+            describir=lambda episodio: episodio.nombre,
         )
-
-        # bulk_episodes = [
-        #     RawEpisode(
-        #         name=f"Cliente - {cliente.id}",
-        #         content=json.dumps(cliente.model_dump(), default=str),
-        #         source=EpisodeType.json,
-        #         source_description="Información del cliente",
-        #         reference_time=datetime.now(),
-        #     )
-        #     for cliente in data.clientes
-        # ] + [
-        #     RawEpisode(
-        #         name=f"Interacción - {interaccion.id}",
-        #         content=json.dumps(interaccion.model_dump(), default=str),
-        #         source=EpisodeType.json,
-        #         source_description="Información de la interacción",
-        #         reference_time=datetime.now(),
-        #     )
-        #     for interaccion in data.interacciones
-        # ]
-
-        # # Cargar episodios en Graphiti
-        # await self.graphiti.add_episode_bulk(
-        #     bulk_episodes,
-        #     entity_types=entity_types,
-        #     edge_types=edge_types,
-        #     edge_type_map=edge_type_map,
-        # )
-
-        print("✅ Datos cargados en Graphiti en un solo request")
+        episodios = 0
+        async with planificador:
+            for episodio in agrupar_episodios(data, max_interacciones, max_caracteres):
+                episodios += 1
+                await planificador.enviar(episodio.cliente_id, episodio)
+
+        resumen = {**planificador.resumen(), "episodios": episodios}
+        for episodio, error in planificador.fallidos:
+            for entidad, cantidad in Counter(map(entidad_registro, episodio.registros)).items():
+                REGISTROS.inc(cantidad, etapa="escritura", entidad=entidad, estado="fallido")
+            print(f"[ERROR] {episodio.nombre}: {error}")
+        print(
+            f"✅ Carga por episodios: {resumen['escritos']} de {episodios} episodios, "
+            f"{resumen['reintentos']} reintentos, {resumen['fallidos']} fallidos"
+        )
+        return resumen
 
     async def cargar_datos_triplet(self, data: DataSetInteracciones):
         if not self.graphiti:
@@ -143,226 +317,446 @@ class GraphittiSetting:
             # Agregar el triplete al grafo
             await self.graphiti.add_triplet(agente_node, edge, cliente_node)
 
-    async def cargar_datos_triplet_completo(self, data: DataSetInteracciones):
+    async def cargar_datos_triplet_completo(
+        self,
+        data: Union[DataSetInteracciones, Iterable[Registro]],
+        concurrencia: int = 8,
+        tamano_cola: int = 1000,
+        max_reintentos: int = 5,
+        incremental: bool = False,
+        bitacora: Optional[Bitacora] = None,
+    ):
+        """Carga por tripletes con `concurrencia` escritores en paralelo.
+
+        `data` puede ser el dataset completo o un iterable de registros que se
+        consume a medida que llega (ver `iterar_registros`).
+
+        Los tripletes de cada registro se envían al planificador con el
+        `cliente_id` como clave, así el cliente (POSEE) y sus interacciones se
+        escriben en orden. Los errores transitorios del driver se reintentan con
+        espera exponencial; los registros que agotan los reintentos se reportan
+        en el resumen devuelto.
+
+        Con `incremental=True` solo se escriben las interacciones posteriores al
+        watermark del grupo y los clientes nuevos o modificados.
+
+        Con una `bitacora` cada registro escrito o fallido queda anotado y solo
+        se escriben los que la bitácora indica como pendientes (ver `Bitacora`).
+        """
         if not self.graphiti:
             raise RuntimeError("Graphiti no está inicializado")
-        
-        namespace = "carga_2.0"
-
-        clientes_nodos = {}
-        agentes_nodos = {}
-        deudas_nodos = {}
-
-        for cliente in data.clientes:
-            try:
-                # Nodo Cliente
-                cliente_node = EntityNode(
-                    labels=["CLIENTE"],
-                    name=f"{cliente.nombre}",
-                    uuid=str(uuid.uuid4()),
-                    group_id=namespace,
-                    attributes={
-                        "telefono": cliente.telefono,
-                        "monto_deuda_inicial": cliente.monto_deuda_inicial,
-                        "fecha_prestamo": cliente.fecha_prestamo.isoformat(),
-                        "tipo_deuda": cliente.tipo_deuda,
-                    },
-                    created_at=datetime.now(),
-                )
-                clientes_nodos[cliente.id] = cliente_node
-
-                # await self.graphiti.add_triplet(
-                #     cliente_node, None, None
-                # )  # Triplet mínimo
-
-                # Nodo Deuda
-                deuda_node = EntityNode(
-                    labels=["DEUDA"],
-                    uuid=str(uuid.uuid4()),
-                    name=f"Deuda_{cliente.nombre}",
-                    group_id=namespace,
-                    attributes={
-                        "monto_inicial": cliente.monto_deuda_inicial,
-                        "monto_actual": cliente.monto_deuda_inicial,
-                        "tipo": cliente.tipo_deuda,
-                        "fecha_inicio": cliente.fecha_prestamo.isoformat(),
-                    },
-                    created_at=datetime.now(),
-                )
-                deudas_nodos[cliente.id] = deuda_node
-                # await self.graphiti.add_triplet(deuda_node, None, None)
-
-                # Relación Cliente → Deuda
-                edge_posee = EntityEdge(
-                    name="POSEE",
-                    group_id=namespace,
-                    source_node_uuid=cliente_node.uuid,
-                    target_node_uuid=deuda_node.uuid,
-                    created_at=datetime.now(),
-                    fact=f"{cliente_node.name} posee la deuda {deuda_node.name}",
-                )
-                await self.graphiti.add_triplet(cliente_node, edge_posee, deuda_node)
-
-            except Exception as e:
-                print(f"[ERROR] Cliente {cliente.id}: {e}")
-                continue
 
-        for interaccion in data.interacciones:
-            try:
-                cliente_node = clientes_nodos.get(interaccion.cliente_id)
-                if not cliente_node:
-                    print(f"[WARN] Cliente {interaccion.cliente_id} no encontrado")
+        constructor = ConstructorGrafo(namespace=GRUPO_CARGA)
+        filtro = await self._filtro_incremental(GRUPO_CARGA) if incremental else None
+        if filtro:
+            data = filtro.filtrar(registros_de(data))
+
+        async def escribir(trabajo):
+            registro, tripletes = trabajo
+            with ESCRITURAS_EN_CURSO.en_curso(tipo="triplete"):
+                for origen, arista, destino in tripletes:
+                    with ETAPA_SEGUNDOS.medir(etapa="escritura_triplete"):
+                        await self.graphiti.add_triplet(origen, arista, destino)
+            REGISTROS.inc(etapa="escritura", entidad=entidad_registro(registro), estado="procesado")
+            if bitacora is not None:
+                bitacora.registrar_escritos([registro])
+            self._notificar([registro])
+
+        planificador = PlanificadorEscritura(
+            escribir,
+            concurrencia=concurrencia,
+            tamano_cola=tamano_cola,
+            max_reintentos=max_reintentos,
+            describir=lambda trabajo: etiqueta_registro(trabajo[0]),
+        )
+        async with planificador:
+            for registro, tripletes in constructor.construir(data):
+                if not tripletes:
                     continue
-
-                # Nodo Interacción
-                interaccion_node = EntityNode(
-                    labels=["INTERACCION"],
-                    uuid=str(uuid.uuid4()),
-                    name=f"Interaccion_{interaccion.id}",
-                    group_id=namespace,
-                    attributes={
-                        "tipo": interaccion.tipo,
-                        "timestamp": interaccion.timestamp.isoformat(),
-                        "resultado": getattr(interaccion, "resultado", None),
-                        "sentimiento": getattr(interaccion, "sentimiento", None),
-                        "duracion_segundos": getattr(
-                            interaccion, "duracion_segundos", None
-                        ),
-                    },
-                    created_at=datetime.now().isoformat(),
+                if filtro and not filtro.debe_escribir(registro, tripletes[0][0].uuid):
+                    continue
+                if bitacora is not None and not bitacora.pendiente(registro):
+                    continue
+                await planificador.enviar(
+                    clave_cliente(registro), (registro, tripletes)
                 )
-                # await self.graphiti.add_triplet(interaccion_node, None, None)
-
-                # Relación Cliente → Interacción
-                edge_tiene = EntityEdge(
-                    name="TIENE",
-                    group_id="INTERACTUO_CON",
-                    source_node_uuid=cliente_node.uuid,
-                    target_node_uuid=interaccion_node.uuid,
-                    created_at=datetime.now(),
-                    fact=f"{cliente_node.name} tiene la interacción {interaccion_node.name}",
+
+        resumen = planificador.resumen()
+        if filtro:
+            resumen["omitidos"] = filtro.omitidos
+            await self._guardar_watermark(
+                GRUPO_CARGA, filtro.nuevo_watermark(bool(planificador.fallidos))
+            )
+        for (registro, _), error in planificador.fallidos:
+            REGISTROS.inc(etapa="escritura", entidad=entidad_registro(registro), estado="fallido")
+            print(f"[ERROR] {etiqueta_registro(registro)}: {error}")
+            if bitacora is not None:
+                bitacora.registrar_fallido(registro, str(error) or type(error).__name__)
+        if bitacora is not None:
+            bitacora.confirmar()
+            resumen["omitidos_bitacora"] = bitacora.omitidos
+        print(
+            f"✅ Carga por tripletes: {resumen['escritos']} registros escritos, "
+            f"{resumen['reintentos']} reintentos, {resumen['fallidos']} fallidos"
+        )
+        return resumen
+
+    async def cargar_datos_bulk(
+        self,
+        data: Union[DataSetInteracciones, Iterable[Registro], ConstruccionParticionada],
+        tamano_lote: int = 2000,
+        concurrencia: int = 4,
+        incremental: bool = False,
+        bitacora: Optional[Bitacora] = None,
+        constructor: Optional[ConstructorGrafo] = None,
+        compartidos_escritos: Optional[set] = None,
+    ):
+        """Carga masiva: construye nodos y aristas en memoria y los escribe por lotes.
+
+        Usa el mismo ConstructorGrafo que `cargar_datos_triplet_completo`, pero en
+        lugar de un `add_triplet` por arista escribe `tamano_lote` nodos/aristas por
+        transacción (UNWIND ... MERGE). No hace la resolución con el LLM de
+        `add_triplet` (deduplicar nodos contra el grafo e invalidar aristas
+        contradichas): los nodos y aristas se escriben tal como salen del
+        constructor, con sus UUID deterministas. Los registros se consumen en ventanas de
+        `tamano_lote * concurrencia` aristas, de modo que `data` puede ser un
+        iterable en streaming sin acumular todo el grafo. En cada ventana los
+        nodos se escriben antes que las aristas porque éstas hacen MATCH sobre sus
+        extremos; dentro de cada fase hasta `concurrencia` lotes van en paralelo,
+        con reintentos. `incremental` funciona igual que en la carga por tripletes.
+
+        Con una `ConstruccionParticionada` la lectura, validación y construcción
+        corren en varios procesos y aquí solo se escribe lo que entregan; los
+        nodos compartidos que llegan de más de una partición se deduplican por
+        UUID igual que entre ventanas.
+
+        Con una `bitacora` se anotan los registros de cada ventana escrita por
+        completo (o como fallidos si algún lote de la ventana falló) y se omiten
+        los que ya no están pendientes.
+
+        `constructor` y `compartidos_escritos` permiten encadenar varias
+        llamadas (p. ej. los micro-lotes de la ingesta continua): el
+        constructor recuerda los clientes ya vistos para enlazar sus
+        interacciones y el conjunto, los nodos compartidos ya escritos.
+        """
+        if not self.graphiti:
+            raise RuntimeError("Graphiti no está inicializado")
+        if tamano_lote < 1:
+            raise ValueError("tamano_lote debe ser mayor que 0")
+
+        if constructor is None:
+            constructor = ConstructorGrafo(namespace=GRUPO_CARGA)
+        filtro = await self._filtro_incremental(GRUPO_CARGA) if incremental else None
+        particionada = isinstance(data, ConstruccionParticionada)
+        if particionada:
+            # Cada partición descarta las interacciones anteriores al watermark
+            elementos = data.recorrer(GRUPO_CARGA, filtro.watermark if filtro else None)
+        else:
+            if filtro:
+                data = filtro.filtrar(registros_de(data))
+            elementos = _elementos_locales(constructor.construir(data))
+
+        # Clientes, deudas y agentes se reutilizan entre ventanas: basta con
+        # recordar sus UUID. El resto de nodos solo aparece en su propio registro.
+        if compartidos_escritos is None:
+            compartidos_escritos = set()
+        totales = {"nodos": 0, "aristas": 0, "lotes_fallidos": 0}
+        segundos = {"nodos": 0.0, "aristas": 0.0}
+        nodos: dict[str, EntityNode] = {}
+        aristas: list[EntityEdge] = []
+        # Registros de la ventana con sus aristas
+        registros: list[Tuple[Registro, List[EntityEdge]]] = []
+
+        async def vaciar():
+            inicio = time.perf_counter()
+            lotes_nodos = await self._escribir_lotes(
+                self._escribir_nodos, list(nodos.values()), tamano_lote, concurrencia
+            )
+            segundos["nodos"] += time.perf_counter() - inicio
+            sin_escribir = {nodo.uuid for lote in lotes_nodos for nodo in lote}
+
+            # El MATCH de una arista cuyo extremo no se escribió no encuentra
+            # el nodo y la arista se pierde sin error: su registro queda fallido
+            def escrito(uuid: str) -> bool:
+                return uuid not in sin_escribir and (uuid in nodos or uuid in compartidos_escritos)
+
+            huerfanos = [
+                registro
+                for registro, aristas_registro in registros
+                if not all(
+                    escrito(a.source_node_uuid) and escrito(a.target_node_uuid)
+                    for a in aristas_registro
                 )
-                await self.graphiti.add_triplet(
-                    cliente_node, edge_tiene, interaccion_node
+            ]
+            if huerfanos:
+                omitidos = set(map(id, huerfanos))
+                aristas_completas = [
+                    a for registro, ars in registros if id(registro) not in omitidos for a in ars
+                ]
+            else:
+                aristas_completas = aristas
+
+            inicio = time.perf_counter()
+            lotes_aristas = await self._escribir_lotes(
+                self._escribir_aristas, aristas_completas, tamano_lote, concurrencia
+            )
+            segundos["aristas"] += time.perf_counter() - inicio
+
+            # Si un lote de la ventana falló no se sabe qué registros quedaron
+            # escritos: los observadores solo se enteran de ventanas completas
+            fallidos = len(lotes_nodos) + len(lotes_aristas)
+            totales["lotes_fallidos"] += fallidos
+            if not fallidos:
+                self._notificar([registro for registro, _ in registros])
+            if bitacora is not None:
+                if fallidos:
+                    omitidos = set(map(id, huerfanos))
+                    for registro, _ in registros:
+                        if id(registro) in omitidos:
+                            error = "nodos del registro sin escribir"
+                        else:
+                            error = f"{fallidos} lotes fallidos en su ventana"
+                        bitacora.registrar_fallido(registro, error)
+                else:
+                    bitacora.registrar_escritos([registro for registro, _ in registros])
+                bitacora.confirmar()
+            estado = "fallido" if fallidos else "procesado"
+            for entidad, cantidad in Counter(
+                entidad_registro(registro) for registro, _ in registros
+            ).items():
+                REGISTROS.inc(cantidad, etapa="escritura", entidad=entidad, estado=estado)
+
+            totales["nodos"] += len(nodos) - len(sin_escribir)
+            totales["aristas"] += len(aristas_completas)
+            # Con algún lote de nodos fallido los compartidos de la ventana se
+            # vuelven a escribir en la próxima en la que aparezcan
+            if not sin_escribir:
+                compartidos_escritos.update(
+                    u for u, n in nodos.items() if set(n.labels) & ETIQUETAS_COMPARTIDAS
                 )
+            nodos.clear()
+            aristas.clear()
+            registros.clear()
 
-                # Nodo Agente + relación REALIZA
-                agente_id = getattr(interaccion, "agente_id", None)
-                if agente_id:
-                    agente_node = agentes_nodos.get(agente_id)
-                    if not agente_node:
-                        agente_node = EntityNode(
-                            labels=["AGENTE"],
-                            uuid=str(uuid.uuid4()),
-                            name=agente_id,
-                            group_id=namespace,
-                            created_at=datetime.now().isoformat(),
-                        )
-                        agentes_nodos[agente_id] = agente_node
-                        # await self.graphiti.add_triplet(agente_node, None, None)
-
-                    edge_realiza = EntityEdge(
-                        name="REALIZA",
-                        group_id=namespace,
-                        source_node_uuid=agente_node.uuid,
-                        target_node_uuid=interaccion_node.uuid,
-                        created_at=datetime.now(),
-                        fact=f"{agente_node.name} realizó la interacción {interaccion_node.name}",
+        async for registro, nodos_registro, aristas_registro in elementos:
+            if nodos_registro is None:
+                continue
+            if filtro and isinstance(registro, Cliente):
+                uuid_cliente = constructor.uuid_nodo("cliente", registro.id)
+                if not filtro.debe_escribir(registro, uuid_cliente):
+                    # Cliente sin cambios: ya está en el grafo, solo se enlaza
+                    compartidos_escritos.update(
+                        (uuid_cliente, constructor.uuid_nodo("deuda", registro.id))
                     )
-                    await self.graphiti.add_triplet(
-                        agente_node, edge_realiza, interaccion_node
+                    continue
+            elif filtro and particionada:
+                filtro.admitir(registro)
+            if bitacora is not None and not bitacora.pendiente(registro):
+                if isinstance(registro, Cliente):
+                    # Igual que un cliente sin cambios: ya está en el grafo
+                    compartidos_escritos.update(
+                        (
+                            constructor.uuid_nodo("cliente", registro.id),
+                            constructor.uuid_nodo("deuda", registro.id),
+                        )
                     )
+                continue
+            for nodo in nodos_registro:
+                if nodo.uuid not in compartidos_escritos:
+                    nodos.setdefault(nodo.uuid, nodo)
+            aristas.extend(aristas_registro)
+            registros.append((registro, aristas_registro))
+            if len(aristas) >= tamano_lote * concurrencia:
+                await vaciar()
+        await vaciar()
+
+        nodos_por_segundo = totales["nodos"] / max(segundos["nodos"], 1e-9)
+        aristas_por_segundo = totales["aristas"] / max(segundos["aristas"], 1e-9)
+        print(
+            f"✅ Carga masiva: {totales['nodos']} nodos "
+            f"({nodos_por_segundo:.0f} nodos/s), "
+            f"{totales['aristas']} aristas "
+            f"({aristas_por_segundo:.0f} aristas/s)"
+        )
+        if filtro:
+            totales["omitidos"] = filtro.omitidos + (data.omitidos if particionada else 0)
+            await self._guardar_watermark(
+                GRUPO_CARGA, filtro.nuevo_watermark(totales["lotes_fallidos"] > 0)
+            )
+        if bitacora is not None:
+            totales["omitidos_bitacora"] = bitacora.omitidos
+        return {
+            **totales,
+            "nodos_por_segundo": nodos_por_segundo,
+            "aristas_por_segundo": aristas_por_segundo,
+        }
 
-                # Nodo Pago (si aplica)
-                if interaccion.tipo == "pago_recibido" or getattr(
-                    interaccion, "monto_prometido", None
-                ):
-                    pago_node = EntityNode(
-                        labels=["PAGO"],
-                        uuid=str(uuid.uuid4()),
-                        name=f"Pago_{interaccion.id}",
-                        group_id=namespace,
-                        attributes={
-                            "monto": getattr(
-                                interaccion,
-                                "monto",
-                                getattr(interaccion, "monto_prometido", None),
-                            ),
-                            "metodo_pago": getattr(interaccion, "metodo_pago", None),
-                            "pago_completo": getattr(
-                                interaccion, "pago_completo", None
-                            ),
-                            "fecha_promesa": getattr(
-                                interaccion, "fecha_promesa", None
-                            ),
-                        },
-                        created_at=datetime.now().now(),
-                    )
-                    # await self.graphiti.add_triplet(pago_node, None, None)
-
-                    # Relación Promesa o Pago
-                    edge_pago = EntityEdge(
-                        name=(
-                            "PROMETE"
-                            if getattr(interaccion, "monto_prometido", None)
-                            else "PAGA"
-                        ),
-                        group_id=namespace,
-                        source_node_uuid=interaccion_node.uuid,
-                        target_node_uuid=pago_node.uuid,
-                        created_at=datetime.now(),
-                        fact=f"{interaccion_node.name} vincula al pago {pago_node.name}",
-                    )
-                    await self.graphiti.add_triplet(
-                        interaccion_node, edge_pago, pago_node
-                    )
+    async def cargar_cumplimiento_promesas(
+        self,
+        cambios: Iterable[Tuple[Optional[ResultadoPromesa], ResultadoPromesa]],
+        tamano_lote: int = 2000,
+        concurrencia: int = 4,
+    ):
+        """Escribe en bloque las aristas CUMPLE_PROMESA / INCUMPLIO_PROMESA.
+
+        Recibe los pares (anterior, nuevo) de `MotorPromesas.cambios()`. Por
+        cada promesa se borran en el grafo las aristas de cumplimiento que no
+        corresponden a su estado nuevo (p. ej. el INCUMPLIO_PROMESA que dejó
+        una carga anterior cuando un pago tardío llega en la siguiente) y se
+        escriben las del estado nuevo. El borrado no depende del estado
+        anterior en memoria, que en una carga nueva no existe.
+        """
+        if not self.graphiti:
+            raise RuntimeError("Graphiti no está inicializado")
 
-                    # Relación Cliente → Pago
-                    edge_cliente_pago = EntityEdge(
-                        group_id=namespace,
-                        source_node_uuid=cliente_node.uuid,
-                        target_node_uuid=pago_node.uuid,
-                        created_at=datetime.now(),
-                        name="PAGA",
-                        fact=f"{cliente_node.name} realizó el pago {pago_node.name}",
-                    )
-                    await self.graphiti.add_triplet(
-                        cliente_node, edge_cliente_pago, pago_node
-                    )
+        constructor = ConstructorGrafo(namespace=GRUPO_CARGA)
+        nuevas: list[EntityEdge] = []
+        promesas: list[dict] = []
+        for _, nuevo in cambios:
+            aristas = constructor.aristas_promesa(nuevo)
+            nuevas.extend(aristas)
+            promesas.append(
+                {
+                    "uuid": constructor.uuid_nodo("pago", nuevo.promesa_id),
+                    "vigentes": [a.uuid for a in aristas],
+                }
+            )
 
-                # Nodo PlanPago (si hay renegociación)
-                if getattr(interaccion, "nuevo_plan_pago", None):
-                    plan = interaccion.nuevo_plan_pago
-                    plan_node = EntityNode(
-                        labels=["PLAN_PAGO"],
-                        uuid=str(uuid.uuid4()),
-                        name=f"PlanPago_{interaccion.id}",
-                        group_id=namespace,
-                        attributes={
-                            "cuotas": plan.cuotas,
-                            "monto_mensual": plan.monto_mensual,
-                            "fecha_inicio": interaccion.timestamp,
-                        },
-                        created_at=datetime.now().isoformat(),
-                    )
-                    # await self.graphiti.add_triplet(plan_node, None, None)
-
-                    edge_plan = EntityEdge(
-                        name="RENUEVA_PLAN",
-                        group_id=namespace,
-                        source_node_uuid=interaccion_node.uuid,
-                        target_node_uuid=plan_node.uuid,
-                        created_at=datetime.now(),
-                        fact=f"{interaccion_node.name} creó el plan {plan_node.name}",
-                    )
-                    await self.graphiti.add_triplet(
-                        interaccion_node, edge_plan, plan_node
-                    )
+        eliminadas = 0
+        for inicio in range(0, len(promesas), tamano_lote):
+            records, _, _ = await self.graphiti.driver.execute_query(
+                """
+                UNWIND $promesas AS p
+                MATCH (:Entity {uuid: p.uuid})-[e:RELATES_TO]-()
+                WHERE e.name IN ['CUMPLE_PROMESA', 'INCUMPLIO_PROMESA']
+                  AND NOT e.uuid IN p.vigentes
+                DELETE e
+                RETURN count(e) AS eliminadas
+                """,
+                promesas=promesas[inicio : inicio + tamano_lote],
+            )
+            if records:
+                eliminadas += records[0]["eliminadas"]
+        fallidos = len(
+            await self._escribir_lotes(self._escribir_aristas, nuevas, tamano_lote, concurrencia)
+        )
+        self.generacion += 1
+        print(
+            f"✅ Promesas: {len(nuevas)} aristas escritas, "
+            f"{eliminadas} obsoletas eliminadas, {fallidos} lotes fallidos"
+        )
+        return {"aristas": len(nuevas), "eliminadas": eliminadas, "lotes_fallidos": fallidos}
+
+    def saldo_cliente(self, cliente_id: str, as_of: Optional[datetime] = None):
+        return self.saldos.saldo(cliente_id, as_of)
+
+    def saldos_a_fecha(self, as_of: Optional[datetime] = None):
+        return self.saldos.saldos(as_of)
 
-            except Exception as e:
-                print(f"[ERROR] Interacción {interaccion.id}: {e}")
-            if not self.graphiti:
-                raise RuntimeError("Graphiti no está inicializado")
+    async def actualizar_monto_actual(self, tamano_lote: int = 2000):
+        """Escribe en bloque `monto_actual` en los nodos DEUDA cuyo saldo cambió."""
+        if not self.graphiti:
+            raise RuntimeError("Graphiti no está inicializado")
+
+        constructor = ConstructorGrafo(namespace=GRUPO_CARGA)
+        pendientes = self.saldos.pendientes()
+        filas = [
+            {"uuid": constructor.uuid_nodo("deuda", cliente_id), "monto_actual": saldo}
+            for cliente_id, saldo in pendientes
+        ]
+        try:
+            for inicio in range(0, len(filas), tamano_lote):
+                await self.graphiti.driver.execute_query(
+                    """
+                    UNWIND $filas AS fila
+                    MATCH (d:Entity {uuid: fila.uuid})
+                    SET d.monto_actual = fila.monto_actual
+                    """,
+                    filas=filas[inicio : inicio + tamano_lote],
+                )
+        except Exception:
+            # Siguen pendientes para la próxima escritura
+            self.saldos.sucios.update(cliente_id for cliente_id, _ in pendientes)
+            raise
+        self.generacion += 1
+        print(f"✅ monto_actual actualizado en {len(filas)} deudas")
+        return len(filas)
+
+    async def _escribir_nodos(self, lote):
+        with ETAPA_SEGUNDOS.medir(etapa="embeddings_nodos"):
+            await create_entity_node_embeddings(self.graphiti.embedder, lote)
+        with ESCRITURAS_EN_CURSO.en_curso(tipo="lote_nodos"), ETAPA_SEGUNDOS.medir(
+            etapa="escritura_lote_nodos"
+        ):
+            await add_nodes_and_edges_bulk(
+                self.graphiti.driver, [], [], lote, [], self.graphiti.embedder
+            )
+
+    async def _escribir_aristas(self, lote):
+        with ETAPA_SEGUNDOS.medir(etapa="embeddings_aristas"):
+            await create_entity_edge_embeddings(self.graphiti.embedder, lote)
+        with ESCRITURAS_EN_CURSO.en_curso(tipo="lote_aristas"), ETAPA_SEGUNDOS.medir(
+            etapa="escritura_lote_aristas"
+        ):
+            await add_nodes_and_edges_bulk(
+                self.graphiti.driver, [], [], [], lote, self.graphiti.embedder
+            )
+
+    async def _escribir_lotes(self, escribir, elementos, tamano_lote, concurrencia):
+        # Los lotes son independientes entre sí: se reparten por índice
+        planificador = PlanificadorEscritura(
+            escribir,
+            concurrencia=concurrencia,
+            tamano_cola=concurrencia * 2,
+            describir=lambda lote: f"Lote de {len(lote)} elementos",
+        )
+        async with planificador:
+            for i in range(0, len(elementos), tamano_lote):
+                await planificador.enviar(str(i), elementos[i : i + tamano_lote])
+        # Los lotes que agotaron los reintentos
+        return [lote for lote, _ in planificador.fallidos]
+
+    async def _filtro_incremental(self, group_id: str) -> FiltroIncremental:
+        records, _, _ = await self.graphiti.driver.execute_query(
+            """
+            MATCH (n:CLIENTE {group_id: $group_id})
+            RETURN n.uuid AS uuid, n.huella AS huella
+            """,
+            group_id=group_id,
+        )
+        huellas = {r["uuid"]: r["huella"] for r in records}
+        return FiltroIncremental(await self.leer_watermark(group_id), huellas)
+
+    async def leer_watermark(self, group_id: str) -> Optional[Watermark]:
+        records, _, _ = await self.graphiti.driver.execute_query(
+            """
+            MATCH (w:IngestaWatermark {group_id: $group_id})
+            RETURN w.timestamp AS timestamp, w.interaccion_id AS interaccion_id
+            """,
+            group_id=group_id,
+        )
+        if not records or records[0]["timestamp"] is None:
+            return None
+        return (
+            datetime.fromisoformat(records[0]["timestamp"]),
+            records[0]["interaccion_id"],
+        )
+
+    async def _guardar_watermark(self, group_id: str, watermark: Optional[Watermark]):
+        if watermark is None:
+            return
+        await self.graphiti.driver.execute_query(
+            """
+            MERGE (w:IngestaWatermark {group_id: $group_id})
+            SET w.timestamp = $timestamp,
+                w.interaccion_id = $interaccion_id,
+                w.actualizado = datetime()
+            """,
+            group_id=group_id,
+            timestamp=watermark[0].isoformat(),
+            interaccion_id=watermark[1],
+        )
+        print(f"Watermark de {group_id}: {watermark[0].isoformat()} ({watermark[1]})")
 
     async def query(self):      
         # result = await self.graphiti.search("MATCH (c:CLIENTE) RETURN count(c) AS total_clientes")
@@ -0,0 +1,266 @@
+"""Almacén columnar de interacciones que mide `bench_almacen.py`.
+
+Se construye de una vez y no admite agregar filas; los KPIs y agentes de la
+API mantienen sus propios agregados incrementales y solo comparten de aquí la
+codificación de `services/diccionario.py`.
+"""
+from array import array
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Union
+
+import numpy as np
+
+from models import Interaccion, NuevoPlanPago
+from services.diccionario import Diccionario
+from services.tiempo import a_microsegundos, de_microsegundos
+
+# Columnas categóricas: se guardan como códigos enteros sobre un diccionario
+CATEGORICAS = ("cliente_id", "tipo", "agente_id", "resultado", "sentimiento", "metodo_pago")
+
+# Columnas condicionales: solo existen para ciertos `tipo`/`resultado`, así que
+# llevan una máscara de validez en lugar de ocupar un objeto None por fila
+NUMERICAS = {
+    "duracion_segundos": np.int32,
+    "monto_prometido": np.float64,
+    "monto": np.float64,
+    "cuotas": np.int16,
+    "monto_mensual": np.float64,
+}
+FECHAS = ("fecha_promesa",)
+BOOLEANAS = ("pago_completo",)
+
+
+def _a_datetime64(fecha: Optional[datetime]) -> np.datetime64:
+    if fecha is None:
+        return np.datetime64("NaT", "us")
+    return np.datetime64(a_microsegundos(fecha), "us")
+
+
+class AlmacenInteracciones:
+    """Interacciones en formato columnar, respaldado por arreglos NumPy.
+
+    Las filas quedan ordenadas por (cliente, timestamp), así que las
+    interacciones de un cliente forman un rango contiguo y se obtienen como
+    vistas sin copiar (`por_cliente`). Un rango de tiempo dentro de un cliente
+    también es contiguo; un rango de tiempo global usa la permutación
+    `orden_tiempo` y devuelve índices.
+
+    Las filas se reconstruyen como `Interaccion` solo cuando se piden
+    (`fila`, `Vista.a_interacciones`).
+    """
+
+    def __init__(self):
+        self.diccionarios: Dict[str, Diccionario] = {c: Diccionario() for c in CATEGORICAS}
+        self.columnas: Dict[str, np.ndarray] = {}
+        self.validos: Dict[str, np.ndarray] = {}
+        self.ids = np.empty(0, dtype="S1")
+        self.timestamp = np.empty(0, dtype="datetime64[us]")
+        self.inicio_cliente = np.zeros(1, dtype=np.int64)
+        self.orden_tiempo = np.empty(0, dtype=np.int64)
+
+    @classmethod
+    def desde_interacciones(cls, interacciones: Iterable[Interaccion]) -> "AlmacenInteracciones":
+        almacen = cls()
+
+        # Acumuladores compactos: se construye en una pasada sin guardar los modelos
+        ids: List[bytes] = []
+        timestamps = array("q")
+        categoricas = {c: array("i") for c in CATEGORICAS}
+        numericas = {c: array("d") for c in NUMERICAS}
+        validos = {c: bytearray() for c in (*NUMERICAS, *FECHAS, *BOOLEANAS)}
+        fechas = {c: array("q") for c in FECHAS}
+        booleanas = {c: bytearray() for c in BOOLEANAS}
+
+        for interaccion in interacciones:
+            ids.append((interaccion.id or "").encode("utf-8"))
+            timestamps.append(a_microsegundos(interaccion.timestamp))
+            for columna in CATEGORICAS:
+                categoricas[columna].append(
+                    almacen.diccionarios[columna].codificar(getattr(interaccion, columna))
+                )
+
+            plan = interaccion.nuevo_plan_pago
+            valores = {
+                "duracion_segundos": interaccion.duracion_segundos,
+                "monto_prometido": interaccion.monto_prometido,
+                "monto": interaccion.monto,
+                "cuotas": plan.cuotas if plan else None,
+                "monto_mensual": plan.monto_mensual if plan else None,
+            }
+            for columna, valor in valores.items():
+                validos[columna].append(valor is not None)
+                numericas[columna].append(0 if valor is None else valor)
+            for columna in FECHAS:
+                valor = getattr(interaccion, columna)
+                validos[columna].append(valor is not None)
+                fechas[columna].append(0 if valor is None else a_microsegundos(valor))
+            for columna in BOOLEANAS:
+                valor = getattr(interaccion, columna)
+                validos[columna].append(valor is not None)
+                booleanas[columna].append(bool(valor))
+
+        codigos_cliente = np.frombuffer(categoricas["cliente_id"], dtype=np.int32)
+        ts = np.frombuffer(timestamps, dtype=np.int64)
+        orden = np.lexsort((ts, codigos_cliente))
+
+        almacen.ids = np.array(ids, dtype=np.bytes_)[orden] if ids else almacen.ids
+        almacen.timestamp = ts[orden].view("datetime64[us]")
+        for columna in CATEGORICAS:
+            codigos = np.frombuffer(categoricas[columna], dtype=np.int32)[orden]
+            tamano = len(almacen.diccionarios[columna].valores)
+            tipo = np.int16 if tamano < np.iinfo(np.int16).max else np.int32
+            almacen.columnas[columna] = codigos.astype(tipo)
+        for columna, tipo in NUMERICAS.items():
+            almacen.columnas[columna] = np.frombuffer(numericas[columna], dtype=np.float64)[
+                orden
+            ].astype(tipo)
+        for columna in FECHAS:
+            almacen.columnas[columna] = np.frombuffer(fechas[columna], dtype=np.int64)[
+                orden
+            ].view("datetime64[us]")
+        for columna in BOOLEANAS:
+            almacen.columnas[columna] = np.frombuffer(booleanas[columna], dtype=np.bool_)[orden]
+        for columna, mascara in validos.items():
+            almacen.validos[columna] = np.frombuffer(mascara, dtype=np.bool_)[orden]
+
+        # Offsets por cliente (estilo CSR): filas de cliente c = [inicio[c], inicio[c+1]).
+        # Las filas sin cliente (código -1) quedan al principio
+        clientes = almacen.columnas["cliente_id"]
+        conteos = np.bincount(
+            clientes[clientes >= 0],
+            minlength=len(almacen.diccionarios["cliente_id"].valores),
+        )
+        sin_cliente = int(np.count_nonzero(clientes < 0))
+        almacen.inicio_cliente = np.concatenate(([0], np.cumsum(conteos))).astype(np.int64)
+        almacen.inicio_cliente += sin_cliente
+        almacen.orden_tiempo = np.argsort(almacen.timestamp, kind="stable")
+        return almacen
+
+    def __len__(self) -> int:
+        return len(self.timestamp)
+
+    def nbytes(self) -> int:
+        arreglos = [self.ids, self.timestamp, self.inicio_cliente, self.orden_tiempo]
+        arreglos += list(self.columnas.values()) + list(self.validos.values())
+        return sum(a.nbytes for a in arreglos)
+
+    def columna(self, nombre: str) -> np.ndarray:
+        if nombre == "timestamp":
+            return self.timestamp
+        if nombre == "id":
+            return self.ids
+        return self.columnas[nombre]
+
+    def codigo(self, columna: str, valor: str) -> int:
+        return self.diccionarios[columna].codigo(valor)
+
+    def por_cliente(
+        self,
+        cliente_id: str,
+        desde: Optional[datetime] = None,
+        hasta: Optional[datetime] = None,
+    ) -> "Vista":
+        codigo = self.codigo("cliente_id", cliente_id)
+        if codigo < 0:
+            return Vista(self, slice(0, 0))
+        inicio, fin = int(self.inicio_cliente[codigo]), int(self.inicio_cliente[codigo + 1])
+        if desde is not None or hasta is not None:
+            tramo = self.timestamp[inicio:fin]
+            if desde is not None:
+                inicio_rel = int(np.searchsorted(tramo, _a_datetime64(desde), side="left"))
+            else:
+                inicio_rel = 0
+            if hasta is not None:
+                fin_rel = int(np.searchsorted(tramo, _a_datetime64(hasta), side="right"))
+            else:
+                fin_rel = len(tramo)
+            inicio, fin = inicio + inicio_rel, inicio + max(inicio_rel, fin_rel)
+        return Vista(self, slice(inicio, fin))
+
+    def por_rango_tiempo(
+        self, desde: Optional[datetime] = None, hasta: Optional[datetime] = None
+    ) -> "Vista":
+        ordenados = self.timestamp[self.orden_tiempo]
+        inicio = 0 if desde is None else int(
+            np.searchsorted(ordenados, _a_datetime64(desde), side="left")
+        )
+        fin = len(ordenados) if hasta is None else int(
+            np.searchsorted(ordenados, _a_datetime64(hasta), side="right")
+        )
+        return Vista(self, self.orden_tiempo[inicio:max(inicio, fin)])
+
+    def filtrar(self, **condiciones: str) -> "Vista":
+        """Filtro vectorizado por igualdad en columnas categóricas,
+        p. ej. `filtrar(tipo="pago_recibido", metodo_pago="tarjeta")`."""
+        mascara = np.ones(len(self), dtype=np.bool_)
+        for columna, valor in condiciones.items():
+            mascara &= self.columnas[columna] == self.codigo(columna, valor)
+        return Vista(self, np.flatnonzero(mascara))
+
+    def fila(self, i: int) -> Interaccion:
+        def categoria(columna):
+            return self.diccionarios[columna].decodificar(int(self.columnas[columna][i]))
+
+        def opcional(columna, convertir):
+            if not self.validos[columna][i]:
+                return None
+            return convertir(self.columnas[columna][i])
+
+        plan = None
+        if self.validos["cuotas"][i] or self.validos["monto_mensual"][i]:
+            plan = NuevoPlanPago(
+                cuotas=opcional("cuotas", int),
+                monto_mensual=opcional("monto_mensual", float),
+            )
+
+        return Interaccion(
+            id=self.ids[i].decode("utf-8"),
+            cliente_id=categoria("cliente_id"),
+            timestamp=de_microsegundos(self.timestamp[i].astype(np.int64)),
+            tipo=categoria("tipo"),
+            duracion_segundos=opcional("duracion_segundos", int),
+            agente_id=categoria("agente_id"),
+            resultado=categoria("resultado"),
+            sentimiento=categoria("sentimiento"),
+            monto_prometido=opcional("monto_prometido", float),
+            fecha_promesa=opcional(
+                "fecha_promesa", lambda v: de_microsegundos(v.astype(np.int64))
+            ),
+            nuevo_plan_pago=plan,
+            monto=opcional("monto", float),
+            metodo_pago=categoria("metodo_pago"),
+            pago_completo=opcional("pago_completo", bool),
+        )
+
+
+class Vista:
+    """Subconjunto de filas del almacén: un slice (vista sin copia) o índices."""
+
+    def __init__(self, almacen: AlmacenInteracciones, seleccion: Union[slice, np.ndarray]):
+        self.almacen = almacen
+        self.seleccion = seleccion
+
+    def __len__(self) -> int:
+        if isinstance(self.seleccion, slice):
+            return self.seleccion.stop - self.seleccion.start
+        return len(self.seleccion)
+
+    def columna(self, nombre: str) -> np.ndarray:
+        return self.almacen.columna(nombre)[self.seleccion]
+
+    def validos(self, nombre: str) -> np.ndarray:
+        return self.almacen.validos[nombre][self.seleccion]
+
+    def indices(self) -> np.ndarray:
+        if isinstance(self.seleccion, slice):
+            return np.arange(self.seleccion.start, self.seleccion.stop)
+        return self.seleccion
+
+    def filtrar(self, **condiciones: str) -> "Vista":
+        mascara = np.ones(len(self), dtype=np.bool_)
+        for columna, valor in condiciones.items():
+            mascara &= self.columna(columna) == self.almacen.codigo(columna, valor)
+        return Vista(self.almacen, self.indices()[mascara])
+
+    def a_interacciones(self) -> List[Interaccion]:
+        return [self.almacen.fila(int(i)) for i in self.indices()]
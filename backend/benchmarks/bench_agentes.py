@@ -0,0 +1,110 @@
+"""Métricas de agentes en ventanas móviles sobre un dataset sintético grande.
+
+Uso (desde backend/):
+    python -m benchmarks.bench_agentes --interacciones 10000000 --agentes 1000
+"""
+import argparse
+import random
+import statistics
+import time
+from datetime import datetime, timedelta, timezone
+from itertools import islice
+
+from models import Interaccion
+from services.agentes import ORDENES, MotorAgentes
+
+RESULTADOS = ("promesa_pago", "sin_respuesta", "renegociacion", "disputa", "pago_inmediato")
+SENTIMIENTOS = ("cooperativo", "neutral", "frustrado", "hostil")
+
+
+def generar(num_clientes: int, num_agentes: int, num_interacciones: int, semilla: int = 7):
+    # Interacciones en orden de timestamp a lo largo de ~180 días
+    rnd = random.Random(semilla)
+    inicio = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    paso = 180 * 86_400 / max(num_interacciones, 1)
+    for n in range(num_interacciones):
+        momento = inicio + timedelta(seconds=n * paso)
+        cliente_id = f"cliente_{rnd.randrange(num_clientes):07d}"
+        if rnd.random() < 0.15:
+            yield Interaccion.model_construct(
+                id=f"int_{n:08x}",
+                cliente_id=cliente_id,
+                timestamp=momento,
+                tipo="pago_recibido",
+                monto=float(rnd.randint(100, 3000)),
+                pago_completo=rnd.random() < 0.5,
+            )
+            continue
+        resultado = rnd.choice(RESULTADOS)
+        promesa = resultado == "promesa_pago"
+        yield Interaccion.model_construct(
+            id=f"int_{n:08x}",
+            cliente_id=cliente_id,
+            timestamp=momento,
+            tipo="llamada_saliente",
+            agente_id=f"agente_{rnd.randrange(num_agentes):04d}",
+            duracion_segundos=rnd.randint(20, 900),
+            resultado=resultado,
+            sentimiento=rnd.choice(SENTIMIENTOS),
+            monto_prometido=float(rnd.randint(100, 3000)) if promesa else None,
+            fecha_promesa=momento + timedelta(days=rnd.randint(3, 20)) if promesa else None,
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--clientes", type=int, default=200_000)
+    parser.add_argument("--agentes", type=int, default=1_000)
+    parser.add_argument("--interacciones", type=int, default=1_000_000)
+    parser.add_argument("--nuevas", type=int, default=10_000)
+    parser.add_argument("--lote", type=int, default=10_000)
+    args = parser.parse_args()
+
+    registros = generar(args.clientes, args.agentes, args.interacciones + args.nuevas)
+    motor = MotorAgentes()
+    # Solo se mide aplicar_lote: generar los modelos no es parte del cálculo
+    duracion = 0.0
+    restantes = args.interacciones
+    while restantes:
+        lote = list(islice(registros, min(args.lote, restantes)))
+        t = time.perf_counter()
+        motor.aplicar_lote(lote)
+        duracion += time.perf_counter() - t
+        restantes -= len(lote)
+    print(
+        f"Cálculo inicial ({args.interacciones} interacciones, lotes de {args.lote}): "
+        f"{duracion:.2f}s ({args.interacciones / duracion:.0f} interacciones/s)"
+    )
+
+    latencias = []
+    for interaccion in registros:
+        t = time.perf_counter()
+        motor.aplicar(interaccion)
+        latencias.append(time.perf_counter() - t)
+    latencias.sort()
+    print(
+        f"Actualización incremental: media {statistics.mean(latencias) * 1e6:.1f}µs, "
+        f"p99 {latencias[int(len(latencias) * 0.99)] * 1e6:.1f}µs"
+    )
+
+    for dias in motor.ventanas:
+        duraciones = []
+        for orden in ORDENES:
+            t = time.perf_counter()
+            ranking = motor.ranking(dias, orden, limite=50)
+            duraciones.append(time.perf_counter() - t)
+        print(
+            f"Ranking top 50 en {dias}d ({ranking['total_agentes']} agentes, "
+            f"{len(ORDENES)} criterios): máx {max(duraciones) * 1e3:.2f}ms"
+        )
+
+    t = time.perf_counter()
+    diferencias = motor.verificar_consistencia()
+    print(
+        f"Recálculo completo: {time.perf_counter() - t:.2f}s, "
+        f"consistente={'sí' if not diferencias else diferencias}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""Memoria y filtros del almacén columnar frente a List[Interaccion].
+
+Uso (desde backend/):
+    python -m benchmarks.bench_almacen --interacciones 1000000
+"""
+import argparse
+import time
+import tracemalloc
+
+from models import Interaccion
+from benchmarks.almacen_columnar import AlmacenInteracciones
+from benchmarks.bench_kpis import generar
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--clientes", type=int, default=50_000)
+    parser.add_argument("--interacciones", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    tracemalloc.start()
+    interacciones = [
+        Interaccion(**r.model_dump())
+        for r in generar(args.clientes, args.interacciones)
+        if isinstance(r, Interaccion)
+    ]
+    memoria_modelos, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    inicio = time.perf_counter()
+    almacen = AlmacenInteracciones.desde_interacciones(interacciones)
+    print(f"Construcción del almacén: {time.perf_counter() - inicio:.2f}s")
+    print(
+        f"Memoria List[Interaccion]: {memoria_modelos / 1e6:.0f} MB "
+        f"({memoria_modelos / len(interacciones):.0f} B/fila)"
+    )
+    print(
+        f"Memoria columnar: {almacen.nbytes() / 1e6:.0f} MB "
+        f"({almacen.nbytes() / len(almacen):.0f} B/fila)"
+    )
+
+    inicio = time.perf_counter()
+    lista = [i for i in interacciones if i.tipo == "pago_recibido"]
+    total_lista = sum(i.monto for i in lista)
+    t_lista = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    vista = almacen.filtrar(tipo="pago_recibido")
+    total_columnar = float(vista.columna("monto").sum())
+    t_columnar = time.perf_counter() - inicio
+    print(
+        f"Suma de pagos: lista {t_lista * 1e3:.1f}ms, columnar {t_columnar * 1e3:.1f}ms "
+        f"(iguales: {abs(total_lista - total_columnar) < 1e-6})"
+    )
+
+    inicio = time.perf_counter()
+    for n in range(10_000):
+        almacen.por_cliente(f"cliente_{n % args.clientes:06d}").columna("timestamp")
+    print(f"Vista por cliente: {(time.perf_counter() - inicio) / 10_000 * 1e6:.1f}µs")
+
+
+if __name__ == "__main__":
+    main()
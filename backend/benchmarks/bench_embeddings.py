@@ -0,0 +1,121 @@
+"""Llamadas al proveedor de embeddings en una carga y en su recarga.
+
+Carga el archivo dos veces con el escritor en memoria y un embedder local
+que cuenta lo que se le pide, con la cache en disco de `--cache` (se borra
+al empezar). La primera carga debería pedir solo los textos distintos, en
+lotes grandes; la recarga, casi nada. `--tripletes` simula además la carga
+por tripletes: un `create` por nodo y arista, `--concurrencia` a la vez.
+
+Uso (desde backend/):
+    python -m benchmarks.bench_embeddings --archivo data/sintetico_100k.ndjson
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from benchmarks.escritor_memoria import GraphitiMemoria
+from services.construccion_grafo import ConstructorGrafo
+from services.data_proceso_lectura import iterar_registros
+from services.embeddings import CacheEmbeddings, EmbedderCacheado, EmbedderLocal
+
+
+class EmbedderContador(EmbedderLocal):
+    def __init__(self, dimension: int):
+        super().__init__(dimension)
+        self.llamadas = 0
+        self.textos = 0
+
+    async def create(self, input_data):
+        self.llamadas += 1
+        self.textos += 1
+        return await super().create(input_data)
+
+    async def create_batch(self, input_data_list):
+        self.llamadas += 1
+        self.textos += len(input_data_list)
+        return await super().create_batch(input_data_list)
+
+
+async def carga_bulk(archivo: str, embedder: EmbedderCacheado):
+    from GraphittiSetting import GraphittiSetting
+
+    graphiti = GraphitiMemoria()
+    graphiti.embedder = embedder
+    cliente = GraphittiSetting(graphiti=graphiti)
+    await cliente.cargar_datos_bulk(iterar_registros(archivo))
+
+
+async def carga_tripletes(archivo: str, embedder: EmbedderCacheado, concurrencia: int):
+    # Lo que hace Graphiti.add_triplet: un embedding por nodo y uno por arista
+    semaforo = asyncio.Semaphore(concurrencia)
+
+    async def embeber(origen, arista, destino):
+        async with semaforo:
+            await asyncio.gather(
+                embedder.create([origen.name]),
+                embedder.create([arista.fact]),
+                embedder.create([destino.name]),
+            )
+
+    constructor = ConstructorGrafo()
+    tareas = [
+        embeber(*triplete)
+        for _, tripletes in constructor.construir(iterar_registros(archivo))
+        for triplete in tripletes
+    ]
+    await asyncio.gather(*tareas)
+
+
+def medir(nombre: str, base: EmbedderContador, corrida):
+    llamadas, textos = base.llamadas, base.textos
+    inicio = time.perf_counter()
+    asyncio.run(corrida)
+    print(
+        f"{nombre}: {time.perf_counter() - inicio:.2f}s, "
+        f"{base.llamadas - llamadas} llamadas al proveedor, {base.textos - textos} textos"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--archivo", default="data/interacciones_clientes.json")
+    parser.add_argument("--cache", default=os.path.join(tempfile.gettempdir(), "bench_embeddings.cache"))
+    parser.add_argument("--entradas", type=int, default=500_000)
+    parser.add_argument("--dimension", type=int, default=256)
+    parser.add_argument("--tripletes", action="store_true")
+    parser.add_argument("--concurrencia", type=int, default=8)
+    args = parser.parse_args()
+
+    if os.path.exists(args.cache):
+        os.remove(args.cache)
+    base = EmbedderContador(args.dimension)
+
+    def embedder():
+        return EmbedderCacheado(base, CacheEmbeddings(args.cache, args.dimension, args.entradas))
+
+    medir("Carga masiva (cache vacía)", base, carga_bulk(args.archivo, embedder()))
+    medir("Recarga masiva", base, carga_bulk(args.archivo, embedder()))
+    if args.tripletes:
+        os.remove(args.cache)
+        medir(
+            "Carga por tripletes (cache vacía)",
+            base,
+            carga_tripletes(args.archivo, embedder(), args.concurrencia),
+        )
+        medir(
+            "Recarga por tripletes",
+            base,
+            carga_tripletes(args.archivo, embedder(), args.concurrencia),
+        )
+        sin_cache = EmbedderCacheado(base)
+        medir(
+            "Tripletes sin cache (solo lotes)",
+            base,
+            carga_tripletes(args.archivo, sin_cache, args.concurrencia),
+        )
+
+
+if __name__ == "__main__":
+    main()
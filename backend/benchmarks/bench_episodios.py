@@ -0,0 +1,85 @@
+"""Carga por episodios con un LLM local que simula latencia y contexto.
+
+Compara el episodio único con todo el dataset (la carga anterior, que falla
+en cuanto el prompt excede el contexto del modelo) con los episodios por
+cliente a distintas concurrencias. El LLM no extrae nada: tarda `--latencia`
+segundos por llamada más el tiempo de procesar los tokens del prompt.
+
+Uso (desde backend/):
+    python -m benchmarks.bench_episodios --archivo data/sintetico_100k.ndjson
+"""
+import argparse
+import asyncio
+import json
+import time
+from datetime import datetime, timezone
+
+from benchmarks.escritor_memoria import GraphitiMemoria
+from services.construccion_grafo import registros_de
+from services.data_proceso_lectura import iterar_registros
+from services.llm_local import LLMLocal
+
+
+def _cliente(args):
+    from GraphittiSetting import GraphittiSetting
+
+    llm = LLMLocal(
+        contexto=args.contexto, latencia=args.latencia, tokens_por_segundo=args.tokens_por_segundo
+    )
+    return GraphittiSetting(graphiti=GraphitiMemoria(llm_client=llm)), llm
+
+
+async def episodio_unico(cliente, datos):
+    # Lo que hacía cargar_datos: un solo episodio con todo el dataset
+    cuerpo = json.dumps(
+        {"registros": [r.model_dump(mode="json") for r in registros_de(datos)]}
+    )
+    await cliente.graphiti.add_episode(
+        name="Dataset completo",
+        episode_body=cuerpo,
+        source_description="Carga completa",
+        reference_time=datetime.now(timezone.utc),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--archivo", default="data/interacciones_clientes.json")
+    parser.add_argument("--concurrencias", default="1,8,32")
+    parser.add_argument("--max-interacciones", type=int, default=50)
+    parser.add_argument("--latencia", type=float, default=0.2)
+    parser.add_argument("--tokens-por-segundo", type=float, default=50_000)
+    parser.add_argument("--contexto", type=int, default=128_000)
+    args = parser.parse_args()
+
+    datos = list(iterar_registros(args.archivo))
+    print(f"{len(datos)} registros")
+
+    cliente, llm = _cliente(args)
+    inicio = time.perf_counter()
+    try:
+        asyncio.run(episodio_unico(cliente, datos))
+        resultado = "ok"
+    except Exception as e:
+        resultado = f"falla ({e})"
+    print(f"Episodio único: {time.perf_counter() - inicio:.2f}s, {resultado}")
+
+    for concurrencia in map(int, args.concurrencias.split(",")):
+        cliente, llm = _cliente(args)
+        inicio = time.perf_counter()
+        resumen = asyncio.run(
+            cliente.cargar_datos(
+                datos, concurrencia=concurrencia, max_interacciones=args.max_interacciones
+            )
+        )
+        duracion = time.perf_counter() - inicio
+        print(
+            f"Episodios por cliente, concurrencia {concurrencia}: {duracion:.2f}s, "
+            f"{resumen['episodios']} episodios ({resumen['escritos'] / duracion:.1f}/s), "
+            f"{resumen['fallidos']} fallidos, {llm.llamadas} llamadas al LLM, "
+            f"{llm.tokens // max(llm.llamadas, 1)} tokens por llamada"
+        )
+
+
+if __name__ == "__main__":
+    main()
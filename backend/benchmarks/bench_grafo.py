@@ -0,0 +1,55 @@
+"""Latencia de `/grafo` sobre la proyección en memoria.
+
+Uso (desde backend/):
+    python -m benchmarks.bench_grafo --interacciones 100000
+"""
+import argparse
+import time
+
+from services.proyeccion_grafo import ProyeccionGrafo, a_json
+from benchmarks.bench_kpis import generar
+
+
+def medir(nombre, consulta, repeticiones=5):
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        elementos, pagina = consulta()
+        tamano = sum(len(fragmento) for fragmento in a_json(elementos, pagina))
+    transcurrido = (time.perf_counter() - inicio) / repeticiones
+    print(f"{nombre}: {transcurrido * 1e3:.1f}ms ({tamano / 1e6:.2f} MB)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--clientes", type=int, default=10_000)
+    parser.add_argument("--interacciones", type=int, default=100_000)
+    parser.add_argument("--limite", type=int, default=1000)
+    args = parser.parse_args()
+
+    registros = list(generar(args.clientes, args.interacciones))
+    inicio = time.perf_counter()
+    proyeccion = ProyeccionGrafo()
+    proyeccion.aplicar_lote(registros)
+    print(f"Construcción: {time.perf_counter() - inicio:.2f}s")
+
+    medir("Primera página", lambda: proyeccion.proyectar(limite=args.limite))
+    medir(
+        "Página filtrada por tipo",
+        lambda: proyeccion.proyectar(tipos=["pago_recibido"], limite=args.limite),
+    )
+    elementos, pagina = proyeccion.proyectar(limite=args.limite)
+    for _ in elementos:
+        pass
+    medir(
+        "Segunda página (cursor)",
+        lambda: proyeccion.proyectar(cursor=pagina["siguiente"], limite=args.limite),
+    )
+    medir("Agregado cliente–agente", lambda: proyeccion.agregar(limite=args.limite))
+    medir(
+        "Agregado con tipo",
+        lambda: proyeccion.agregar(tipos=["llamada_saliente"], limite=args.limite),
+    )
+
+
+if __name__ == "__main__":
+    main()
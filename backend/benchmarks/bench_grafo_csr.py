@@ -0,0 +1,76 @@
+"""Snapshot CSR del grafo: exportación, apertura y consultas de vecindario.
+
+Exporta el grafo de la carga a un snapshot CSR, lo abre
+mapeado en memoria y mide el grado, los vecinos, los atributos y el
+alcance de los agentes (clientes a 2 saltos) sobre nodos al azar.
+
+Uso (desde backend/):
+    python -m benchmarks.bench_grafo_csr --archivo data/sintetico_100k.ndjson
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+import numpy as np
+
+from services.data_proceso_lectura import iterar_registros
+from services.grafo_csr import AMBAS, GrafoCSR, exportar_csr
+
+
+def medir(nombre: str, funcion, argumentos):
+    inicio = time.perf_counter()
+    for argumento in argumentos:
+        funcion(argumento)
+    print(f"{nombre}: {(time.perf_counter() - inicio) / len(argumentos) * 1e6:.1f}µs")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--archivo", default="data/interacciones_clientes.json")
+    parser.add_argument("--consultas", type=int, default=10_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, "grafo.csr")
+        inicio = time.perf_counter()
+        resumen = exportar_csr(iterar_registros(args.archivo), ruta)
+        print(
+            f"Exportación: {time.perf_counter() - inicio:.2f}s, {resumen['nodos']} nodos, "
+            f"{resumen['aristas']} aristas, {resumen['bytes'] / 1e6:.1f} MB"
+        )
+
+        inicio = time.perf_counter()
+        grafo = GrafoCSR(ruta)
+        print(f"Apertura (mmap): {(time.perf_counter() - inicio) * 1e3:.2f}ms")
+
+        rnd = random.Random(7)
+        nodos = [rnd.randrange(grafo.num_nodos) for _ in range(args.consultas)]
+        medir("grado", grafo.grado, nodos)
+        medir("vecinos (ambas direcciones)", lambda n: grafo.vecinos(n, AMBAS), nodos)
+        medir("atributos", grafo.atributos, nodos[:1000])
+        uuids = [grafo.uuid(n) for n in nodos[:1000]]
+        medir("buscar_uuid", grafo.buscar_uuid, uuids)
+
+        agentes = grafo.nodos("AGENTE")
+        clientes = grafo.nodos("CLIENTE")
+        if len(agentes):
+            def alcance(agente):
+                vecindario = grafo.vecindario([agente], saltos=2)
+                return vecindario[(vecindario >= clientes.start) & (vecindario < clientes.stop)]
+
+            muestra = [rnd.choice(agentes) for _ in range(min(200, args.consultas))]
+            medir("alcance de un agente (clientes a 2 saltos)", alcance, muestra)
+
+        inicio = time.perf_counter()
+        grados = grafo.grados(AMBAS)
+        print(
+            f"Grados de todos los nodos: {(time.perf_counter() - inicio) * 1e3:.2f}ms "
+            f"(máximo {int(grados.max()) if len(grados) else 0}, medio {np.mean(grados):.2f})"
+        )
+        grafo.cerrar()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""Latencia del detalle de cliente con el índice por `cliente_id`.
+
+Uso (desde backend/):
+    python -m benchmarks.bench_indice --interacciones 200000 --clientes 5
+"""
+import argparse
+import time
+from datetime import timedelta
+
+from services.indice_clientes import IndiceClientes
+from benchmarks.bench_kpis import generar
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--clientes", type=int, default=5)
+    parser.add_argument("--interacciones", type=int, default=200_000)
+    args = parser.parse_args()
+
+    registros = list(generar(args.clientes, args.interacciones))
+    inicio = time.perf_counter()
+    indice = IndiceClientes()
+    indice.aplicar_lote(registros)
+    print(f"Construcción: {time.perf_counter() - inicio:.2f}s")
+
+    cliente_id = "cliente_000000"
+    total = len(indice.rango(cliente_id))
+    primera = indice.rango(cliente_id)[0].timestamp
+
+    repeticiones = 1_000
+    inicio = time.perf_counter()
+    for n in range(repeticiones):
+        desde = primera + timedelta(hours=n)
+        indice.rango(cliente_id, "pagos", desde, desde + timedelta(days=7))
+    print(
+        f"Rango de 7 días ({total} interacciones del cliente): "
+        f"{(time.perf_counter() - inicio) / repeticiones * 1e6:.1f}µs"
+    )
+
+    inicio = time.perf_counter()
+    for _ in range(10):
+        indice.detalle(cliente_id)
+    print(f"Detalle completo: {(time.perf_counter() - inicio) / 10 * 1e3:.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
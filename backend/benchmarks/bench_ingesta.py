@@ -0,0 +1,220 @@
+"""Benchmark de ingesta por etapas contra un escritor en memoria.
+
+Mide lectura (parse), validación, construcción de nodos/aristas y escritura
+(por tripletes y por lotes), más la carga completa en streaming. La lectura
+validada se mide con los modelos planos y con el esquema estricto por `tipo`
+(parse + validación desde bytes), y la validación del archivo completo en el
+pool de procesos de `validar_archivo`. Cada etapa
+corre en un proceso propio para que el pico de RSS sea el de esa etapa; la
+entrada de cada etapa se prepara antes de empezar a medir.
+
+Uso (desde backend/):
+    python -m benchmarks.bench_ingesta --clientes 10000
+    python -m benchmarks.bench_ingesta --archivo data/sintetico_100k.ndjson --salida base.json
+    python -m benchmarks.bench_ingesta --archivo data/sintetico_100k.ndjson --comparar base.json
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from services.data_proceso_lectura import EXTENSIONES_NDJSON
+
+ETAPAS = (
+    "parse",
+    "validacion",
+    "lectura_plana",
+    "lectura_estricta",
+    "validacion_paralela",
+    "construccion",
+    "escritura_tripletes",
+    "escritura_bulk",
+    "extremo_a_extremo",
+    "cargar_validar_json",
+)
+
+
+def _pico_rss_mb() -> float:
+    # ru_maxrss está en KB en Linux y en bytes en macOS
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return pico / (1 << 20) if sys.platform == "darwin" else pico / 1024
+
+
+def _crudos(archivo: str) -> list:
+    if Path(archivo).suffix in EXTENSIONES_NDJSON:
+        with open(archivo, encoding="utf-8") as f:
+            crudos = [json.loads(linea) for linea in f if linea.strip()]
+        return [c for c in crudos if "metadata" not in c]
+    with open(archivo, encoding="utf-8") as f:
+        documento = json.load(f)
+    return documento.get("clientes", []) + documento.get("interacciones", [])
+
+
+def _cliente_memoria():
+    from GraphittiSetting import GraphittiSetting
+    from benchmarks.escritor_memoria import GraphitiMemoria
+
+    return GraphittiSetting(graphiti=GraphitiMemoria())
+
+
+def ejecutar_etapa(etapa: str, archivo: str, procesos: int = 0) -> dict:
+    """Corre una etapa en el proceso actual; devuelve tiempo, registros y pico de RSS."""
+    from services.construccion_grafo import ConstructorGrafo
+    from services.data_proceso_lectura import (
+        cargar_validar_json,
+        iterar_registros,
+        validar_registro,
+    )
+
+    extra = {}
+    if etapa == "parse":
+        inicio = time.perf_counter()
+        registros = len(_crudos(archivo))
+    elif etapa == "validacion":
+        crudos = _crudos(archivo)
+        inicio = time.perf_counter()
+        registros = sum(1 for c in crudos if validar_registro(c))
+    elif etapa in ("lectura_plana", "lectura_estricta"):
+        inicio = time.perf_counter()
+        estricto = etapa == "lectura_estricta"
+        registros = sum(1 for _ in iterar_registros(archivo, estricto=estricto))
+    elif etapa == "validacion_paralela":
+        from services.validacion import validar_archivo
+
+        inicio = time.perf_counter()
+        conteos, rechazos = validar_archivo(archivo, procesos or None)
+        registros, extra = sum(conteos.values()), {"rechazados": len(rechazos)}
+    elif etapa == "construccion":
+        datos = list(iterar_registros(archivo))
+        inicio = time.perf_counter()
+        tripletes = sum(len(t) for _, t in ConstructorGrafo().construir(datos))
+        registros, extra = len(datos), {"tripletes": tripletes}
+    elif etapa in ("escritura_tripletes", "escritura_bulk"):
+        datos = list(iterar_registros(archivo))
+        cliente = _cliente_memoria()
+        inicio = time.perf_counter()
+        if etapa == "escritura_tripletes":
+            asyncio.run(cliente.cargar_datos_triplet_completo(datos))
+        else:
+            asyncio.run(cliente.cargar_datos_bulk(datos))
+        registros = len(datos)
+        extra = {
+            "nodos": len(cliente.graphiti.driver.nodos),
+            "aristas": len(cliente.graphiti.driver.aristas),
+        }
+    elif etapa == "extremo_a_extremo":
+        cliente = _cliente_memoria()
+        contador = {"registros": 0}
+
+        def contar(registros):
+            for registro in registros:
+                contador["registros"] += 1
+                yield registro
+
+        inicio = time.perf_counter()
+        asyncio.run(cliente.cargar_datos_bulk(contar(iterar_registros(archivo))))
+        registros = contador["registros"]
+    elif etapa == "cargar_validar_json":
+        inicio = time.perf_counter()
+        data = cargar_validar_json(archivo)
+        registros = len(data.clientes or []) + len(data.interacciones or [])
+    else:
+        raise ValueError(f"Etapa desconocida: {etapa}")
+
+    segundos = time.perf_counter() - inicio
+    return {
+        "etapa": etapa,
+        "registros": registros,
+        "segundos": segundos,
+        "registros_por_segundo": registros / segundos if segundos else 0.0,
+        "pico_rss_mb": _pico_rss_mb(),
+        **extra,
+    }
+
+
+def ejecutar_aislada(etapa: str, archivo: str, procesos: int = 0) -> dict:
+    contexto = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=1, mp_context=contexto) as proceso:
+        return proceso.submit(ejecutar_etapa, etapa, archivo, procesos).result()
+
+
+def comparar(resultados: list, base: list, tolerancia: float) -> list:
+    """Etapas más lentas o con más memoria que `base` por encima de `tolerancia`."""
+    anteriores = {r["etapa"]: r for r in base}
+    regresiones = []
+    for actual in resultados:
+        anterior = anteriores.get(actual["etapa"])
+        if anterior is None:
+            continue
+        if actual["registros_por_segundo"] < anterior["registros_por_segundo"] * (1 - tolerancia):
+            regresiones.append(
+                f"{actual['etapa']}: {actual['registros_por_segundo']:,.0f} reg/s "
+                f"(antes {anterior['registros_por_segundo']:,.0f})"
+            )
+        if actual["pico_rss_mb"] > anterior["pico_rss_mb"] * (1 + tolerancia):
+            regresiones.append(
+                f"{actual['etapa']}: {actual['pico_rss_mb']:.0f} MB "
+                f"(antes {anterior['pico_rss_mb']:.0f} MB)"
+            )
+    return regresiones
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--archivo", help="Dataset existente; si falta se genera uno")
+    parser.add_argument("--clientes", type=int, default=10_000)
+    parser.add_argument("--formato", choices=("json", "ndjson"), default="ndjson")
+    parser.add_argument("--etapas", nargs="+", choices=ETAPAS, default=list(ETAPAS))
+    parser.add_argument("--salida", help="Guarda los resultados en JSON")
+    parser.add_argument("--comparar", help="Resultados previos (--salida) para detectar regresiones")
+    parser.add_argument("--tolerancia", type=float, default=0.2)
+    parser.add_argument(
+        "--procesos", type=int, default=0, help="Pool de validacion_paralela (0: uno por CPU)"
+    )
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temporal:
+        archivo = args.archivo
+        if archivo is None:
+            from benchmarks.generar_datos import Generador
+
+            archivo = os.path.join(temporal, f"sintetico.{args.formato}")
+            metadata = Generador(args.clientes).escribir(archivo)
+            print(
+                f"Dataset sintético: {metadata['total_clientes']} clientes, "
+                f"{metadata['total_interacciones']} interacciones"
+            )
+
+        resultados = []
+        print(f"{'etapa':<22}{'registros':>12}{'segundos':>10}{'reg/s':>12}{'pico RSS':>12}")
+        for etapa in args.etapas:
+            r = ejecutar_aislada(etapa, archivo, args.procesos)
+            resultados.append(r)
+            print(
+                f"{etapa:<22}{r['registros']:>12,}{r['segundos']:>10.2f}"
+                f"{r['registros_por_segundo']:>12,.0f}{r['pico_rss_mb']:>9.0f} MB"
+            )
+
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as f:
+            json.dump(resultados, f, indent=2)
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as f:
+            regresiones = comparar(resultados, json.load(f), args.tolerancia)
+        for regresion in regresiones:
+            print(f"[REGRESION] {regresion}")
+        if regresiones:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
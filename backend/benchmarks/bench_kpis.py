@@ -0,0 +1,148 @@
+"""Latencia del motor de KPIs y del cubo por periodo con un dataset sintético grande.
+
+Uso (desde backend/):
+    python -m benchmarks.bench_kpis --interacciones 1000000
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+from models import Cliente, Interaccion
+from services.cubo_kpis import GRANULARIDADES, CuboKPIs
+from services.kpis import MotorKPIs
+
+TIPOS_DEUDA = ("tarjeta_credito", "prestamo_personal", "hipoteca", "auto")
+
+
+def generar(num_clientes: int, num_interacciones: int, semilla: int = 7):
+    rnd = random.Random(semilla)
+    inicio = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    for n in range(num_clientes):
+        yield Cliente.model_construct(
+            id=f"cliente_{n:06d}",
+            nombre=f"Cliente {n + 1}",
+            monto_deuda_inicial=float(rnd.randint(500, 15000)),
+            tipo_deuda=TIPOS_DEUDA[n % len(TIPOS_DEUDA)],
+        )
+    for n in range(num_interacciones):
+        momento = inicio + timedelta(seconds=n * 7)
+        cliente_id = f"cliente_{rnd.randrange(num_clientes):06d}"
+        sorteo = rnd.random()
+        if sorteo < 0.2:
+            yield Interaccion.model_construct(
+                id=f"int_{n:08x}",
+                cliente_id=cliente_id,
+                timestamp=momento,
+                tipo="llamada_saliente",
+                agente_id=f"agente_{rnd.randrange(20):03d}",
+                resultado="promesa_pago",
+                monto_prometido=float(rnd.randint(100, 3000)),
+                fecha_promesa=momento + timedelta(days=rnd.randint(3, 20)),
+            )
+        elif sorteo < 0.3:
+            yield Interaccion.model_construct(
+                id=f"int_{n:08x}",
+                cliente_id=cliente_id,
+                timestamp=momento,
+                tipo="pago_recibido",
+                monto=float(rnd.randint(100, 3000)),
+                pago_completo=rnd.random() < 0.5,
+            )
+        else:
+            yield Interaccion.model_construct(
+                id=f"int_{n:08x}",
+                cliente_id=cliente_id,
+                timestamp=momento,
+                tipo="email",
+                agente_id=f"agente_{rnd.randrange(20):03d}",
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--clientes", type=int, default=50_000)
+    parser.add_argument("--interacciones", type=int, default=1_000_000)
+    parser.add_argument("--nuevas", type=int, default=10_000)
+    parser.add_argument("--lote", type=int, default=500)
+    args = parser.parse_args()
+
+    registros = list(generar(args.clientes, args.interacciones + args.nuevas))
+    base = registros[: args.clientes + args.interacciones]
+    nuevas = registros[args.clientes + args.interacciones :]
+
+    inicio = time.perf_counter()
+    motor = MotorKPIs.desde_registros(base)
+    print(f"Cálculo inicial ({args.interacciones} interacciones): {time.perf_counter() - inicio:.2f}s")
+
+    latencias = []
+    for interaccion in nuevas:
+        t = time.perf_counter()
+        motor.aplicar(interaccion)
+        latencias.append(time.perf_counter() - t)
+    latencias.sort()
+    print(
+        f"Actualización incremental: media {statistics.mean(latencias) * 1e6:.1f}µs, "
+        f"p99 {latencias[int(len(latencias) * 0.99)] * 1e6:.1f}µs"
+    )
+
+    repeticiones = 100_000
+    t = time.perf_counter()
+    for _ in range(repeticiones):
+        motor.snapshot()
+    print(f"Refresco /kpis (snapshot): {(time.perf_counter() - t) / repeticiones * 1e6:.2f}µs")
+
+    t = time.perf_counter()
+    diferencias = motor.verificar_consistencia()
+    print(
+        f"Recálculo completo: {time.perf_counter() - t:.2f}s, "
+        f"consistente={'sí' if not diferencias else diferencias}"
+    )
+
+    medir_cubo(base, nuevas, args.lote)
+
+
+def medir_cubo(base, nuevas, tamano_lote: int):
+    inicio = time.perf_counter()
+    cubo = CuboKPIs.desde_registros(base)
+    print(f"Cubo por periodo, cálculo inicial: {time.perf_counter() - inicio:.2f}s")
+
+    latencias = []
+    for desde in range(0, len(nuevas), tamano_lote):
+        t = time.perf_counter()
+        cubo.aplicar_lote(nuevas[desde: desde + tamano_lote])
+        latencias.append(time.perf_counter() - t)
+    print(f"Cubo, lote de {tamano_lote}: media {statistics.mean(latencias) * 1e3:.2f}ms")
+
+    # Los últimos 30 días cuestan lo mismo sin importar cuánto histórico hay
+    hasta = nuevas[-1].timestamp
+    for granularidad in GRANULARIDADES:
+        for nombre, desde in (("30 días", hasta - timedelta(days=30)), ("todo", None)):
+            repeticiones = 200
+            t = time.perf_counter()
+            for _ in range(repeticiones):
+                cubo.consultar(desde, hasta, granularidad=granularidad)
+            print(
+                f"/kpis?granularidad={granularidad} ({nombre}): "
+                f"{(time.perf_counter() - t) / repeticiones * 1e3:.2f}ms"
+            )
+
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, "cubo.npz")
+        t = time.perf_counter()
+        cubo.guardar(ruta, "bench")
+        guardado = time.perf_counter() - t
+        t = time.perf_counter()
+        restaurado = CuboKPIs()
+        restaurado.restaurar(ruta, "bench")
+        print(
+            f"Cubo en disco: {os.path.getsize(ruta) / 1024:.0f} KiB, guardar {guardado * 1e3:.1f}ms, "
+            f"restaurar {(time.perf_counter() - t) * 1e3:.1f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
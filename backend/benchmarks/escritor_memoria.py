@@ -0,0 +1,103 @@
+"""Sustituto en memoria de Graphiti/Neo4j para medir la carga sin base de datos.
+
+Implementa solo lo que usan los cargadores de `GraphittiSetting`:
+`add_triplet`, `add_episode`, `driver.session().execute_write` (escritura por
+lotes de `add_nodes_and_edges_bulk`), `driver.execute_query`, el `embedder` y
+`close`. Las escrituras se guardan por UUID, como el MERGE de Neo4j.
+"""
+import uuid
+from types import SimpleNamespace
+
+from graphiti_core.driver.driver import GraphProvider
+from graphiti_core.prompts.models import Message
+
+from services.llm_local import LLMLocal
+
+
+class EmbedderMemoria:
+    def __init__(self, dimension: int = 8):
+        self.vector = [0.0] * dimension
+
+    async def create(self, input_data):
+        return list(self.vector)
+
+    async def create_batch(self, input_data_list):
+        return [list(self.vector) for _ in input_data_list]
+
+
+class _TransaccionMemoria:
+    def __init__(self, driver: "DriverMemoria"):
+        self.driver = driver
+
+    async def run(self, query, **parametros):
+        for nodo in parametros.get("nodes", []):
+            self.driver.nodos[nodo["uuid"]] = nodo
+        for arista in parametros.get("entity_edges", []):
+            self.driver.aristas[arista["uuid"]] = arista
+
+
+class _SesionMemoria:
+    def __init__(self, driver: "DriverMemoria"):
+        self.driver = driver
+
+    async def execute_write(self, funcion, *args, **kwargs):
+        return await funcion(_TransaccionMemoria(self.driver), *args, **kwargs)
+
+    async def close(self):
+        pass
+
+
+class DriverMemoria:
+    provider = GraphProvider.NEO4J
+
+    def __init__(self):
+        self.nodos = {}
+        self.aristas = {}
+        self.consultas = 0
+
+    def session(self, database=None):
+        return _SesionMemoria(self)
+
+    async def execute_query(self, query, **parametros):
+        self.consultas += 1
+        return [], None, None
+
+    async def close(self):
+        pass
+
+
+class GraphitiMemoria:
+    def __init__(self, dimension_embedding: int = 8, llm_client=None):
+        self.driver = DriverMemoria()
+        self.embedder = EmbedderMemoria(dimension_embedding)
+        self.llm_client = llm_client or LLMLocal()
+        self.episodios = {}
+
+    async def add_triplet(self, origen, arista, destino):
+        for nodo in (origen, destino):
+            self.driver.nodos[nodo.uuid] = nodo
+        self.driver.aristas[arista.uuid] = arista
+
+    async def add_episode(self, name, episode_body, source_description, reference_time, **kwargs):
+        # Lo que cuesta add_episode es el LLM: una llamada para extraer las
+        # entidades y otra para las aristas, con el episodio y los anteriores
+        previos = kwargs.get("previous_episode_uuids") or ()
+        contexto = "\n".join(self.episodios[u]["content"] for u in previos)
+        for tarea in ("entidades", "aristas"):
+            await self.llm_client.generate_response(
+                [
+                    Message(role="system", content=f"Extrae {tarea} del episodio."),
+                    Message(role="user", content=f"{contexto}\n{episode_body}"),
+                ]
+            )
+        episodio = {
+            "uuid": str(uuid.uuid4()),
+            "name": name,
+            "content": episode_body,
+            "valid_at": reference_time,
+        }
+        self.episodios[episodio["uuid"]] = episodio
+        return SimpleNamespace(episode=SimpleNamespace(uuid=episodio["uuid"]), nodes=[], edges=[])
+
+    async def close(self):
+        pass
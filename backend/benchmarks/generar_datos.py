@@ -0,0 +1,287 @@
+"""Generador de datasets sintéticos con el esquema de `data/modelo_datos.txt`.
+
+Respeta los campos condicionales por `tipo`/`resultado` y las proporciones del
+dataset de ejemplo (tipos, resultados, sentimientos), y encadena las promesas
+con sus pagos: parte de las promesas se paga a tiempo (total o parcial), otra
+parte tarde y el resto nunca. Los clientes se generan por bloques y las
+interacciones se mezclan en orden de timestamp desde archivos temporales, así
+la memoria no depende del tamaño del dataset.
+
+Uso (desde backend/):
+    python -m benchmarks.generar_datos --clientes 100000 --salida data/sintetico_100k.ndjson
+"""
+import argparse
+import heapq
+import json
+import os
+import random
+import tempfile
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterator, List, Tuple
+
+TIPOS = {
+    "llamada_saliente": 0.61,
+    "llamada_entrante": 0.14,
+    "email": 0.09,
+    "sms": 0.05,
+    # Pagos espontáneos; el resto de los pagos sale de promesas y pago_inmediato
+    "pago_recibido": 0.01,
+}
+RESULTADOS = {
+    "promesa_pago": 0.255,
+    "sin_respuesta": 0.23,
+    "renegociacion": 0.146,
+    "pago_inmediato": 0.13,
+    "se_niega_pagar": 0.125,
+    "disputa": 0.114,
+}
+SENTIMIENTOS = {
+    "promesa_pago": {"cooperativo": 0.64, "neutral": 0.36},
+    "sin_respuesta": {"n/a": 1.0},
+    "renegociacion": {"cooperativo": 0.55, "frustrado": 0.45},
+    "pago_inmediato": {"cooperativo": 1.0},
+    "se_niega_pagar": {"hostil": 1.0},
+    "disputa": {"frustrado": 0.5, "hostil": 0.5},
+}
+TIPOS_DEUDA = ("tarjeta_credito", "prestamo_personal", "hipoteca", "auto")
+METODOS_PAGO = {"transferencia": 0.42, "tarjeta": 0.32, "efectivo": 0.26}
+
+# Promesas: fracción que se paga antes de fecha_promesa, tarde o nunca
+PROMESA_A_TIEMPO = 0.3
+PROMESA_TARDE = 0.1
+PAGO_PARCIAL = 0.3
+# Fracción de "pago_inmediato" que efectivamente registra un pago
+PAGO_INMEDIATO = 0.5
+
+TAMANO_BLOQUE = 10_000
+
+
+def _elegir(rnd: random.Random, pesos: Dict[str, float]) -> str:
+    return rnd.choices(list(pesos), weights=list(pesos.values()))[0]
+
+
+def _iso(momento: datetime) -> str:
+    return momento.strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+class Generador:
+    def __init__(
+        self,
+        num_clientes: int,
+        interacciones_por_cliente: int = 10,
+        dias: int = 90,
+        num_agentes: int = 0,
+        semilla: int = 7,
+        fin: datetime = datetime(2025, 8, 12, 13, 37, 49, tzinfo=timezone.utc),
+    ):
+        self.num_clientes = num_clientes
+        self.interacciones_por_cliente = interacciones_por_cliente
+        self.dias = dias
+        self.num_agentes = num_agentes or max(10, num_clientes // 50)
+        self.rnd = random.Random(semilla)
+        self.fin = fin
+        self.inicio = fin - timedelta(days=dias)
+        self.ancho = max(3, len(str(num_clientes - 1)))
+        self.contador = 0
+
+    def _nuevo_id(self) -> str:
+        # Biyección sobre 32 bits: IDs únicos con aspecto aleatorio
+        self.contador += 1
+        return f"int_{(self.contador * 2654435761) % (1 << 32):08x}"
+
+    def _pago(self, cliente_id: str, momento: datetime, monto: float, completo: bool) -> dict:
+        return {
+            "id": self._nuevo_id(),
+            "cliente_id": cliente_id,
+            "timestamp": _iso(momento),
+            "tipo": "pago_recibido",
+            "monto": round(monto),
+            "metodo_pago": _elegir(self.rnd, METODOS_PAGO),
+            "pago_completo": completo,
+        }
+
+    def cliente(self, n: int) -> Tuple[dict, List[dict]]:
+        rnd = self.rnd
+        cliente_id = f"cliente_{n:0{self.ancho}d}"
+        deuda = rnd.randint(500, 10_000)
+        cliente = {
+            "id": cliente_id,
+            "nombre": f"Cliente {n + 1}",
+            "telefono": f"+507 6{rnd.randint(0, 999):03d}-{rnd.randint(0, 9999):04d}",
+            "monto_deuda_inicial": deuda,
+            "fecha_prestamo": (self.inicio - timedelta(days=rnd.randint(30, 365))).strftime(
+                "%Y-%m-%d"
+            ),
+            "tipo_deuda": rnd.choice(TIPOS_DEUDA),
+        }
+
+        media = self.interacciones_por_cliente
+        cantidad = rnd.randint(max(1, media // 2), max(1, media * 3 // 2))
+        segundos = self.dias * 86_400
+        momentos = sorted(
+            self.inicio + timedelta(seconds=rnd.uniform(0, segundos)) for _ in range(cantidad)
+        )
+
+        saldo = float(deuda)
+        eventos: List[Tuple[datetime, dict]] = []
+        for momento in momentos:
+            tipo = _elegir(rnd, TIPOS)
+            if tipo == "pago_recibido":
+                if saldo > 0:
+                    monto = min(saldo, saldo * rnd.uniform(0.05, 0.3) + 50)
+                    saldo -= monto
+                    pago = self._pago(cliente_id, momento, monto, rnd.random() < 0.5)
+                    eventos.append((momento, pago))
+                continue
+            if tipo in ("email", "sms"):
+                eventos.append(
+                    (
+                        momento,
+                        {
+                            "id": self._nuevo_id(),
+                            "cliente_id": cliente_id,
+                            "timestamp": _iso(momento),
+                            "tipo": tipo,
+                        },
+                    )
+                )
+                continue
+
+            resultado = _elegir(rnd, RESULTADOS)
+            llamada = {
+                "id": self._nuevo_id(),
+                "cliente_id": cliente_id,
+                "timestamp": _iso(momento),
+                "tipo": tipo,
+                "duracion_segundos": (
+                    rnd.randint(30, 60) if resultado == "sin_respuesta" else rnd.randint(60, 600)
+                ),
+                "agente_id": f"agente_{rnd.randint(1, self.num_agentes):03d}",
+                "resultado": resultado,
+                "sentimiento": _elegir(rnd, SENTIMIENTOS[resultado]),
+            }
+            eventos.append((momento, llamada))
+
+            if resultado == "promesa_pago":
+                prometido = round(max(saldo, 100.0) * rnd.uniform(0.1, 0.5))
+                plazo = rnd.randint(3, 20)
+                fecha_promesa = momento + timedelta(days=plazo)
+                llamada["monto_prometido"] = prometido
+                llamada["fecha_promesa"] = fecha_promesa.strftime("%Y-%m-%d")
+
+                sorteo = rnd.random()
+                if sorteo < PROMESA_A_TIEMPO:
+                    pago_en = momento + timedelta(days=rnd.uniform(0.5, plazo))
+                elif sorteo < PROMESA_A_TIEMPO + PROMESA_TARDE:
+                    pago_en = fecha_promesa + timedelta(days=rnd.uniform(1, 10))
+                else:
+                    continue
+                if pago_en >= self.fin or saldo <= 0:
+                    continue
+                completo = rnd.random() >= PAGO_PARCIAL
+                monto = min(saldo, prometido if completo else prometido * rnd.uniform(0.3, 0.9))
+                saldo -= monto
+                eventos.append((pago_en, self._pago(cliente_id, pago_en, monto, completo)))
+            elif resultado == "pago_inmediato" and saldo > 0 and rnd.random() < PAGO_INMEDIATO:
+                pago_en = momento + timedelta(minutes=rnd.uniform(5, 120))
+                monto = min(saldo, saldo * rnd.uniform(0.05, 0.3) + 50)
+                saldo -= monto
+                pago = self._pago(cliente_id, pago_en, monto, rnd.random() < 0.5)
+                eventos.append((pago_en, pago))
+            elif resultado == "renegociacion":
+                cuotas = rnd.randint(3, 24)
+                llamada["nuevo_plan_pago"] = {
+                    "cuotas": cuotas,
+                    "monto_mensual": round(max(saldo, 100.0) * rnd.uniform(1.05, 1.3) / cuotas),
+                }
+
+        eventos.sort(key=lambda e: e[0])
+        return cliente, [e for _, e in eventos if e["timestamp"] < _iso(self.fin)]
+
+    def escribir(self, salida: str) -> dict:
+        """Escribe el dataset en JSON o NDJSON (según la extensión) y devuelve la metadata."""
+        ndjson = os.path.splitext(salida)[1] in (".ndjson", ".jsonl")
+        with tempfile.TemporaryDirectory() as temporal:
+            ruta_clientes = os.path.join(temporal, "clientes.ndjson")
+            bloques: List[str] = []
+            total_interacciones = 0
+            with open(ruta_clientes, "w", encoding="utf-8") as clientes:
+                for inicio in range(0, self.num_clientes, TAMANO_BLOQUE):
+                    lineas = []
+                    for n in range(inicio, min(inicio + TAMANO_BLOQUE, self.num_clientes)):
+                        cliente, interacciones = self.cliente(n)
+                        clientes.write(json.dumps(cliente, ensure_ascii=False) + "\n")
+                        lineas.extend(
+                            f"{i['timestamp']}\t{json.dumps(i, ensure_ascii=False)}\n"
+                            for i in interacciones
+                        )
+                    lineas.sort()
+                    total_interacciones += len(lineas)
+                    bloque = os.path.join(temporal, f"bloque_{len(bloques):05d}.tsv")
+                    with open(bloque, "w", encoding="utf-8") as f:
+                        f.writelines(lineas)
+                    bloques.append(bloque)
+
+            metadata = {
+                "fecha_generacion": self.fin.replace(tzinfo=None).isoformat(),
+                "total_clientes": self.num_clientes,
+                "total_interacciones": total_interacciones,
+                "periodo": f"{self.dias} días",
+            }
+            archivos = [open(b, encoding="utf-8") for b in bloques]
+            try:
+                interacciones = (linea.split("\t", 1)[1].rstrip("\n") for linea in heapq.merge(*archivos))
+                with open(ruta_clientes, encoding="utf-8") as clientes, open(
+                    salida, "w", encoding="utf-8"
+                ) as f:
+                    clientes_json = (linea.rstrip("\n") for linea in clientes)
+                    if ndjson:
+                        f.write(json.dumps({"metadata": metadata}, ensure_ascii=False) + "\n")
+                        for linea in clientes_json:
+                            f.write(linea + "\n")
+                        for linea in interacciones:
+                            f.write(linea + "\n")
+                    else:
+                        f.write('{"metadata": ' + json.dumps(metadata, ensure_ascii=False))
+                        _escribir_arreglo(f, "clientes", clientes_json)
+                        _escribir_arreglo(f, "interacciones", interacciones)
+                        f.write("}\n")
+            finally:
+                for archivo in archivos:
+                    archivo.close()
+        return metadata
+
+
+def _escribir_arreglo(f, clave: str, elementos: Iterator[str]):
+    f.write(f', "{clave}": [')
+    for i, elemento in enumerate(elementos):
+        f.write((",\n" if i else "\n") + elemento)
+    f.write("\n]")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clientes", type=int, default=10_000)
+    parser.add_argument("--interacciones-por-cliente", type=int, default=10)
+    parser.add_argument("--dias", type=int, default=90)
+    parser.add_argument("--agentes", type=int, default=0, help="0: uno cada 50 clientes (mínimo 10)")
+    parser.add_argument("--semilla", type=int, default=7)
+    parser.add_argument("--salida", required=True, help="Archivo .json o .ndjson/.jsonl")
+    args = parser.parse_args()
+
+    generador = Generador(
+        args.clientes,
+        interacciones_por_cliente=args.interacciones_por_cliente,
+        dias=args.dias,
+        num_agentes=args.agentes,
+        semilla=args.semilla,
+    )
+    metadata = generador.escribir(args.salida)
+    print(
+        f"{args.salida}: {metadata['total_clientes']} clientes, "
+        f"{metadata['total_interacciones']} interacciones"
+    )
+
+
+if __name__ == "__main__":
+    main()
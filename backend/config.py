@@ -1,4 +1,5 @@
 import os
+from pathlib import Path
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -8,7 +9,30 @@ NEO4J_USERNAME = os.environ.get("NEO4J_USERNAME")
 NEO4J_PASSWORD = os.environ.get("NEO4J_PASSWORD")
 OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")  # Gemini API
 
-if not all([NEO4J_URI, NEO4J_USERNAME, NEO4J_PASSWORD, OPENAI_API_KEY]):
-    raise ValueError(
-        "NEO4J_URI, NEO4J_USER, NEO4J_PASSWORD, OPEN_API_KEY deben estar definidos en .env"
-    )
+# Pool de conexiones por proceso: con varios workers de uvicorn el total hacia
+# Neo4j es workers × NEO4J_MAX_POOL_SIZE
+NEO4J_MAX_POOL_SIZE = int(os.environ.get("NEO4J_MAX_POOL_SIZE", 50))
+NEO4J_TIMEOUT_ADQUISICION = float(os.environ.get("NEO4J_TIMEOUT_ADQUISICION", 60))
+NEO4J_CONEXIONES_CALENTAMIENTO = int(os.environ.get("NEO4J_CONEXIONES_CALENTAMIENTO", 4))
+
+# LLM de extracción de la carga por episodios: "openai" o "local" (sin red,
+# no extrae nada; para pruebas y benchmarks)
+LLM = os.environ.get("LLM", "openai")
+
+# Embeddings: "openai" o "local" (determinista y sin red, para pruebas)
+EMBEDDER = os.environ.get("EMBEDDER", "openai")
+# Cache de embeddings en disco, compartida por todos los procesos que la
+# abren; una ruta vacía la desactiva
+EMBEDDINGS_CACHE = os.environ.get(
+    "EMBEDDINGS_CACHE", str(Path(__file__).resolve().parent / "data" / "embeddings.cache")
+)
+EMBEDDINGS_CACHE_ENTRADAS = int(os.environ.get("EMBEDDINGS_CACHE_ENTRADAS", 100_000))
+
+
+def validar_config():
+    # Se valida al crear el cliente, no al importar, para que los módulos que
+    # no tocan Neo4j se puedan importar sin .env
+    if not all([NEO4J_URI, NEO4J_USERNAME, NEO4J_PASSWORD, OPENAI_API_KEY]):
+        raise ValueError(
+            "NEO4J_URI, NEO4J_USER, NEO4J_PASSWORD, OPEN_API_KEY deben estar definidos en .env"
+        )
@@ -1,29 +1,272 @@
+import argparse
 import asyncio
 import logging
 from pathlib import Path
 from GraphittiSetting import GraphittiSetting
-from services.data_proceso_lectura import cargar_validar_json
+from services.bitacora import NUEVA, REANUDAR, REINTENTAR, Bitacora
+from services.data_proceso_lectura import iterar_registros, observar_lotes
+from services.grafo_csr import exportar_csr
+from services.ingesta_particionada import ConstruccionParticionada
+from services.metricas import metricas
+from services.perfilador import PerfiladorMuestreo
+from services.promesas import MotorPromesas
+from services.validacion import Rechazos, validar_archivo
 
 logging.basicConfig(level=logging.INFO)
 
 BASE_DIR = Path(__file__).resolve().parent
 DATA_FILE = BASE_DIR / "data" / "interacciones_clientes.json"
+BITACORA_FILE = BASE_DIR / "data" / "bitacora_carga.ndjson"
 
-async def main():
 
-    # Cargar y validar JSON
-    data = cargar_validar_json(DATA_FILE)
+def parse_args():
+    parser = argparse.ArgumentParser(description="Carga de interacciones en Graphiti")
+    parser.add_argument(
+        "--archivo",
+        type=Path,
+        default=DATA_FILE,
+        help="Archivo JSON o NDJSON (.ndjson/.jsonl) con clientes e interacciones",
+    )
+    parser.add_argument(
+        "--bulk",
+        action="store_true",
+        help="Escribe nodos y aristas por lotes en lugar de un triplete a la vez",
+    )
+    parser.add_argument(
+        "--tamano-lote",
+        type=int,
+        default=2000,
+        help="Nodos/aristas por transacción en modo --bulk",
+    )
+    parser.add_argument(
+        "--concurrencia",
+        type=int,
+        default=8,
+        help="Escritores concurrentes hacia Neo4j",
+    )
+    parser.add_argument(
+        "--episodios",
+        action="store_true",
+        help="Carga por episodios por cliente: Graphiti extrae entidades y aristas con el LLM",
+    )
+    parser.add_argument(
+        "--max-interacciones",
+        type=int,
+        default=50,
+        help="Interacciones por episodio en modo --episodios",
+    )
+    parser.add_argument(
+        "--particiones",
+        type=int,
+        default=0,
+        help="Lee, valida y construye en N procesos por hash de cliente_id (implica --bulk)",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Escribe solo interacciones posteriores al último watermark y clientes modificados",
+    )
+    parser.add_argument(
+        "--bitacora",
+        type=Path,
+        default=BITACORA_FILE,
+        metavar="RUTA",
+        help="Bitácora de progreso de la carga (registros escritos y fallidos)",
+    )
+    parser.add_argument(
+        "--reanudar",
+        action="store_true",
+        help="Retoma una carga interrumpida: omite lo que la bitácora registra como escrito o fallido",
+    )
+    parser.add_argument(
+        "--reintentar-fallidos",
+        action="store_true",
+        help="Escribe solo los registros que la bitácora registra como fallidos",
+    )
+    parser.add_argument(
+        "--reiniciar",
+        action="store_true",
+        help="Empieza la bitácora de cero aunque tenga el progreso de una carga anterior",
+    )
+    parser.add_argument(
+        "--rechazos",
+        type=Path,
+        metavar="RUTA",
+        help="Omite los registros inválidos y los reporta en RUTA (NDJSON) en lugar de abortar",
+    )
+    parser.add_argument(
+        "--solo-validar",
+        action="store_true",
+        help="Valida el archivo completo en paralelo sin cargarlo (usa --rechazos para el reporte)",
+    )
+    parser.add_argument(
+        "--exportar-csr",
+        type=Path,
+        metavar="RUTA",
+        help="Exporta el grafo a un snapshot CSR en RUTA (ver services/grafo_csr.py) sin escribir en Neo4j",
+    )
+    parser.add_argument(
+        "--procesos",
+        type=int,
+        default=0,
+        help="Procesos para --solo-validar (0: uno por CPU)",
+    )
+    parser.add_argument(
+        "--sin-metricas",
+        action="store_true",
+        help="Desactiva la instrumentación (equivale a METRICAS=0)",
+    )
+    parser.add_argument(
+        "--perfilar",
+        type=Path,
+        metavar="RUTA",
+        help="Muestrea la pila durante la carga y guarda las pilas colapsadas (flamegraph/speedscope)",
+    )
+    args = parser.parse_args()
+    if sum((args.reanudar, args.reintentar_fallidos, args.reiniciar)) > 1:
+        parser.error("--reanudar, --reintentar-fallidos y --reiniciar son excluyentes")
+    if args.episodios and (args.reanudar or args.reintentar_fallidos or args.reiniciar):
+        parser.error("--reanudar, --reintentar-fallidos y --reiniciar no aplican a --episodios")
+    return args
+
+
+async def main(args):
+
+    # La bitácora se abre antes que el cliente: si tiene progreso de una carga
+    # anterior y no se eligió qué hacer con él, no se empieza
+    bitacora = None
+    if not args.episodios:
+        modo = REANUDAR if args.reanudar else REINTENTAR if args.reintentar_fallidos else NUEVA
+        try:
+            bitacora = Bitacora(args.bitacora, modo, sobrescribir=args.reiniciar)
+        except ValueError as e:
+            raise SystemExit(f"[ERROR] {e}: usa --reanudar, --reintentar-fallidos o --reiniciar")
 
     #Init Graphiti
     client = GraphittiSetting()
+
+    # Leer y validar el archivo en streaming: los registros se escriben a medida
+    # que se leen, sin cargar el dataset completo en memoria. El emparejamiento
+    # de promesas y los saldos observan la misma lectura (solo guardan
+    # promesas, pagos y renegociaciones)
+    promesas = MotorPromesas()
+    rechazos = Rechazos() if args.rechazos else None
+    if args.particiones:
+        data = ConstruccionParticionada(
+            args.archivo, args.particiones, rechazos, [promesas, client.saldos]
+        )
+    else:
+        data = observar_lotes(
+            iterar_registros(args.archivo, rechazos=rechazos), [promesas, client.saldos]
+        )
+
     # await client._async_init()
-    # Cargar datos en Graphiti
-    await client.cargar_datos_triplet_completo(data)
+    try:
+        # Cargar datos en Graphiti
+        if args.episodios:
+            await client.cargar_datos(
+                data, concurrencia=args.concurrencia, max_interacciones=args.max_interacciones
+            )
+        elif args.bulk or args.particiones:
+            bitacora.iniciar(args.archivo.resolve(), "bulk")
+            await client.cargar_datos_bulk(
+                data,
+                tamano_lote=args.tamano_lote,
+                concurrencia=args.concurrencia,
+                incremental=args.incremental,
+                bitacora=bitacora,
+            )
+        else:
+            bitacora.iniciar(args.archivo.resolve(), "tripletes")
+            await client.cargar_datos_triplet_completo(
+                data,
+                concurrencia=args.concurrencia,
+                incremental=args.incremental,
+                bitacora=bitacora,
+            )
+        # Las aristas de promesas y monto_actual apuntan a los nodos PAGO y
+        # DEUDA de las cargas por tripletes y masiva: con --episodios no existen
+        if not args.episodios:
+            await client.cargar_cumplimiento_promesas(
+                promesas.cambios(), concurrencia=args.concurrencia
+            )
+            await client.actualizar_monto_actual(tamano_lote=args.tamano_lote)
+    finally:
+        await client.cerrar()
+        if bitacora is not None:
+            bitacora.cerrar()
+            reportar_bitacora(bitacora)
+        if rechazos is not None:
+            reportar_rechazos(rechazos, args.rechazos)
     # print(data)
     # print(DATA_FILE)
 
     print("Pipeline completado ✅")
 
 
+def reportar_bitacora(bitacora: Bitacora):
+    resumen = bitacora.resumen()
+    print(
+        f"Bitácora {bitacora.ruta}: {resumen['escritos']} registros escritos, "
+        f"{resumen['omitidos']} omitidos por estar ya procesados, {resumen['fallidos']} fallidos"
+    )
+    if resumen["fallidos"]:
+        print("  usa --reintentar-fallidos para volver a escribir solo los fallidos")
+
+
+def reportar_rechazos(rechazos: Rechazos, ruta: Path):
+    rechazos.escribir(ruta)
+    resumen = rechazos.resumen()
+    print(f"{resumen['rechazados']} registros rechazados (detalle en {ruta})")
+    for motivo, cantidad in resumen["motivos"].items():
+        print(f"  {cantidad:>8}  {motivo}")
+
+
+def solo_validar(args):
+    conteos, rechazos = validar_archivo(args.archivo, procesos=args.procesos or None)
+    print(
+        f"Validación: {conteos.get('cliente', 0)} clientes y "
+        f"{conteos.get('interaccion', 0)} interacciones válidos"
+    )
+    if args.rechazos:
+        reportar_rechazos(rechazos, args.rechazos)
+    elif rechazos:
+        print(f"[ERROR] {len(rechazos)} registros inválidos; usa --rechazos para el detalle")
+
+
+def exportar(args):
+    rechazos = Rechazos() if args.rechazos else None
+    resumen = exportar_csr(iterar_registros(args.archivo, rechazos=rechazos), args.exportar_csr)
+    print(
+        f"Snapshot CSR {args.exportar_csr}: {resumen['nodos']} nodos, "
+        f"{resumen['aristas']} aristas, {resumen['bytes'] / 1e6:.1f} MB"
+    )
+    if rechazos is not None:
+        reportar_rechazos(rechazos, args.rechazos)
+
+
+def ejecutar(args):
+    if args.sin_metricas:
+        metricas.habilitado = False
+    if args.solo_validar:
+        solo_validar(args)
+        return
+    if args.exportar_csr:
+        exportar(args)
+        return
+    if args.perfilar is None:
+        asyncio.run(main(args))
+    else:
+        with PerfiladorMuestreo() as perfilador:
+            asyncio.run(main(args))
+        perfilador.escribir(args.perfilar)
+        print(f"Perfil guardado en {args.perfilar}; funciones con más muestras:")
+        for funcion, muestras in perfilador.top(10):
+            print(f"  {muestras:>6}  {funcion}")
+    if metricas.habilitado:
+        print("Métricas de la carga:")
+        print(metricas.resumen())
+
+
 if __name__ == "__main__":
-    asyncio.run(main())
+    ejecutar(parse_args())
@@ -1,36 +1,289 @@
-from typing import Optional
-from fastapi import FastAPI
-from GraphittiSetting import GraphittiSetting
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import datetime
+import os
+import time
+from pathlib import Path
+from typing import List, Optional
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from services.agentes import ORDENES, VENTANAS_DIAS, MotorAgentes
+from services.cache_respuestas import CacheGeneracional
+from services.cubo_kpis import GRANULARIDADES, MES, CuboKPIs, huella_archivo
+from services.data_proceso_lectura import iterar_lotes
+from services.indice_clientes import IndiceClientes
+from services.ingesta_continua import MAX_ERRORES_RESPUESTA, ColaLlena, IngestaContinua
+from services.kpis import MotorKPIs
+from services.metricas import HTTP_SEGUNDOS, metricas
+from services.proyeccion_grafo import ProyeccionGrafo, a_json
+from services.saldos import MotorSaldos
 
-app = FastAPI()
+BASE_DIR = Path(__file__).resolve().parent
+DATA_FILE = Path(
+    os.environ.get("DATA_FILE", BASE_DIR / "data" / "interacciones_clientes.json")
+)
+# Cubo de KPIs por periodo guardado tras la carga inicial de DATA_FILE
+KPIS_CUBO_FILE = Path(os.environ.get("KPIS_CUBO", BASE_DIR / "data" / "kpis_cubo.npz"))
+
+# GraphittiSetting se crea en el lifespan de cada worker (ver `lifespan`)
+client = None
+kpis = MotorKPIs()
+cubo = CuboKPIs()
+agentes = MotorAgentes()
+# POST /ingest: cola acotada y micro-lotes hacia `client`
+ingesta = IngestaContinua(
+    capacidad=int(os.environ.get("INGESTA_CAPACIDAD", 10_000)),
+    tamano_lote=int(os.environ.get("INGESTA_TAMANO_LOTE", 500)),
+    espera=float(os.environ.get("INGESTA_ESPERA", 1.0)),
+)
+indice = IndiceClientes()
+proyeccion = ProyeccionGrafo()
+saldos = MotorSaldos()
+# Las respuestas solo cambian cuando `client` escribe: la cache se invalida
+# con su generación de ingesta
+cache = CacheGeneracional(
+    lambda: client.generacion if client is not None else 0,
+    max_entradas=int(os.environ.get("CACHE_MAX_ENTRADAS", 1024)),
+    ttl=float(os.environ.get("CACHE_TTL", 30)),
+)
+# Cada cuántos segundos se re-evalúan las promesas abiertas ya vencidas
+VENCIMIENTO_INTERVALO = float(os.environ.get("VENCIMIENTO_INTERVALO", 60))
+# Páginas de /grafo con `limite` mayor que esto no se cachean
+GRAFO_CACHE_MAX_LIMITE = int(os.environ.get("GRAFO_CACHE_MAX_LIMITE", 1000))
+
+# Modelos de lectura en memoria: se construyen una vez al arrancar y luego se
+# mantienen con cada lote que se escribe a través de `client`
+modelos_lectura = (kpis, cubo, indice, saldos, proyeccion, agentes)
+
+
+async def vencer_promesas():
+    # Sin ingesta nueva, una promesa abierta que vence pasa a incumplida solo
+    # si alguien la re-evalúa
+    while True:
+        await asyncio.sleep(VENCIMIENTO_INTERVALO)
+        reevaluados = sum(modelo.vencer() for modelo in (kpis, cubo, agentes))
+        if reevaluados and client is not None:
+            # Invalida las respuestas cacheadas con el estado anterior
+            client.generacion += 1
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global client
+    # Import diferido: graphiti_core es pesado y crea el driver de Neo4j, así
+    # que se carga en cada worker ya arrancado (después del fork) y no al
+    # importar el módulo
+    from GraphittiSetting import GraphittiSetting
+
+    # Con el mismo DATA_FILE el cubo se recupera del disco en vez de contarse
+    huella = huella_archivo(DATA_FILE)
+    cubo_restaurado = cubo.restaurar(KPIS_CUBO_FILE, huella)
+    for lote in iterar_lotes(DATA_FILE, tamano=10_000):
+        for modelo in modelos_lectura:
+            modelo.aplicar_lote(lote)
+        # Los clientes ya cargados se enlazan sin reescribirlos
+        ingesta.aplicar_lote(lote)
+    if cubo_restaurado:
+        cubo.terminar_reproduccion()
+    else:
+        cubo.guardar(KPIS_CUBO_FILE, huella)
+
+    client = GraphittiSetting(saldos=saldos)
+    for modelo in modelos_lectura:
+        client.registrar_observador(modelo)
+    await client.iniciar()
+    ingesta.iniciar(client)
+    vencimientos = asyncio.create_task(vencer_promesas())
+    try:
+        yield
+    finally:
+        vencimientos.cancel()
+        # Lo que quedó en la cola se escribe antes de cerrar el driver;
+        # cerrarlo evita dejar conexiones abiertas en cada recarga
+        await ingesta.cerrar()
+        await client.cerrar()
+        client = None
+
+
+app = FastAPI(lifespan=lifespan)
+
+
+@app.middleware("http")
+async def medir_peticiones(request: Request, call_next):
+    if not metricas.habilitado:
+        return await call_next(request)
+    inicio = time.perf_counter()
+    respuesta = await call_next(request)
+    # Se etiqueta con la plantilla de la ruta (/cliente/{cliente_id}) y no con
+    # la URL, para no crear una serie por cliente
+    ruta = request.scope.get("route")
+    HTTP_SEGUNDOS.observar(
+        time.perf_counter() - inicio,
+        ruta=ruta.path if ruta is not None else "desconocida",
+        metodo=request.method,
+        estado=respuesta.status_code,
+    )
+    return respuesta
 
-client = GraphittiSetting()
 
 @app.get("/test")
 async def root():
     res = await client.query()
     return "Hola"
 
+@app.get("/salud")
+async def salud():
+    estado = await client.salud()
+    if estado["neo4j"] != "ok":
+        return JSONResponse(status_code=503, content=estado)
+    return estado
+
+@app.post("/ingest")
+async def ingest(request: Request):
+    # Cuerpo NDJSON de clientes e interacciones, validado a medida que llega
+    try:
+        return await ingesta.recibir(request.stream())
+    except ColaLlena as e:
+        return JSONResponse(
+            status_code=429,
+            headers={"Retry-After": str(max(1, round(ingesta.espera)))},
+            content={
+                "detalle": str(e),
+                "aceptados": e.aceptados,
+                "reenviar_desde_linea": e.linea,
+                "rechazados": len(e.rechazos),
+                "errores": e.rechazos.registros[:MAX_ERRORES_RESPUESTA],
+            },
+        )
+
+@app.post("/ingest/reintentar")
+async def reintentar_ingesta():
+    # Reencola los registros de micro-lotes que fallaron al escribirse
+    reencolados = ingesta.reintentar()
+    return {"reencolados": reencolados, "pendientes_reintento": len(ingesta.fallidos)}
+
+@app.get("/ingest/estado")
+async def estado_ingesta():
+    return ingesta.estado()
+
 @app.get("/kpis")
-async def obtener_kpis():
+async def obtener_kpis(
+    desde: Optional[datetime] = None,
+    hasta: Optional[datetime] = None,
+    tipo_deuda: Optional[List[str]] = Query(None),
+    granularidad: Optional[str] = Query(None, description=f"Uno de: {', '.join(GRANULARIDADES)}"),
+):
+    # Sin parámetros, los KPIs globales; con alguno, la serie por periodo y
+    # tipo_deuda del cubo
+    if desde is None and hasta is None and tipo_deuda is None and granularidad is None:
+        return await cache.obtener(cache.clave("kpis"), kpis.snapshot)
+
+    def calcular():
+        try:
+            return cubo.consultar(desde, hasta, tipo_deuda, granularidad or MES)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    clave = cache.clave(
+        "kpis", desde=desde, hasta=hasta, tipo_deuda=tipo_deuda, granularidad=granularidad
+    )
+    return await cache.obtener(clave, calcular)
+
+@app.get("/agentes")
+async def ranking_agentes(
+    ventana: int = Query(30, description=f"Días: {', '.join(map(str, VENTANAS_DIAS))}"),
+    orden: str = Query("recuperado", description=f"Uno de: {', '.join(ORDENES)}"),
+    limite: int = Query(50, ge=1, le=1000),
+):
+    def calcular():
+        try:
+            return agentes.ranking(ventana, orden, limite)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    clave = cache.clave("agentes", ventana=ventana, orden=orden, limite=limite)
+    return await cache.obtener(clave, calcular)
+
+@app.get("/agente/{agente_id}")
+async def agente_detalle(agente_id: str):
+    def calcular():
+        detalle = agentes.detalle(agente_id)
+        if detalle is None:
+            raise HTTPException(status_code=404, detail=f"Agente {agente_id} no encontrado")
+        return detalle
 
-    return {
-        "total_clientes": [],
-        "total_deudas": [],
-        "promesas_cumplidas": [],
-        "tasa_recuperacion": [],
-    }
+    return await cache.obtener(cache.clave("agente", agente_id=agente_id), calcular)
+
+@app.get("/cache")
+async def estadisticas_cache():
+    return cache.resumen()
+
+@app.get("/metrics")
+async def exportar_metricas():
+    # Formato de texto de Prometheus
+    return PlainTextResponse(metricas.exportar(), media_type="text/plain; version=0.0.4")
 
 @app.get("/cliente/{cliente_id}")
-async def cliente_detalle(cliente_id: str):
-    
-    return {
-        "cliente": [],
-        "interacciones": [],
-        "pagos": [],
-        "planes_pago": []
-    }
+async def cliente_detalle(
+    cliente_id: str,
+    desde: Optional[datetime] = None,
+    hasta: Optional[datetime] = None,
+    as_of: Optional[datetime] = None,
+):
+    # Con as_of se devuelve el estado del cliente a esa fecha
+    if as_of is not None and (hasta is None or hasta > as_of):
+        hasta = as_of
+
+    def calcular():
+        detalle = indice.detalle(cliente_id, desde, hasta)
+        if detalle is None:
+            raise HTTPException(status_code=404, detail=f"Cliente {cliente_id} no encontrado")
+        detalle["saldo"] = saldos.saldo(cliente_id, as_of)
+        return detalle
+
+    clave = cache.clave("cliente", cliente_id=cliente_id, desde=desde, hasta=hasta, as_of=as_of)
+    return await cache.obtener(clave, calcular)
 
 @app.get("/grafo")
-async def grafo(filter_tipo: Optional[str] = None):
-    return {"nodes": [], "edges": []}
+async def grafo(
+    filter_tipo: Optional[List[str]] = Query(None),
+    etiqueta: Optional[List[str]] = Query(None),
+    desde: Optional[datetime] = None,
+    hasta: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    limite: int = Query(1000, ge=1, le=10_000),
+    agregado: bool = False,
+):
+    # agregado=true colapsa las interacciones en aristas cliente–agente
+    def proyectar():
+        try:
+            if agregado:
+                elementos, pagina = proyeccion.agregar(filter_tipo, desde, hasta, cursor, limite)
+            else:
+                elementos, pagina = proyeccion.proyectar(
+                    filter_tipo, etiqueta, desde, hasta, cursor, limite
+                )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        return a_json(elementos, pagina)
+
+    # Las páginas grandes se generan en streaming sin pasar por la cache. La
+    # página se toma aquí, en el loop; en el threadpool de StreamingResponse
+    # solo se serializa esa copia mientras la ingesta sigue
+    if limite > GRAFO_CACHE_MAX_LIMITE:
+        return StreamingResponse(proyectar(), media_type="application/json")
+
+    clave = cache.clave(
+        "grafo",
+        filter_tipo=filter_tipo,
+        etiqueta=etiqueta,
+        desde=desde,
+        hasta=hasta,
+        cursor=cursor,
+        limite=limite,
+        agregado=agregado,
+    )
+    # Se cachean los fragmentos ya serializados, que se vuelven a enviar en
+    # streaming sin unirlos en un solo texto
+    fragmentos = await cache.obtener(clave, lambda: list(proyectar()))
+    return StreamingResponse(iter(fragmentos), media_type="application/json")
@@ -1,5 +1,5 @@
-from pydantic import BaseModel, Field
-from typing import Optional, List
+from pydantic import BaseModel, Field, model_validator
+from typing import Annotated, Literal, Optional, List, Union
 from datetime import datetime
 
 
@@ -68,6 +68,99 @@ class DataSetInteracciones(BaseModel):
     interacciones: Optional[List[Interaccion]] = Field(None, description="Lista de interacciones")
 
 
+## ESQUEMA ESTRICTO
+# Variantes por `tipo` con los campos condicionales de modelo_datos.txt como
+# obligatorios y los que no corresponden fijados en None. Heredan de Cliente e
+# Interaccion, así que el resto del código las usa sin cambios.
+TipoDeuda = Literal["tarjeta_credito", "prestamo_personal", "hipoteca", "auto"]
+Resultado = Literal[
+    "promesa_pago", "sin_respuesta", "renegociacion", "disputa", "pago_inmediato", "se_niega_pagar"
+]
+Sentimiento = Literal["cooperativo", "neutral", "frustrado", "hostil", "n/a"]
+MetodoPago = Literal["transferencia", "tarjeta", "efectivo"]
+
+
+class ClienteEstricto(Cliente):
+    id: str
+    nombre: str
+    telefono: str
+    monto_deuda_inicial: float = Field(ge=0)
+    fecha_prestamo: datetime
+    tipo_deuda: TipoDeuda
+
+
+class PlanPagoEstricto(NuevoPlanPago):
+    cuotas: int = Field(gt=0)
+    monto_mensual: float = Field(gt=0)
+
+
+class InteraccionLlamada(Interaccion):
+    id: str
+    cliente_id: str
+    timestamp: datetime
+    tipo: Literal["llamada_saliente", "llamada_entrante"]
+    duracion_segundos: int = Field(ge=0)
+    agente_id: str
+    resultado: Resultado
+    sentimiento: Sentimiento
+    nuevo_plan_pago: Optional[PlanPagoEstricto] = None
+    monto: None = None
+    metodo_pago: None = None
+    pago_completo: None = None
+
+    @model_validator(mode="after")
+    def _campos_por_resultado(self):
+        promesa = self.monto_prometido is not None or self.fecha_promesa is not None
+        if self.resultado == "promesa_pago":
+            if self.monto_prometido is None or self.fecha_promesa is None:
+                raise ValueError("promesa_pago requiere monto_prometido y fecha_promesa")
+        elif promesa:
+            raise ValueError(f"monto_prometido/fecha_promesa no aplican a {self.resultado}")
+        if (self.resultado == "renegociacion") != (self.nuevo_plan_pago is not None):
+            raise ValueError("nuevo_plan_pago solo aplica (y es obligatorio) en renegociacion")
+        return self
+
+
+class InteraccionMensaje(Interaccion):
+    id: str
+    cliente_id: str
+    timestamp: datetime
+    tipo: Literal["email", "sms"]
+    # agente_id se acepta: un email o sms puede salir de un agente
+    duracion_segundos: None = None
+    resultado: None = None
+    sentimiento: None = None
+    monto_prometido: None = None
+    fecha_promesa: None = None
+    nuevo_plan_pago: None = None
+    monto: None = None
+    metodo_pago: None = None
+    pago_completo: None = None
+
+
+class InteraccionPago(Interaccion):
+    id: str
+    cliente_id: str
+    timestamp: datetime
+    tipo: Literal["pago_recibido"]
+    monto: float = Field(gt=0)
+    metodo_pago: MetodoPago
+    pago_completo: bool
+    duracion_segundos: None = None
+    agente_id: None = None
+    resultado: None = None
+    sentimiento: None = None
+    monto_prometido: None = None
+    fecha_promesa: None = None
+    nuevo_plan_pago: None = None
+
+
+InteraccionTipada = Annotated[
+    Union[InteraccionLlamada, InteraccionMensaje, InteraccionPago],
+    Field(discriminator="tipo"),
+]
+
+
 ## RELACIONES
 class InteractuoCon(BaseModel):
     tipo: Optional[str] = Field(None, description="Tipo de interacción")
@@ -98,3 +191,10 @@ class IncumplioPromesa(BaseModel):
     fecha_vencimiento: Optional[datetime] = Field(
         None, description="Fecha en que se venció la promesa"
     )
+
+
+class CumplioPromesa(BaseModel):
+    monto_pagado: Optional[float] = Field(None, description="Monto imputado a la promesa")
+    fecha_cumplimiento: Optional[datetime] = Field(
+        None, description="Fecha del pago que completó la promesa"
+    )
@@ -0,0 +1,504 @@
+from array import array
+from bisect import bisect_right
+from collections import OrderedDict
+from datetime import datetime
+from operator import itemgetter
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from models import Cliente, Interaccion
+from services.diccionario import Diccionario
+from services.promesas import CUMPLIDA, MotorPromesas, es_pago, es_promesa
+from services.tiempo import a_microsegundos, de_microsegundos
+
+Registro = Union[Cliente, Interaccion]
+
+VENTANAS_DIAS = (7, 30, 90)
+# Un pago se atribuye al último agente que contactó al cliente en estos días
+DIAS_ATRIBUCION = 7
+DIA_US = 86_400 * 1_000_000
+
+ORDENES = (
+    "contactos",
+    "duracion_promedio",
+    "promesas",
+    "promesas_cumplidas",
+    "tasa_cumplimiento",
+    "recuperado",
+)
+
+
+class _Agregados:
+    """Sumas por agente de las filas del registro dentro de una ventana."""
+
+    def __init__(self):
+        self.contactos = np.zeros(0, dtype=np.int64)
+        self.suma_duracion = np.zeros(0, dtype=np.float64)
+        self.con_duracion = np.zeros(0, dtype=np.int64)
+        self.promesas = np.zeros(0, dtype=np.int64)
+        self.cumplidas = np.zeros(0, dtype=np.int64)
+        self.recuperado = np.zeros(0, dtype=np.float64)
+        self.pagos = np.zeros(0, dtype=np.int64)
+        self.resultados = np.zeros((0, 0), dtype=np.int64)
+        self.sentimientos = np.zeros((0, 0), dtype=np.int64)
+
+    def ajustar(self, agentes: int, resultados: int, sentimientos: int):
+        # Los diccionarios solo crecen: se agregan ceros para los códigos nuevos
+        for nombre in ("contactos", "suma_duracion", "con_duracion", "promesas",
+                       "cumplidas", "recuperado", "pagos"):
+            actual = getattr(self, nombre)
+            if len(actual) < agentes:
+                setattr(self, nombre, np.concatenate(
+                    [actual, np.zeros(agentes - len(actual), dtype=actual.dtype)]
+                ))
+        for nombre, columnas in (("resultados", resultados), ("sentimientos", sentimientos)):
+            actual = getattr(self, nombre)
+            if actual.shape != (agentes, columnas):
+                nuevo = np.zeros((agentes, columnas), dtype=np.int64)
+                nuevo[: actual.shape[0], : actual.shape[1]] = actual
+                setattr(self, nombre, nuevo)
+
+
+class MotorAgentes:
+    """Efectividad de los agentes en ventanas móviles (7/30/90 días).
+
+    Las interacciones con agente (contactos) y los pagos atribuidos a un
+    agente se guardan en un registro columnar ordenado por timestamp. Cada
+    ventana mantiene las sumas por agente de las filas posteriores a su corte
+    (`referencia - dias`), donde la referencia es el timestamp más reciente
+    ingerido: al llegar un lote se suman sus filas y, si la referencia avanza,
+    se restan las que salen de la ventana. Ambos pasos son `np.bincount` sobre
+    rangos contiguos del registro, así que un lote cuesta lo que sus filas y
+    no lo que el histórico.
+
+    Un pago se atribuye al último contacto del cliente en o antes del pago si
+    ocurrió dentro de `dias_atribucion`: los contactos de cada cliente se
+    guardan ordenados y se buscan con `bisect`, así que la atribución no
+    depende del orden de llegada. Las promesas cuentan en la ventana de
+    la fecha en que se hicieron; su estado (cumplida o no) lo resuelve
+    `MotorPromesas` y se corrige en las ventanas cuando cambia.
+
+    Las interacciones que llegan fuera de orden (anteriores a la última del
+    registro) obligan a reordenar el registro y recalcular las ventanas; es
+    O(n) vectorizado, pero conviene ingerir en orden de timestamp, como
+    produce `generar_datos`. Un contacto que llega después de pagos
+    posteriores a él reatribuye esos pagos y también recalcula las ventanas.
+    """
+
+    def __init__(
+        self,
+        ventanas: Sequence[int] = VENTANAS_DIAS,
+        dias_atribucion: int = DIAS_ATRIBUCION,
+    ):
+        self.ventanas = tuple(ventanas)
+        self.atribucion = dias_atribucion * DIA_US
+        self.agentes = Diccionario()
+        self.resultados = Diccionario()
+        self.sentimientos = Diccionario()
+        self.promesas = MotorPromesas()
+
+        # Registro columnar: una fila por contacto o pago (agente -1 si el
+        # pago no tiene contacto al que atribuirse)
+        self._ts = array("q")
+        self._agente = array("i")
+        self._contacto = bytearray()
+        self._duracion = array("q")  # -1 si no aplica
+        self._resultado = array("i")
+        self._sentimiento = array("i")
+        self._monto = array("d")
+        self._promesa = array("i")  # índice de la promesa o -1
+        self._pago = array("i")  # índice del pago o -1
+
+        # Promesas hechas por un agente: fila en el registro y si está cumplida
+        self._indice_promesa: Dict[str, int] = {}
+        self._fila_promesa = array("q")
+        self._cumplida = bytearray()
+
+        # Contactos de cada cliente ordenados por (timestamp, agente_id), con
+        # el código del agente en la misma posición, y sus pagos (índices)
+        self._contactos: Dict[str, Tuple[List[Tuple[int, str]], List[int]]] = {}
+        self._pagos_cliente: Dict[str, List[int]] = {}
+        self._fila_pago = array("q")
+        self._reatribuido = False
+        # IDs recientes (dentro de la ventana mayor) para no contar dos veces
+        # una interacción reingerida; las más viejas ya no afectan a ninguna
+        self._recientes: OrderedDict[str, int] = OrderedDict()
+
+        self.referencia: Optional[int] = None
+        self._cortes: Dict[int, int] = {dias: 0 for dias in self.ventanas}
+        self._agregados: Dict[int, _Agregados] = {dias: _Agregados() for dias in self.ventanas}
+
+    @classmethod
+    def desde_registros(cls, registros: Iterable[Registro], **kwargs) -> "MotorAgentes":
+        motor = cls(**kwargs)
+        motor.aplicar_lote(registros)
+        return motor
+
+    def aplicar_lote(self, registros: Iterable[Registro]):
+        pares = [
+            (a_microsegundos(r.timestamp), r)
+            for r in registros
+            if not isinstance(r, Cliente) and r.timestamp is not None
+        ]
+        if not pares:
+            return
+        pares.sort(key=itemgetter(0))
+
+        ultimo = self._ts[-1] if self._ts else None
+        inicio = len(self._ts)
+        for ts, interaccion in pares:
+            self._agregar(ts, interaccion)
+        desordenado = ultimo is not None and len(self._ts) > inicio and self._ts[inicio] < ultimo
+
+        maximo = pares[-1][0]
+        if self.referencia is None or maximo > self.referencia:
+            self.referencia = maximo
+        if desordenado:
+            self._reordenar()
+        elif self._reatribuido:
+            self._recalcular()
+        else:
+            for dias in self.ventanas:
+                self._avanzar(dias, inicio)
+        self._podar_recientes()
+
+        self.promesas.aplicar_lote([interaccion for _, interaccion in pares])
+        self._actualizar_promesas()
+
+    def aplicar(self, registro: Registro):
+        self.aplicar_lote([registro])
+
+    def vencer(self, ahora: Optional[datetime] = None) -> int:
+        # Las promesas que vencen sin cubrir dejan de poder cumplirse
+        clientes = self.promesas.vencer(ahora)
+        self._actualizar_promesas()
+        return clientes
+
+    def _agregar(self, ts: int, interaccion: Interaccion):
+        if interaccion.id is not None:
+            if interaccion.id in self._recientes:
+                return
+            self._recientes[interaccion.id] = ts
+
+        if interaccion.agente_id is not None:
+            agente = self.agentes.codificar(interaccion.agente_id)
+            promesa = -1
+            if es_promesa(interaccion) and interaccion.id not in self._indice_promesa:
+                promesa = self._indice_promesa[interaccion.id] = len(self._fila_promesa)
+                self._fila_promesa.append(len(self._ts))
+                self._cumplida.append(0)
+            duracion = interaccion.duracion_segundos
+            self._fila(
+                ts,
+                agente,
+                True,
+                -1 if duracion is None else duracion,
+                self.resultados.codificar(interaccion.resultado),
+                self.sentimientos.codificar(interaccion.sentimiento),
+                0.0,
+                promesa,
+                -1,
+            )
+            self._agregar_contacto(ts, interaccion.cliente_id, interaccion.agente_id, agente)
+        elif es_pago(interaccion):
+            pago = len(self._fila_pago)
+            self._fila_pago.append(len(self._ts))
+            self._pagos_cliente.setdefault(interaccion.cliente_id, []).append(pago)
+            agente = self._atribuir(interaccion.cliente_id, ts)
+            self._fila(ts, agente, False, -1, -1, -1, interaccion.monto, -1, pago)
+
+    def _agregar_contacto(self, ts: int, cliente_id: str, agente_id: str, agente: int):
+        claves, agentes = self._contactos.setdefault(cliente_id, ([], []))
+        clave = (ts, agente_id)
+        if not claves or clave >= claves[-1]:
+            claves.append(clave)
+            agentes.append(agente)
+        else:
+            posicion = bisect_right(claves, clave)
+            claves.insert(posicion, clave)
+            agentes.insert(posicion, agente)
+        # Los pagos del cliente en o después del contacto pueden cambiar de agente
+        for pago in self._pagos_cliente.get(cliente_id, ()):
+            fila = self._fila_pago[pago]
+            if self._ts[fila] < ts:
+                continue
+            nuevo = self._atribuir(cliente_id, self._ts[fila])
+            if nuevo != self._agente[fila]:
+                self._agente[fila] = nuevo
+                self._reatribuido = True
+
+    def _atribuir(self, cliente_id: str, ts: int) -> int:
+        # Agente del último contacto en o antes de `ts` dentro de la atribución
+        contactos = self._contactos.get(cliente_id)
+        if contactos is None:
+            return -1
+        claves, agentes = contactos
+        posicion = bisect_right(claves, (ts, "\U0010ffff")) - 1
+        if posicion < 0 or ts - claves[posicion][0] > self.atribucion:
+            return -1
+        return agentes[posicion]
+
+    def _fila(self, ts, agente, contacto, duracion, resultado, sentimiento, monto, promesa, pago):
+        self._ts.append(ts)
+        self._agente.append(agente)
+        self._contacto.append(contacto)
+        self._duracion.append(duracion)
+        self._resultado.append(resultado)
+        self._sentimiento.append(sentimiento)
+        self._monto.append(monto)
+        self._promesa.append(promesa)
+        self._pago.append(pago)
+
+    def _avanzar(self, dias: int, inicio: int):
+        # Suma las filas nuevas [inicio, n) y resta las que quedaron antes del corte
+        ts = np.frombuffer(self._ts, dtype=np.int64)
+        corte = max(
+            self._cortes[dias],
+            int(np.searchsorted(ts, self.referencia - dias * DIA_US, side="right")),
+        )
+        del ts
+        desde = max(inicio, corte)
+        self._sumar(self._agregados[dias], desde, len(self._ts), 1)
+        self._sumar(self._agregados[dias], self._cortes[dias], min(corte, inicio), -1)
+        self._cortes[dias] = corte
+
+    def _sumar(
+        self,
+        agregados: _Agregados,
+        desde: int,
+        hasta: int,
+        signo: int,
+        agente: Optional[np.ndarray] = None,
+    ):
+        num_agentes = len(self.agentes.valores)
+        num_resultados = len(self.resultados.valores)
+        num_sentimientos = len(self.sentimientos.valores)
+        agregados.ajustar(num_agentes, num_resultados, num_sentimientos)
+        if desde >= hasta:
+            return
+
+        if agente is None:
+            agente = np.frombuffer(self._agente, dtype=np.int32)
+        agente = agente[desde:hasta]
+        contacto = np.frombuffer(self._contacto, dtype=np.bool_)[desde:hasta]
+        duracion = np.frombuffer(self._duracion, dtype=np.int64)[desde:hasta]
+        resultado = np.frombuffer(self._resultado, dtype=np.int32)[desde:hasta]
+        sentimiento = np.frombuffer(self._sentimiento, dtype=np.int32)[desde:hasta]
+        monto = np.frombuffer(self._monto, dtype=np.float64)[desde:hasta]
+        promesa = np.frombuffer(self._promesa, dtype=np.int32)[desde:hasta]
+        cumplida = np.frombuffer(self._cumplida, dtype=np.uint8)
+
+        def contar(mascara, pesos=None):
+            return np.bincount(agente[mascara], weights=pesos, minlength=num_agentes)
+
+        agregados.contactos += signo * contar(contacto)
+        con_duracion = contacto & (duracion >= 0)
+        agregados.suma_duracion += signo * contar(con_duracion, duracion[con_duracion])
+        agregados.con_duracion += signo * contar(con_duracion)
+        con_promesa = promesa >= 0
+        agregados.promesas += signo * contar(con_promesa)
+        agregados.cumplidas += signo * contar(
+            con_promesa, cumplida[promesa[con_promesa]]
+        ).astype(np.int64)
+        pago = ~contacto & (agente >= 0)
+        agregados.recuperado += signo * contar(pago, monto[pago])
+        agregados.pagos += signo * contar(pago)
+
+        for matriz, codigos, columnas in (
+            (agregados.resultados, resultado, num_resultados),
+            (agregados.sentimientos, sentimiento, num_sentimientos),
+        ):
+            validos = contacto & (codigos >= 0)
+            if columnas:
+                matriz += signo * np.bincount(
+                    agente[validos].astype(np.int64) * columnas + codigos[validos],
+                    minlength=num_agentes * columnas,
+                ).reshape(num_agentes, columnas)
+
+    def _reordenar(self):
+        ts = np.frombuffer(self._ts, dtype=np.int64)
+        orden = np.argsort(ts, kind="stable")
+        del ts
+        for nombre, tipo in (
+            ("_ts", np.int64),
+            ("_agente", np.int32),
+            ("_duracion", np.int64),
+            ("_resultado", np.int32),
+            ("_sentimiento", np.int32),
+            ("_monto", np.float64),
+            ("_promesa", np.int32),
+            ("_pago", np.int32),
+        ):
+            columna = getattr(self, nombre)
+            valores = np.frombuffer(columna, dtype=tipo)[orden].tobytes()
+            setattr(self, nombre, array(columna.typecode, valores))
+        self._contacto = bytearray(np.frombuffer(self._contacto, dtype=np.uint8)[orden].tobytes())
+
+        promesa = np.frombuffer(self._promesa, dtype=np.int32)
+        filas = np.flatnonzero(promesa >= 0)
+        fila_promesa = np.empty(len(self._fila_promesa), dtype=np.int64)
+        fila_promesa[promesa[filas]] = filas
+        del promesa
+        self._fila_promesa = array("q", fila_promesa.tobytes())
+
+        pago = np.frombuffer(self._pago, dtype=np.int32)
+        filas = np.flatnonzero(pago >= 0)
+        fila_pago = np.empty(len(self._fila_pago), dtype=np.int64)
+        fila_pago[pago[filas]] = filas
+        del pago
+        self._fila_pago = array("q", fila_pago.tobytes())
+        self._recalcular()
+
+    def _recalcular(self):
+        self._reatribuido = False
+        for dias in self.ventanas:
+            self._agregados[dias] = _Agregados()
+            self._cortes[dias] = 0
+            self._avanzar(dias, 0)
+
+    def _podar_recientes(self):
+        limite = self.referencia - max(self.ventanas) * DIA_US
+        # Se guardan en orden de llegada, que en una ingesta ordenada es el
+        # orden de timestamp: se poda desde el principio
+        while self._recientes:
+            interaccion_id = next(iter(self._recientes))
+            if self._recientes[interaccion_id] > limite:
+                break
+            self._recientes.popitem(last=False)
+
+    def _actualizar_promesas(self):
+        for _, resultado in self.promesas.cambios():
+            indice = self._indice_promesa.get(resultado.promesa_id)
+            if indice is None:
+                continue
+            cumplida = resultado.estado == CUMPLIDA
+            if cumplida == bool(self._cumplida[indice]):
+                continue
+            self._cumplida[indice] = cumplida
+            fila = self._fila_promesa[indice]
+            agente = self._agente[fila]
+            for dias in self.ventanas:
+                if fila >= self._cortes[dias]:
+                    self._agregados[dias].cumplidas[agente] += 1 if cumplida else -1
+
+    def _metricas(self, dias: int) -> Dict[str, np.ndarray]:
+        agregados = self._agregados[dias]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return {
+                "contactos": agregados.contactos,
+                "duracion_promedio": agregados.suma_duracion / agregados.con_duracion,
+                "promesas": agregados.promesas,
+                "promesas_cumplidas": agregados.cumplidas,
+                "tasa_cumplimiento": agregados.cumplidas / agregados.promesas,
+                "recuperado": agregados.recuperado,
+                "pagos_atribuidos": agregados.pagos,
+            }
+
+    def _describir(self, dias: int, agente: int, metricas: Dict[str, np.ndarray]) -> dict:
+        agregados = self._agregados[dias]
+        fila = {"agente_id": self.agentes.decodificar(agente)}
+        for nombre, valores in metricas.items():
+            valor = valores[agente].item()
+            fila[nombre] = None if valor != valor else valor  # NaN: sin datos
+        fila["resultados"] = {
+            self.resultados.decodificar(c): int(n)
+            for c, n in enumerate(agregados.resultados[agente]) if n
+        }
+        fila["sentimientos"] = {
+            self.sentimientos.decodificar(c): int(n)
+            for c, n in enumerate(agregados.sentimientos[agente]) if n
+        }
+        return fila
+
+    def ranking(self, dias: int = 30, orden: str = "recuperado", limite: int = 50) -> dict:
+        """Los `limite` agentes con mayor `orden` en la ventana de `dias`."""
+        if dias not in self._agregados:
+            raise ValueError(f"Ventana no soportada: {dias} (disponibles: {self.ventanas})")
+        if orden not in ORDENES:
+            raise ValueError(f"Orden no soportado: {orden} (disponibles: {ORDENES})")
+        metricas = self._metricas(dias)
+        # Solo agentes con actividad en la ventana; los NaN (sin datos) al final
+        activos = np.flatnonzero(metricas["contactos"] + metricas["pagos_atribuidos"])
+        valores = np.nan_to_num(metricas[orden][activos].astype(np.float64), nan=-np.inf)
+        if limite < len(activos):
+            candidatos = np.argpartition(-valores, limite - 1)[:limite]
+        else:
+            candidatos = np.arange(len(activos))
+        candidatos = candidatos[np.lexsort((activos[candidatos], -valores[candidatos]))]
+        return {
+            **self._ventana(dias),
+            "orden": orden,
+            "total_agentes": len(activos),
+            "agentes": [self._describir(dias, int(activos[i]), metricas) for i in candidatos],
+        }
+
+    def detalle(self, agente_id: str) -> Optional[dict]:
+        agente = self.agentes.codigo(agente_id)
+        if agente < 0:
+            return None
+        ventanas = {}
+        for dias in self.ventanas:
+            fila = self._describir(dias, agente, self._metricas(dias))
+            del fila["agente_id"]
+            ventanas[str(dias)] = {**self._ventana(dias), **fila}
+        return {"agente_id": agente_id, "ventanas": ventanas}
+
+    def _ventana(self, dias: int) -> dict:
+        if self.referencia is None:
+            return {"dias": dias, "referencia": None, "desde": None}
+        return {
+            "dias": dias,
+            "referencia": de_microsegundos(self.referencia),
+            "desde": de_microsegundos(self.referencia - dias * DIA_US),
+        }
+
+    def _atribucion_ordenada(self) -> np.ndarray:
+        # Recorre contactos y pagos en orden de timestamp (a igual timestamp,
+        # contactos primero) atribuyendo cada pago al último contacto visto
+        agente = np.frombuffer(self._agente, dtype=np.int32).copy()
+        eventos = []
+        for cliente_id, (claves, agentes) in self._contactos.items():
+            for (ts, agente_id), codigo in zip(claves, agentes):
+                eventos.append((ts, 0, agente_id, cliente_id, codigo))
+        for cliente_id, pagos in self._pagos_cliente.items():
+            for pago in pagos:
+                fila = self._fila_pago[pago]
+                eventos.append((self._ts[fila], 1, "", cliente_id, fila))
+        eventos.sort()
+        ultimo: Dict[str, Tuple[int, int]] = {}
+        for ts, tipo, _, cliente_id, valor in eventos:
+            if tipo == 0:
+                ultimo[cliente_id] = (ts, valor)
+                continue
+            contacto = ultimo.get(cliente_id)
+            atribuible = contacto is not None and ts - contacto[0] <= self.atribucion
+            agente[valor] = contacto[1] if atribuible else -1
+        return agente
+
+    def verificar_consistencia(self) -> Dict[int, List[str]]:
+        """Compara cada ventana con una suma desde cero de sus filas.
+
+        La suma usa una atribución de pagos recalculada recorriendo contactos y
+        pagos en orden de timestamp, así que también detecta atribuciones que
+        dependan del orden de llegada. Devuelve {dias: [agregados distintos]};
+        vacío si el estado incremental es consistente.
+        """
+        if self.referencia is None:
+            return {}
+        ts = np.frombuffer(self._ts, dtype=np.int64)
+        agente = self._atribucion_ordenada()
+        diferencias = {}
+        for dias in self.ventanas:
+            corte = int(np.searchsorted(ts, self.referencia - dias * DIA_US, side="right"))
+            esperado = _Agregados()
+            self._sumar(esperado, corte, len(ts), 1, agente)
+            actual = self._agregados[dias]
+            distintos = [
+                nombre
+                for nombre, valores in vars(esperado).items()
+                if not np.allclose(getattr(actual, nombre), valores)
+            ]
+            if distintos:
+                diferencias[dias] = distintos
+        return diferencias
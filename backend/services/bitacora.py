@@ -0,0 +1,164 @@
+import hashlib
+import json
+import os
+import time
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from services.construccion_grafo import Registro, entidad_registro
+
+NUEVA = "nueva"
+REANUDAR = "reanudar"
+REINTENTAR = "reintentar"
+MODOS = (NUEVA, REANUDAR, REINTENTAR)
+
+
+def clave_registro(registro: Registro) -> str:
+    return f"{entidad_registro(registro)}/{registro.id}"
+
+
+def _hash_clave(clave: str) -> int:
+    return int.from_bytes(hashlib.blake2b(clave.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+class Bitacora:
+    """Bitácora de progreso de una carga: archivo NDJSON de solo agregado.
+
+    Registra los registros ya escritos en el grafo (en tandas, con fsync) y
+    los que fallaron con su error, para poder retomar una carga interrumpida:
+
+    - `NUEVA`: empieza la bitácora de cero y escribe todo. Si la bitácora ya
+      tiene progreso se niega a pisarla, salvo con `sobrescribir=True`.
+    - `REANUDAR`: omite lo ya escrito; lo pendiente y lo que falló en
+      corridas anteriores se vuelve a escribir.
+    - `REINTENTAR`: escribe solo lo que falló (y sigue fallido).
+
+    El archivo de datos se vuelve a leer completo en los tres modos (el
+    constructor necesita ver los clientes para enlazar sus interacciones); lo
+    que se evita es la escritura, que es lo caro. Las tandas se confirman cada
+    `max_pendientes` registros o `intervalo` segundos: si el proceso muere, lo
+    escrito y aún no confirmado se vuelve a escribir al reanudar, lo cual es
+    seguro porque la escritura es un upsert por UUID. Una última línea a medio
+    escribir por la caída se ignora al leer.
+    """
+
+    def __init__(
+        self,
+        ruta: str,
+        modo: str = NUEVA,
+        intervalo: float = 1.0,
+        max_pendientes: int = 5000,
+        sobrescribir: bool = False,
+    ):
+        if modo not in MODOS:
+            raise ValueError(f"Modo de bitácora desconocido: {modo} (usa {', '.join(MODOS)})")
+        if modo == NUEVA and not sobrescribir and os.path.exists(ruta) and os.path.getsize(ruta):
+            raise ValueError(
+                f"La bitácora {ruta} ya tiene el progreso de una carga anterior"
+            )
+        self.ruta = str(ruta)
+        self.modo = modo
+        self.intervalo = intervalo
+        self.max_pendientes = max_pendientes
+        self.fallidos: Dict[str, str] = {}
+        self.omitidos = 0
+        self.escritos = 0
+        self.archivo_previo: Optional[str] = None
+        self._pendientes: List[str] = []
+        self._ultima_confirmacion = time.monotonic()
+
+        escritos: List[int] = []
+        if modo != NUEVA and os.path.exists(self.ruta):
+            escritos = self._leer()
+        # Lo escrito en corridas anteriores solo se consulta: un arreglo
+        # ordenado ocupa mucho menos que un set con millones de claves
+        self._escritos_previos = np.unique(np.array(escritos, dtype=np.uint64))
+        self._archivo = open(self.ruta, "w" if modo == NUEVA else "a", encoding="utf-8")
+
+    def _leer(self) -> List[int]:
+        escritos: List[int] = []
+        with open(self.ruta, encoding="utf-8") as f:
+            for linea in f:
+                try:
+                    evento = json.loads(linea)
+                except json.JSONDecodeError:
+                    continue
+                if evento["evento"] == "escritos":
+                    for clave in evento["claves"]:
+                        escritos.append(_hash_clave(clave))
+                        self.fallidos.pop(clave, None)
+                elif evento["evento"] == "fallido":
+                    self.fallidos[evento["clave"]] = evento["error"]
+                elif evento["evento"] == "inicio":
+                    self.archivo_previo = evento["archivo"]
+        return escritos
+
+    def _escrito_antes(self, clave: str) -> bool:
+        valor = np.uint64(_hash_clave(clave))
+        posicion = np.searchsorted(self._escritos_previos, valor)
+        return posicion < len(self._escritos_previos) and self._escritos_previos[posicion] == valor
+
+    def pendiente(self, registro: Registro) -> bool:
+        """Indica si hay que escribir `registro` en esta corrida."""
+        if self.modo == NUEVA:
+            return True
+        clave = clave_registro(registro)
+        if self.modo == REINTENTAR:
+            escribir = clave in self.fallidos
+        else:
+            escribir = not self._escrito_antes(clave)
+        if not escribir:
+            self.omitidos += 1
+        return escribir
+
+    def iniciar(self, archivo: str, carga: str):
+        if self.archivo_previo is not None and self.archivo_previo != str(archivo):
+            raise ValueError(
+                f"La bitácora {self.ruta} es de la carga de {self.archivo_previo}, no de {archivo}"
+            )
+        self._agregar({"evento": "inicio", "archivo": str(archivo), "carga": carga, "modo": self.modo})
+        self._confirmar()
+
+    def registrar_escritos(self, registros: Iterable[Registro]):
+        for registro in registros:
+            clave = clave_registro(registro)
+            self._pendientes.append(clave)
+            self.fallidos.pop(clave, None)
+        if (
+            len(self._pendientes) >= self.max_pendientes
+            or time.monotonic() - self._ultima_confirmacion >= self.intervalo
+        ):
+            self.confirmar()
+
+    def registrar_fallido(self, registro: Registro, error: str):
+        clave = clave_registro(registro)
+        self.fallidos[clave] = error
+        self._agregar({"evento": "fallido", "clave": clave, "error": error})
+
+    def confirmar(self):
+        """Escribe las tandas pendientes y las lleva a disco."""
+        if self._pendientes:
+            self.escritos += len(self._pendientes)
+            self._agregar({"evento": "escritos", "claves": self._pendientes})
+            self._pendientes = []
+        self._confirmar()
+
+    def _agregar(self, evento: dict):
+        self._archivo.write(json.dumps(evento, ensure_ascii=False) + "\n")
+
+    def _confirmar(self):
+        self._archivo.flush()
+        os.fsync(self._archivo.fileno())
+        self._ultima_confirmacion = time.monotonic()
+
+    def cerrar(self):
+        self.confirmar()
+        self._archivo.close()
+
+    def resumen(self) -> Dict[str, int]:
+        return {
+            "escritos": self.escritos,
+            "omitidos": self.omitidos,
+            "fallidos": len(self.fallidos),
+        }
@@ -0,0 +1,108 @@
+import asyncio
+import inspect
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+
+class CacheGeneracional:
+    """Cache LRU de respuestas, acotada por número de entradas y TTL.
+
+    Cada entrada guarda la generación de ingesta con la que se calculó; si la
+    generación actual (`generacion()`) es otra, la entrada ya no vale y se
+    recalcula. Así una carga invalida exactamente lo que puede haber cambiado
+    sin esperar al TTL. Los fallos concurrentes sobre la misma clave esperan
+    un único cálculo en curso en lugar de repetirlo.
+    """
+
+    def __init__(
+        self,
+        generacion: Callable[[], int],
+        max_entradas: int = 1024,
+        ttl: float = 30.0,
+    ):
+        self.generacion = generacion
+        self.max_entradas = max_entradas
+        self.ttl = ttl
+        self.entradas: "OrderedDict[Hashable, Tuple[int, float, Any]]" = OrderedDict()
+        self._en_curso: Dict[Hashable, asyncio.Future] = {}
+        self.estadisticas = {
+            "aciertos": 0,
+            "fallos": 0,
+            "coalescidos": 0,
+            "desalojos": 0,
+            "expirados": 0,
+            "invalidados": 0,
+        }
+
+    @staticmethod
+    def clave(endpoint: str, **parametros) -> Hashable:
+        def normalizar(valor):
+            if isinstance(valor, (list, tuple, set)):
+                return tuple(sorted(map(str, valor)))
+            return valor
+
+        return endpoint, tuple(sorted((k, normalizar(v)) for k, v in parametros.items()))
+
+    async def obtener(self, clave: Hashable, calcular: Callable[[], Any]) -> Any:
+        generacion = self.generacion()
+        entrada = self.entradas.get(clave)
+        if entrada is not None:
+            generacion_entrada, expira, valor = entrada
+            if generacion_entrada != generacion:
+                self.estadisticas["invalidados"] += 1
+                del self.entradas[clave]
+            elif expira < time.monotonic():
+                self.estadisticas["expirados"] += 1
+                del self.entradas[clave]
+            else:
+                self.estadisticas["aciertos"] += 1
+                self.entradas.move_to_end(clave)
+                return valor
+
+        en_curso = self._en_curso.get(clave)
+        if en_curso is not None:
+            self.estadisticas["coalescidos"] += 1
+            return await asyncio.shield(en_curso)
+
+        self.estadisticas["fallos"] += 1
+        futuro = asyncio.get_running_loop().create_future()
+        self._en_curso[clave] = futuro
+        try:
+            valor = calcular()
+            if inspect.isawaitable(valor):
+                valor = await valor
+        except BaseException as e:
+            futuro.set_exception(e)
+            # Que nadie más espere este error si no hay quien lo consuma
+            futuro.exception()
+            raise
+        else:
+            futuro.set_result(valor)
+            # Solo se guarda si no entró una ingesta mientras se calculaba
+            if self.generacion() == generacion:
+                self._guardar(clave, generacion, valor)
+            return valor
+        finally:
+            del self._en_curso[clave]
+
+    def _guardar(self, clave: Hashable, generacion: int, valor: Any):
+        self.entradas[clave] = (generacion, time.monotonic() + self.ttl, valor)
+        self.entradas.move_to_end(clave)
+        while len(self.entradas) > self.max_entradas:
+            self.entradas.popitem(last=False)
+            self.estadisticas["desalojos"] += 1
+
+    def limpiar(self):
+        self.entradas.clear()
+
+    def resumen(self) -> dict:
+        consultas = self.estadisticas["aciertos"] + self.estadisticas["fallos"]
+        return {
+            **self.estadisticas,
+            "entradas": len(self.entradas),
+            "max_entradas": self.max_entradas,
+            "ttl": self.ttl,
+            "generacion": self.generacion(),
+            "tasa_aciertos": self.estadisticas["aciertos"] / consultas if consultas else 0.0,
+        }
@@ -0,0 +1,349 @@
+from datetime import datetime
+import hashlib
+from itertools import chain
+import time
+import uuid
+from typing import Dict, Iterable, Iterator, List, Tuple, Union
+
+from graphiti_core.nodes import EntityNode
+from graphiti_core.edges import EntityEdge
+
+from models import Cliente, DataSetInteracciones, Interaccion
+from services.metricas import ETAPA_SEGUNDOS, REGISTROS, metricas
+from services.promesas import CUMPLIDA, INCUMPLIDA, ResultadoPromesa
+
+Triplete = Tuple[EntityNode, EntityEdge, EntityNode]
+Registro = Union[Cliente, Interaccion]
+
+NAMESPACE_UUID = uuid.UUID("6f1c2a4e-8d0b-5b7e-9a43-2c1d5e7f9b10")
+# Nodos que comparten varios registros (el resto solo aparece en el suyo)
+ETIQUETAS_COMPARTIDAS = {"CLIENTE", "DEUDA", "AGENTE"}
+
+
+class ConstructorGrafo:
+    """Construye en memoria los nodos y aristas de la carga por tripletes.
+
+    Mantiene los nodos de clientes, deudas y agentes ya creados para que las
+    interacciones posteriores se enlacen a ellos. Tanto la carga por triplete
+    como la carga masiva parten de lo que construye, pero no escriben lo mismo:
+    `add_triplet` resuelve cada nodo y arista contra el grafo con el LLM (puede
+    fusionar nodos con otros parecidos e invalidar aristas que contradice),
+    mientras que la carga masiva escribe los nodos y aristas tal cual. Los UUID
+    se derivan de las claves de negocio (`cliente.id`, `interaccion.id`,
+    `agente_id`), así que recargar un archivo actualiza los nodos existentes en
+    lugar de duplicarlos.
+    """
+
+    def __init__(self, namespace: str = "carga_2.0"):
+        self.namespace = namespace
+        self.clientes_nodos: Dict[str, EntityNode] = {}
+        self.agentes_nodos: Dict[str, EntityNode] = {}
+        self.deudas_nodos: Dict[str, EntityNode] = {}
+
+    def uuid_nodo(self, tipo: str, clave: str) -> str:
+        # Identidad estable a partir de la clave de negocio: recargar el mismo
+        # registro produce el mismo UUID y la escritura (MERGE) lo actualiza
+        return str(uuid.uuid5(NAMESPACE_UUID, f"{self.namespace}:{tipo}:{clave}"))
+
+    def uuid_arista(self, nombre: str, origen_uuid: str, destino_uuid: str) -> str:
+        return str(
+            uuid.uuid5(NAMESPACE_UUID, f"{self.namespace}:{nombre}:{origen_uuid}:{destino_uuid}")
+        )
+
+    def _fijar_uuid_aristas(self, tripletes: List[Triplete]) -> List[Triplete]:
+        for origen, arista, destino in tripletes:
+            arista.uuid = self.uuid_arista(arista.name, origen.uuid, destino.uuid)
+        return tripletes
+
+    def tripletes_cliente(self, cliente: Cliente) -> List[Triplete]:
+        namespace = self.namespace
+
+        # Nodo Cliente
+        cliente_node = EntityNode(
+            labels=["CLIENTE"],
+            name=f"{cliente.nombre}",
+            uuid=self.uuid_nodo("cliente", cliente.id),
+            group_id=namespace,
+            attributes={
+                "telefono": cliente.telefono,
+                "monto_deuda_inicial": cliente.monto_deuda_inicial,
+                "fecha_prestamo": cliente.fecha_prestamo.isoformat(),
+                "tipo_deuda": cliente.tipo_deuda,
+                "huella": huella_cliente(cliente),
+            },
+            created_at=datetime.now(),
+        )
+
+        # Nodo Deuda
+        deuda_node = EntityNode(
+            labels=["DEUDA"],
+            uuid=self.uuid_nodo("deuda", cliente.id),
+            name=f"Deuda_{cliente.nombre}",
+            group_id=namespace,
+            attributes={
+                "monto_inicial": cliente.monto_deuda_inicial,
+                "monto_actual": cliente.monto_deuda_inicial,
+                "tipo": cliente.tipo_deuda,
+                "fecha_inicio": cliente.fecha_prestamo.isoformat(),
+            },
+            created_at=datetime.now(),
+        )
+
+        # Relación Cliente → Deuda
+        edge_posee = EntityEdge(
+            name="POSEE",
+            group_id=namespace,
+            source_node_uuid=cliente_node.uuid,
+            target_node_uuid=deuda_node.uuid,
+            created_at=datetime.now(),
+            fact=f"{cliente_node.name} posee la deuda {deuda_node.name}",
+        )
+
+        self.clientes_nodos[cliente.id] = cliente_node
+        self.deudas_nodos[cliente.id] = deuda_node
+        return self._fijar_uuid_aristas([(cliente_node, edge_posee, deuda_node)])
+
+    def tripletes_interaccion(self, interaccion: Interaccion) -> List[Triplete]:
+        namespace = self.namespace
+        tripletes: List[Triplete] = []
+
+        cliente_node = self.clientes_nodos.get(interaccion.cliente_id)
+        if not cliente_node:
+            print(f"[WARN] Cliente {interaccion.cliente_id} no encontrado")
+            return tripletes
+
+        # Nodo Interacción
+        interaccion_node = EntityNode(
+            labels=["INTERACCION"],
+            uuid=self.uuid_nodo("interaccion", interaccion.id),
+            name=f"Interaccion_{interaccion.id}",
+            group_id=namespace,
+            attributes={
+                "tipo": interaccion.tipo,
+                "timestamp": interaccion.timestamp.isoformat(),
+                "resultado": getattr(interaccion, "resultado", None),
+                "sentimiento": getattr(interaccion, "sentimiento", None),
+                "duracion_segundos": getattr(interaccion, "duracion_segundos", None),
+            },
+            created_at=datetime.now().isoformat(),
+        )
+
+        # Relación Cliente → Interacción
+        edge_tiene = EntityEdge(
+            name="TIENE",
+            group_id="INTERACTUO_CON",
+            source_node_uuid=cliente_node.uuid,
+            target_node_uuid=interaccion_node.uuid,
+            created_at=datetime.now(),
+            fact=f"{cliente_node.name} tiene la interacción {interaccion_node.name}",
+        )
+        tripletes.append((cliente_node, edge_tiene, interaccion_node))
+
+        # Nodo Agente + relación REALIZA
+        agente_id = getattr(interaccion, "agente_id", None)
+        if agente_id:
+            agente_node = self.agentes_nodos.get(agente_id)
+            if not agente_node:
+                agente_node = EntityNode(
+                    labels=["AGENTE"],
+                    uuid=self.uuid_nodo("agente", agente_id),
+                    name=agente_id,
+                    group_id=namespace,
+                    created_at=datetime.now().isoformat(),
+                )
+                self.agentes_nodos[agente_id] = agente_node
+
+            edge_realiza = EntityEdge(
+                name="REALIZA",
+                group_id=namespace,
+                source_node_uuid=agente_node.uuid,
+                target_node_uuid=interaccion_node.uuid,
+                created_at=datetime.now(),
+                fact=f"{agente_node.name} realizó la interacción {interaccion_node.name}",
+            )
+            tripletes.append((agente_node, edge_realiza, interaccion_node))
+
+        # Nodo Pago (si aplica)
+        if interaccion.tipo == "pago_recibido" or getattr(
+            interaccion, "monto_prometido", None
+        ):
+            pago_node = EntityNode(
+                labels=["PAGO"],
+                uuid=self.uuid_nodo("pago", interaccion.id),
+                name=f"Pago_{interaccion.id}",
+                group_id=namespace,
+                attributes={
+                    "monto": getattr(
+                        interaccion,
+                        "monto",
+                        getattr(interaccion, "monto_prometido", None),
+                    ),
+                    "metodo_pago": getattr(interaccion, "metodo_pago", None),
+                    "pago_completo": getattr(interaccion, "pago_completo", None),
+                    "fecha_promesa": getattr(interaccion, "fecha_promesa", None),
+                },
+                created_at=datetime.now(),
+            )
+
+            # Relación Promesa o Pago
+            edge_pago = EntityEdge(
+                name=(
+                    "PROMETE"
+                    if getattr(interaccion, "monto_prometido", None)
+                    else "PAGA"
+                ),
+                group_id=namespace,
+                source_node_uuid=interaccion_node.uuid,
+                target_node_uuid=pago_node.uuid,
+                created_at=datetime.now(),
+                fact=f"{interaccion_node.name} vincula al pago {pago_node.name}",
+            )
+            tripletes.append((interaccion_node, edge_pago, pago_node))
+
+            # Relación Cliente → Pago
+            edge_cliente_pago = EntityEdge(
+                group_id=namespace,
+                source_node_uuid=cliente_node.uuid,
+                target_node_uuid=pago_node.uuid,
+                created_at=datetime.now(),
+                name="PAGA",
+                fact=f"{cliente_node.name} realizó el pago {pago_node.name}",
+            )
+            tripletes.append((cliente_node, edge_cliente_pago, pago_node))
+
+        # Nodo PlanPago (si hay renegociación)
+        if getattr(interaccion, "nuevo_plan_pago", None):
+            plan = interaccion.nuevo_plan_pago
+            plan_node = EntityNode(
+                labels=["PLAN_PAGO"],
+                uuid=self.uuid_nodo("plan_pago", interaccion.id),
+                name=f"PlanPago_{interaccion.id}",
+                group_id=namespace,
+                attributes={
+                    "cuotas": plan.cuotas,
+                    "monto_mensual": plan.monto_mensual,
+                    "fecha_inicio": interaccion.timestamp,
+                },
+                created_at=datetime.now().isoformat(),
+            )
+
+            edge_plan = EntityEdge(
+                name="RENUEVA_PLAN",
+                group_id=namespace,
+                source_node_uuid=interaccion_node.uuid,
+                target_node_uuid=plan_node.uuid,
+                created_at=datetime.now(),
+                fact=f"{interaccion_node.name} creó el plan {plan_node.name}",
+            )
+            tripletes.append((interaccion_node, edge_plan, plan_node))
+
+        return self._fijar_uuid_aristas(tripletes)
+
+    def aristas_promesa(self, resultado: ResultadoPromesa) -> List[EntityEdge]:
+        """Aristas que resultan del emparejamiento de una promesa.
+
+        - cumplida: CUMPLE_PROMESA desde el nodo PAGO de la promesa hacia cada
+          pago que la cubrió.
+        - incumplida: INCUMPLIO_PROMESA desde el cliente hacia la promesa.
+        - abierta: ninguna todavía.
+        """
+        promesa_uuid = self.uuid_nodo("pago", resultado.promesa_id)
+        aristas: List[EntityEdge] = []
+
+        if resultado.estado == CUMPLIDA:
+            for pago_id in resultado.pagos:
+                pago_uuid = self.uuid_nodo("pago", pago_id)
+                aristas.append(
+                    EntityEdge(
+                        uuid=self.uuid_arista("CUMPLE_PROMESA", promesa_uuid, pago_uuid),
+                        name="CUMPLE_PROMESA",
+                        group_id=self.namespace,
+                        source_node_uuid=promesa_uuid,
+                        target_node_uuid=pago_uuid,
+                        created_at=datetime.now(),
+                        valid_at=resultado.fecha_resolucion,
+                        fact=f"Pago_{pago_id} cumple la promesa Pago_{resultado.promesa_id}",
+                        attributes={
+                            "monto_pagado": resultado.monto_pagado,
+                            "fecha_cumplimiento": resultado.fecha_resolucion,
+                        },
+                    )
+                )
+        elif resultado.estado == INCUMPLIDA:
+            cliente_uuid = self.uuid_nodo("cliente", resultado.cliente_id)
+            aristas.append(
+                EntityEdge(
+                    uuid=self.uuid_arista("INCUMPLIO_PROMESA", cliente_uuid, promesa_uuid),
+                    name="INCUMPLIO_PROMESA",
+                    group_id=self.namespace,
+                    source_node_uuid=cliente_uuid,
+                    target_node_uuid=promesa_uuid,
+                    created_at=datetime.now(),
+                    valid_at=resultado.vencimiento,
+                    fact=f"{resultado.cliente_id} incumplió la promesa Pago_{resultado.promesa_id}",
+                    attributes={
+                        "fecha_vencimiento": resultado.vencimiento,
+                        "monto_pagado": resultado.monto_pagado,
+                    },
+                )
+            )
+        return aristas
+
+    def tripletes(self, registro: Registro) -> List[Triplete]:
+        if isinstance(registro, Cliente):
+            return self.tripletes_cliente(registro)
+        return self.tripletes_interaccion(registro)
+
+    def construir(
+        self, data: Union[DataSetInteracciones, Iterable[Registro]]
+    ) -> Iterator[Tuple[Registro, List[Triplete]]]:
+        """Recorre clientes e interacciones y entrega los tripletes de cada registro.
+
+        `data` puede ser un DataSetInteracciones completo o cualquier iterable de
+        registros (p. ej. `iterar_registros`), que se consume a medida que llega.
+        Los errores de construcción de un registro se reportan y el registro se
+        omite, igual que en la carga original.
+        """
+        medir = metricas.habilitado
+        for registro in registros_de(data):
+            if medir:
+                inicio = time.perf_counter()
+            try:
+                tripletes = self.tripletes(registro)
+            except Exception as e:
+                REGISTROS.inc(
+                    etapa="construccion", entidad=entidad_registro(registro), estado="fallido"
+                )
+                print(f"[ERROR] {etiqueta_registro(registro)}: {e}")
+                continue
+            if medir:
+                ETAPA_SEGUNDOS.observar(time.perf_counter() - inicio, etapa="construccion")
+            yield registro, tripletes
+
+
+def registros_de(
+    data: Union[DataSetInteracciones, Iterable[Registro]]
+) -> Iterator[Registro]:
+    if isinstance(data, DataSetInteracciones):
+        return chain(data.clientes or [], data.interacciones or [])
+    return iter(data)
+
+
+def entidad_registro(registro: Registro) -> str:
+    return "cliente" if isinstance(registro, Cliente) else "interaccion"
+
+
+def etiqueta_registro(registro: Registro) -> str:
+    if isinstance(registro, Cliente):
+        return f"Cliente {registro.id}"
+    return f"Interacción {registro.id}"
+
+
+def clave_cliente(registro: Registro) -> str:
+    if isinstance(registro, Cliente):
+        return registro.id
+    return registro.cliente_id
+
+
+def huella_cliente(cliente: Cliente) -> str:
+    return hashlib.sha1(cliente.model_dump_json().encode("utf-8")).hexdigest()
@@ -0,0 +1,376 @@
+import json
+import logging
+import os
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from models import Cliente, Interaccion
+from services.diccionario import Diccionario
+from services.promesas import ABIERTA, CUMPLIDA, INCUMPLIDA, MotorPromesas, es_pago, es_promesa
+from services.tiempo import a_microsegundos
+
+logger = logging.getLogger(__name__)
+
+Registro = Union[Cliente, Interaccion]
+
+DIA = "dia"
+SEMANA = "semana"
+MES = "mes"
+GRANULARIDADES = (DIA, SEMANA, MES)
+
+MEDIDAS = (
+    "interacciones",
+    "monto_pagado",
+    "monto_prometido",
+    "promesas_abiertas",
+    "promesas_cumplidas",
+    "promesas_incumplidas",
+)
+_MEDIDA_ESTADO = {ABIERTA: 3, CUMPLIDA: 4, INCUMPLIDA: 5}
+# Categoría para tipo_deuda, tipo o resultado ausentes
+SIN_VALOR = "desconocido"
+
+DIA_US = 86_400 * 1_000_000
+# Días de más que se reservan al crecer el eje de fechas
+_MARGEN_DIAS = 64
+_VERSION = 2
+
+
+def huella_archivo(ruta) -> str:
+    """Identifica una versión de un archivo de datos (ruta, tamaño y mtime)."""
+    estado = os.stat(ruta)
+    return f"{Path(ruta).resolve()}:{estado.st_size}:{estado.st_mtime_ns}"
+
+
+def _dia(fecha) -> int:
+    return a_microsegundos(fecha) // DIA_US
+
+
+def _capacidad(necesaria: int, actual: int) -> int:
+    return actual if necesaria <= actual else max(necesaria, 2 * actual)
+
+
+def _claves_periodo(dias: np.ndarray, granularidad: str) -> np.ndarray:
+    if granularidad == DIA:
+        return dias
+    if granularidad == SEMANA:
+        # El día 0 (1970-01-01) fue jueves: +3 hace que las semanas empiecen en lunes
+        return (dias + 3) // 7
+    return dias.astype("datetime64[D]").astype("datetime64[M]").astype(np.int64)
+
+
+def _etiqueta_periodo(dia: int, granularidad: str) -> str:
+    fecha = date(1970, 1, 1) + timedelta(days=dia)
+    if granularidad == DIA:
+        return fecha.isoformat()
+    if granularidad == SEMANA:
+        anio, semana, _ = fecha.isocalendar()
+        return f"{anio}-W{semana:02d}"
+    return fecha.strftime("%Y-%m")
+
+
+class CuboKPIs:
+    """KPIs pre-agregados por día × tipo_deuda × tipo × resultado.
+
+    Cada celda del cubo (un arreglo NumPy denso) guarda las `MEDIDAS` de las
+    interacciones de ese día: cantidad, montos pagados y prometidos, y las
+    promesas hechas ese día según su estado actual. Un lote ingerido suma sus
+    interacciones con un solo `np.add.at`; cuando `MotorPromesas` cambia el
+    estado de una promesa, se mueve su unidad de una medida a otra en la
+    celda donde se contó. El tipo_deuda es el del cliente al llegar la
+    interacción (`desconocido` si el cliente aún no se cargó).
+
+    `consultar` recorta el rango de días pedido y lo agrega por semana o mes
+    con `np.add.reduceat`: cuesta lo que el rango y no lo que el histórico de
+    interacciones.
+
+    `guardar` deja el cubo en un `.npz` comprimido asociado a la huella del
+    archivo de datos. Al arrancar con el mismo archivo, `restaurar` lo
+    recupera junto con los IDs ya contados, y la lectura del archivo solo
+    alimenta a `MotorPromesas`, sin volver a contar; `terminar_reproduccion`
+    corrige las promesas cuyo estado cambió desde que se guardó (p. ej. las
+    que vencieron). Una interacción reingerida nunca se vuelve a contar.
+    """
+
+    def __init__(self):
+        self.deudas = Diccionario()
+        self.tipos = Diccionario()
+        self.resultados = Diccionario()
+        self.promesas = MotorPromesas()
+
+        # Eje 0: días desde `dia0`; los días con datos son [dia_min, dia_max]
+        self._cubo = np.zeros((0, 0, 0, 0, len(MEDIDAS)), dtype=np.float64)
+        self.dia0 = 0
+        self.dia_min: Optional[int] = None
+        self.dia_max: Optional[int] = None
+
+        self._deuda_cliente: Dict[str, int] = {}
+        # Promesa -> (día, deuda, tipo, resultado, medida del estado contado)
+        self._promesas: Dict[str, Tuple[int, int, int, int, int]] = {}
+        # IDs de todas las interacciones contadas, para no contar dos veces una
+        # reingerida por antigua que sea (se guarda con el cubo)
+        self._contadas: set = set()
+        self._reproduciendo = False
+
+    @classmethod
+    def desde_registros(cls, registros: Iterable[Registro], **kwargs) -> "CuboKPIs":
+        cubo = cls(**kwargs)
+        cubo.aplicar_lote(registros)
+        return cubo
+
+    def aplicar_lote(self, registros: Iterable[Registro]):
+        interacciones: List[Interaccion] = []
+        for registro in registros:
+            if isinstance(registro, Cliente):
+                if registro.id is not None:
+                    self._deuda_cliente[registro.id] = self.deudas.codificar(
+                        registro.tipo_deuda or SIN_VALOR
+                    )
+            elif registro.timestamp is not None:
+                interacciones.append(registro)
+        if not interacciones:
+            return
+
+        indices: List[List[int]] = [[], [], [], [], []]
+        valores: List[float] = []
+
+        def sumar(celda: Tuple[int, int, int, int], medida: int, valor: float):
+            for eje, indice in zip(indices, celda + (medida,)):
+                eje.append(indice)
+            valores.append(valor)
+
+        for interaccion in interacciones:
+            if not self._nueva(interaccion) or self._reproduciendo:
+                continue
+            deuda = self._deuda_cliente.get(interaccion.cliente_id)
+            celda = (
+                _dia(interaccion.timestamp),
+                self.deudas.codificar(SIN_VALOR) if deuda is None else deuda,
+                self.tipos.codificar(interaccion.tipo or SIN_VALOR),
+                self.resultados.codificar(interaccion.resultado or SIN_VALOR),
+            )
+            sumar(celda, 0, 1.0)
+            if es_pago(interaccion):
+                sumar(celda, 1, interaccion.monto)
+            if es_promesa(interaccion):
+                sumar(celda, 2, interaccion.monto_prometido)
+                sumar(celda, 3, 1.0)
+                self._promesas[interaccion.id] = celda + (3,)
+
+        if valores:
+            dias = indices[0]
+            self._asegurar(min(dias), max(dias))
+            indices[0] = np.array(dias, dtype=np.int64) - self.dia0
+            np.add.at(self._cubo, tuple(np.asarray(eje) for eje in indices), valores)
+
+        self.promesas.aplicar_lote(interacciones)
+        self._aplicar_cambios()
+
+    def aplicar(self, registro: Registro):
+        self.aplicar_lote([registro])
+
+    def vencer(self, ahora: Optional[datetime] = None) -> int:
+        """Pasa a incumplidas las promesas abiertas que vencieron a `ahora`."""
+        clientes = self.promesas.vencer(ahora)
+        self._aplicar_cambios()
+        return clientes
+
+    def _aplicar_cambios(self):
+        cambios = self.promesas.cambios()
+        if not self._reproduciendo:
+            for _, resultado in cambios:
+                self._mover_promesa(resultado.promesa_id, resultado.estado)
+
+    def _nueva(self, interaccion: Interaccion) -> bool:
+        if interaccion.id is None:
+            return True
+        if interaccion.id in self._contadas:
+            return False
+        self._contadas.add(interaccion.id)
+        return True
+
+    def _mover_promesa(self, promesa_id: str, estado: str):
+        celda = self._promesas.get(promesa_id)
+        medida = _MEDIDA_ESTADO[estado]
+        if celda is None or celda[4] == medida:
+            return
+        posicion = (celda[0] - self.dia0,) + celda[1:4]
+        self._cubo[posicion + (celda[4],)] -= 1
+        self._cubo[posicion + (medida,)] += 1
+        self._promesas[promesa_id] = celda[:4] + (medida,)
+
+    def _asegurar(self, desde: int, hasta: int):
+        # Agranda el cubo para cubrir [desde, hasta] y los códigos nuevos
+        dias, deudas, tipos, resultados, medidas = self._cubo.shape
+        formas = (
+            _capacidad(len(self.deudas.valores), deudas),
+            _capacidad(len(self.tipos.valores), tipos),
+            _capacidad(len(self.resultados.valores), resultados),
+        )
+        if dias == 0:
+            inicio, fin = desde, hasta + 1 + _MARGEN_DIAS
+        else:
+            inicio, fin = self.dia0, self.dia0 + dias
+            if desde < inicio:
+                inicio = desde - _MARGEN_DIAS
+            if hasta >= fin:
+                fin = hasta + 1 + _MARGEN_DIAS
+        if (inicio, fin - inicio) + formas != (self.dia0, dias, deudas, tipos, resultados):
+            nuevo = np.zeros((fin - inicio,) + formas + (medidas,), dtype=np.float64)
+            desplazamiento = self.dia0 - inicio
+            nuevo[desplazamiento: desplazamiento + dias, :deudas, :tipos, :resultados] = self._cubo
+            self._cubo = nuevo
+            self.dia0 = inicio
+        self.dia_min = desde if self.dia_min is None else min(self.dia_min, desde)
+        self.dia_max = hasta if self.dia_max is None else max(self.dia_max, hasta)
+
+    def consultar(
+        self,
+        desde=None,
+        hasta=None,
+        tipo_deuda: Optional[Sequence[str]] = None,
+        granularidad: str = MES,
+    ) -> dict:
+        """Serie de KPIs por periodo y tipo_deuda entre `desde` y `hasta` (inclusive)."""
+        if granularidad not in GRANULARIDADES:
+            raise ValueError(
+                f"Granularidad desconocida: {granularidad} (usa {', '.join(GRANULARIDADES)})"
+            )
+        if desde is not None and hasta is not None and desde > hasta:
+            raise ValueError("desde debe ser anterior a hasta")
+        respuesta = {"granularidad": granularidad, "periodos": [], "totales": None}
+        if self.dia_min is None:
+            return respuesta
+        inicio = self.dia_min if desde is None else max(self.dia_min, _dia(desde))
+        fin = self.dia_max if hasta is None else min(self.dia_max, _dia(hasta))
+
+        deudas = np.arange(len(self.deudas.valores))
+        if tipo_deuda:
+            deudas = np.array(
+                [c for c in map(self.deudas.codigo, tipo_deuda) if c >= 0], dtype=np.int64
+            )
+        if inicio > fin or not len(deudas):
+            return respuesta
+
+        sub = self._cubo[
+            inicio - self.dia0: fin - self.dia0 + 1,
+            :,
+            : len(self.tipos.valores),
+            : len(self.resultados.valores),
+        ][:, deudas]
+        dias = np.arange(inicio, fin + 1)
+        claves = _claves_periodo(dias, granularidad)
+        cortes = np.flatnonzero(np.r_[True, claves[1:] != claves[:-1]])
+        por_periodo = np.add.reduceat(sub, cortes, axis=0)
+
+        totales = por_periodo.sum(axis=(2, 3))
+        conteos = por_periodo[..., 0]
+        por_tipo = conteos.sum(axis=3)
+        por_resultado = conteos.sum(axis=2)
+        for p, d in zip(*np.nonzero(totales.any(axis=2))):
+            fila = self._fila(totales[p, d], por_tipo[p, d], por_resultado[p, d])
+            respuesta["periodos"].append({
+                "periodo": _etiqueta_periodo(int(dias[cortes[p]]), granularidad),
+                "tipo_deuda": self.deudas.valores[deudas[d]],
+                **fila,
+            })
+        respuesta["totales"] = self._fila(
+            totales.sum(axis=(0, 1)), por_tipo.sum(axis=(0, 1)), por_resultado.sum(axis=(0, 1))
+        )
+        return respuesta
+
+    def _fila(self, medidas: np.ndarray, por_tipo: np.ndarray, por_resultado: np.ndarray) -> dict:
+        return {
+            "interacciones": int(round(medidas[0])),
+            "monto_pagado": float(medidas[1]),
+            "monto_prometido": float(medidas[2]),
+            "promesas": {
+                "abiertas": int(round(medidas[3])),
+                "cumplidas": int(round(medidas[4])),
+                "incumplidas": int(round(medidas[5])),
+            },
+            "por_tipo": {
+                self.tipos.valores[i]: int(round(n)) for i, n in enumerate(por_tipo) if n
+            },
+            "por_resultado": {
+                self.resultados.valores[i]: int(round(n)) for i, n in enumerate(por_resultado) if n
+            },
+        }
+
+    def guardar(self, ruta, huella: str):
+        """Guarda el cubo para `restaurar` al arrancar con los mismos datos."""
+        if self.dia_min is None:
+            cubo = self._cubo[:0]
+        else:
+            cubo = self._cubo[self.dia_min - self.dia0: self.dia_max - self.dia0 + 1]
+        meta = {
+            "version": _VERSION,
+            "huella": huella,
+            "dia0": self.dia_min,
+            "deudas": self.deudas.valores,
+            "tipos": self.tipos.valores,
+            "resultados": self.resultados.valores,
+        }
+        temporal = f"{ruta}.{os.getpid()}.tmp"
+        with open(temporal, "wb") as f:
+            np.savez_compressed(
+                f,
+                meta=np.array(json.dumps(meta)),
+                cubo=cubo[
+                    :,
+                    : len(self.deudas.valores),
+                    : len(self.tipos.valores),
+                    : len(self.resultados.valores),
+                ],
+                promesas_id=np.array(list(self._promesas), dtype=str),
+                promesas_celda=np.array(list(self._promesas.values()), dtype=np.int64).reshape(-1, 5),
+                contadas_id=np.array(list(self._contadas), dtype=str),
+            )
+        os.replace(temporal, ruta)
+
+    def restaurar(self, ruta, huella: str) -> bool:
+        """Carga un cubo guardado con la misma `huella`; devuelve si lo hizo.
+
+        Después hay que volver a aplicar los mismos registros (que solo se
+        usan para las promesas) y llamar a
+        `terminar_reproduccion`.
+        """
+        if not os.path.exists(ruta):
+            return False
+        try:
+            with np.load(ruta) as datos:
+                meta = json.loads(str(datos["meta"]))
+                if meta.get("version") != _VERSION or meta.get("huella") != huella:
+                    logger.info(f"Cubo de KPIs {ruta} desactualizado, se recalcula")
+                    return False
+                cubo = datos["cubo"]
+                promesas_id = datos["promesas_id"].tolist()
+                promesas_celda = datos["promesas_celda"].tolist()
+                contadas = datos["contadas_id"].tolist()
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"No se pudo leer el cubo de KPIs {ruta}: {e}")
+            return False
+
+        for diccionario, valores in (
+            (self.deudas, meta["deudas"]),
+            (self.tipos, meta["tipos"]),
+            (self.resultados, meta["resultados"]),
+        ):
+            for valor in valores:
+                diccionario.codificar(valor)
+        self._cubo = cubo.astype(np.float64)
+        if len(cubo):
+            self.dia0 = self.dia_min = meta["dia0"]
+            self.dia_max = self.dia0 + len(cubo) - 1
+        self._promesas = {p: tuple(c) for p, c in zip(promesas_id, promesas_celda)}
+        self._contadas = set(contadas)
+        self._reproduciendo = True
+        return True
+
+    def terminar_reproduccion(self):
+        self._reproduciendo = False
+        for resultado in self.promesas.todos():
+            self._mover_promesa(resultado.promesa_id, resultado.estado)
@@ -1,11 +1,41 @@
 import json
 import logging
-from models import DataSetInteracciones
+import re
+import time
+import zlib
+from itertools import count
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple, Union
+
+from models import Cliente, DataSetInteracciones, Interaccion
+from services.metricas import ETAPA_SEGUNDOS, REGISTROS, metricas
+from services.validacion import (
+    ARREGLO_CLIENTES,
+    ARREGLO_INTERACCIONES,
+    EXTENSIONES_NDJSON,
+    INTERACCION,
+    ClienteEstricto,
+    Rechazos,
+    describir_error,
+    iterar_ndjson_estricto,
+)
 
 logger = logging.getLogger(__name__)
 
+Registro = Union[Cliente, Interaccion]
+
+TAMANO_BLOQUE = 1 << 16
+
+# Clave de partición de una línea NDJSON sin decodificarla: `cliente_id` en las
+# interacciones, `id` en los clientes
+_CLIENTE_ID = re.compile(rb'"cliente_id"\s*:\s*"([^"]*)"')
+_ID = re.compile(rb'"id"\s*:\s*"([^"]*)"')
+
 
 def cargar_validar_json(path: str) -> DataSetInteracciones:
+    if Path(path).suffix in EXTENSIONES_NDJSON:
+        return _dataset_desde_registros(iterar_registros(path))
+
     with open(path, "r", encoding="utf-8") as f:
         raw_data = json.load(f)
 
@@ -18,3 +48,398 @@ def cargar_validar_json(path: str) -> DataSetInteracciones:
     except Exception as e:
         logger.error(f"Error de validación: {e}")
         raise
+
+
+def iterar_registros(
+    path: str,
+    rechazos: Optional[Rechazos] = None,
+    estricto: bool = True,
+    particion: Optional[Tuple[int, int]] = None,
+) -> Iterator[Registro]:
+    """Lee el archivo de forma incremental y entrega cada registro ya validado.
+
+    Acepta el JSON del modelo de datos (`{"metadata": ..., "clientes": [...],
+    "interacciones": [...]}`) o NDJSON con un cliente o interacción por línea.
+    Solo se mantiene en memoria el bloque de texto en curso y el registro que se
+    está validando, así que la memoria no crece con el tamaño del archivo. Los
+    registros se entregan en el orden del archivo: los consumidores que enlazan
+    interacciones con su cliente esperan los clientes primero.
+
+    Por defecto se valida con el esquema estricto (`ClienteEstricto` y las
+    variantes por `tipo` de `InteraccionTipada`, ver services/validacion.py);
+    `estricto=False` usa los modelos planos. Con `rechazos` los registros
+    inválidos se anotan ahí y se omiten en lugar de abortar la lectura.
+
+    `particion=(indice, total)` entrega solo los registros de los clientes cuyo
+    `particion_cliente` es `indice` (cliente e interacciones van juntos); las
+    demás líneas se descartan antes de validarlas. Requiere el esquema estricto.
+    """
+    if particion is not None and not estricto:
+        raise ValueError("La lectura por particiones requiere el esquema estricto")
+    if Path(path).suffix in EXTENSIONES_NDJSON:
+        if estricto:
+            seleccionar = _seleccionar_linea(*particion) if particion else None
+            registros = iterar_ndjson_estricto(path, rechazos, seleccionar)
+        else:
+            registros = _iterar_ndjson(path, rechazos)
+    else:
+        seleccionar = _seleccionar_elemento(*particion) if particion else None
+        registros = _iterar_documento(path, rechazos, estricto, seleccionar)
+
+    clientes = interacciones = 0
+    try:
+        for registro in registros:
+            if isinstance(registro, Cliente):
+                clientes += 1
+            else:
+                interacciones += 1
+            yield registro
+    finally:
+        # Se cuenta al final (o al abandonar la lectura) y no por registro
+        REGISTROS.inc(clientes, etapa="lectura", entidad="cliente", estado="procesado")
+        REGISTROS.inc(interacciones, etapa="lectura", entidad="interaccion", estado="procesado")
+
+    logger.info(
+        f"Lectura incremental completa: {clientes} clientes, {interacciones} interacciones"
+    )
+
+
+def iterar_lotes(path: str, tamano: int = 1000) -> Iterator[List[Registro]]:
+    if tamano < 1:
+        raise ValueError("tamano debe ser mayor que 0")
+
+    lote: List[Registro] = []
+    for registro in iterar_registros(path):
+        lote.append(registro)
+        if len(lote) >= tamano:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+
+def observar_lotes(
+    registros: Iterable[Registro], observadores, tamano: int = 10_000
+) -> Iterator[Registro]:
+    """Deja pasar los registros sin cambios, entregando antes cada lote de
+    `tamano` a los observadores (`aplicar_lote`). Sirve para alimentar modelos
+    en memoria con la misma lectura en streaming que consume la carga."""
+    lote: List[Registro] = []
+    for registro in registros:
+        lote.append(registro)
+        if len(lote) >= tamano:
+            for observador in observadores:
+                observador.aplicar_lote(lote)
+            yield from lote
+            lote = []
+    if lote:
+        for observador in observadores:
+            observador.aplicar_lote(lote)
+        yield from lote
+
+
+def particion_cliente(cliente_id: Union[str, bytes], total: int) -> int:
+    if isinstance(cliente_id, str):
+        cliente_id = cliente_id.encode("utf-8")
+    return zlib.crc32(cliente_id) % total
+
+
+def _seleccionar_linea(indice: int, total: int) -> Callable[[bytes], bool]:
+    def seleccionar(linea: bytes) -> bool:
+        clave = _CLIENTE_ID.search(linea) or _ID.search(linea)
+        if clave is None:
+            # metadata, líneas en blanco o inválidas: las revisa la partición 0
+            return indice == 0
+        return zlib.crc32(clave.group(1)) % total == indice
+
+    return seleccionar
+
+
+def _seleccionar_elemento(indice: int, total: int) -> Callable[[str, dict], bool]:
+    def seleccionar(clave: str, raw) -> bool:
+        cliente_id = None
+        if isinstance(raw, dict):
+            cliente_id = raw.get("cliente_id" if clave == "interacciones" else "id")
+        if not isinstance(cliente_id, str):
+            return indice == 0
+        return particion_cliente(cliente_id, total) == indice
+
+    return seleccionar
+
+
+def validar_registro(raw: dict) -> Registro:
+    """Valida un registro suelto (línea NDJSON) como Cliente o Interaccion.
+
+    Se puede indicar el tipo con `"registro": "cliente" | "interaccion"`; si no
+    viene, un registro con `cliente_id` se considera interacción.
+    """
+    raw = dict(raw)
+    tipo_registro = raw.pop("registro", None)
+    if tipo_registro is None:
+        tipo_registro = "interaccion" if "cliente_id" in raw else "cliente"
+
+    if tipo_registro == "cliente":
+        return Cliente(**raw)
+    if tipo_registro == "interaccion":
+        return Interaccion(**raw)
+    raise ValueError(f"Tipo de registro desconocido: {tipo_registro}")
+
+
+def _dataset_desde_registros(registros) -> DataSetInteracciones:
+    clientes, interacciones = [], []
+    for registro in registros:
+        if isinstance(registro, Cliente):
+            clientes.append(registro)
+        else:
+            interacciones.append(registro)
+    return DataSetInteracciones(clientes=clientes, interacciones=interacciones)
+
+
+def _entidad(raw: dict) -> str:
+    if raw.get("registro") in ("cliente", "interaccion"):
+        return raw["registro"]
+    return "interaccion" if "cliente_id" in raw else "cliente"
+
+
+def _iterar_ndjson(path: str, rechazos: Optional[Rechazos] = None) -> Iterator[Registro]:
+    # Con las métricas apagadas no se toma ningún tiempo
+    medir = metricas.habilitado
+    reloj = time.perf_counter
+    with open(path, "r", encoding="utf-8") as f:
+        for numero, linea in enumerate(f, start=1):
+            linea = linea.strip()
+            if not linea:
+                continue
+            if medir:
+                inicio = reloj()
+            raw = json.loads(linea)
+            if medir:
+                parseado = reloj()
+                ETAPA_SEGUNDOS.observar(parseado - inicio, etapa="parse")
+            if "metadata" in raw:
+                continue
+            try:
+                registro = validar_registro(raw)
+            except Exception as e:
+                if rechazos is not None:
+                    rechazos.registrar(str(numero), _entidad(raw), raw.get("id"), describir_error(e))
+                    continue
+                REGISTROS.inc(etapa="validacion", entidad=_entidad(raw), estado="fallido")
+                logger.error(f"Error de validación en la línea {numero}: {e}")
+                raise
+            if medir:
+                ETAPA_SEGUNDOS.observar(reloj() - parseado, etapa="validacion")
+            yield registro
+
+
+def _iterar_documento(
+    path: str,
+    rechazos: Optional[Rechazos] = None,
+    estricto: bool = True,
+    seleccionar: Optional[Callable[[str, dict], bool]] = None,
+) -> Iterator[Registro]:
+    # Con el esquema estricto los arreglos se validan por tramos de texto, sin
+    # decodificar cada elemento a dict; un tramo que falla se revisa elemento
+    # por elemento para anotar los rechazos. Al leer una partición se valida
+    # elemento por elemento, para no validar los registros de las demás
+    tramos = {}
+    if estricto:
+        modelos = {
+            "clientes": ClienteEstricto.model_validate,
+            "interacciones": INTERACCION.validate_python,
+        }
+        if seleccionar is None:
+            tramos = {
+                "clientes": ARREGLO_CLIENTES.validator.validate_json,
+                "interacciones": ARREGLO_INTERACCIONES.validator.validate_json,
+            }
+    else:
+        modelos = {
+            "clientes": lambda raw: Cliente(**raw),
+            "interacciones": lambda raw: Interaccion(**raw),
+        }
+    entidades = {"clientes": "cliente", "interacciones": "interaccion"}
+
+    with open(path, "r", encoding="utf-8") as f:
+        lector = _LectorJSON(f)
+        lector.esperar("{")
+        if lector.consumir_si("}"):
+            return
+
+        while True:
+            clave = lector.valor()
+            lector.esperar(":")
+
+            modelo = modelos.get(clave)
+            if modelo is None:
+                # metadata u otras claves: son pequeñas, se leen y descartan
+                lector.valor()
+            elif lector.consumir_si("null"):
+                pass
+            else:
+                lector.esperar("[")
+                if not lector.consumir_si("]"):
+                    yield from _iterar_arreglo(
+                        lector, clave, modelo, tramos.get(clave), entidades[clave], rechazos, seleccionar
+                    )
+
+            if lector.consumir_si("}"):
+                return
+            lector.esperar(",")
+
+
+def _iterar_arreglo(lector, clave, modelo, validar_tramo, entidad, rechazos, seleccionar):
+    # Recorre un arreglo ya abierto hasta consumir su `]`
+    medir = metricas.habilitado
+    reloj = time.perf_counter
+    # Hasta esta posición del archivo se valida elemento por elemento
+    hasta = 0
+    indice = 0
+    while True:
+        if validar_tramo is not None and lector.posicion() >= hasta:
+            tramo = lector.tramo()
+            if tramo:
+                if medir:
+                    inicio = reloj()
+                try:
+                    registros = validar_tramo(f"[{tramo}]")
+                except ValueError:
+                    # Un elemento inválido o un corte mal elegido
+                    hasta = lector.posicion() + len(tramo)
+                else:
+                    if medir:
+                        ETAPA_SEGUNDOS.observar(reloj() - inicio, etapa="validacion")
+                    lector.avanzar(len(tramo))
+                    indice += len(registros)
+                    yield from registros
+                    if lector.consumir_si("]"):
+                        return
+                    lector.esperar(",")
+                    continue
+
+        if medir:
+            inicio = reloj()
+        raw = lector.valor()
+        if medir:
+            parseado = reloj()
+            ETAPA_SEGUNDOS.observar(parseado - inicio, etapa="parse")
+        if seleccionar is None or seleccionar(clave, raw):
+            registro = _validar_elemento(modelo, raw, clave, indice, entidad, rechazos)
+            if registro is not None:
+                if medir:
+                    ETAPA_SEGUNDOS.observar(reloj() - parseado, etapa="validacion")
+                yield registro
+        indice += 1
+        if lector.consumir_si("]"):
+            return
+        lector.esperar(",")
+
+
+def _validar_elemento(modelo, raw, clave: str, indice: int, entidad: str, rechazos):
+    try:
+        return modelo(raw)
+    except Exception as e:
+        if rechazos is None:
+            REGISTROS.inc(etapa="validacion", entidad=entidad, estado="fallido")
+            logger.error(f"Error de validación en {clave}: {e}")
+            raise
+        raw_id = raw.get("id") if isinstance(raw, dict) else None
+        rechazos.registrar(f"{clave}[{indice}]", entidad, raw_id, describir_error(e))
+        return None
+
+
+class _LectorJSON:
+    """Tokenizador mínimo sobre un archivo leído por bloques.
+
+    Solo entiende la estructura necesaria para recorrer el objeto raíz y sus
+    arreglos; cada valor completo se decodifica con `json.JSONDecoder`.
+    """
+
+    def __init__(self, archivo, tamano_bloque: int = TAMANO_BLOQUE):
+        self.archivo = archivo
+        self.tamano_bloque = tamano_bloque
+        self.buffer = ""
+        self.pos = 0
+        # Caracteres ya descartados del buffer
+        self.descartados = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _leer(self, minimo: int = 0) -> bool:
+        if self.eof:
+            return False
+        # Descartar lo ya consumido para que el buffer no crezca
+        if self.pos:
+            self.buffer = self.buffer[self.pos :]
+            self.descartados += self.pos
+            self.pos = 0
+        bloque = self.archivo.read(max(self.tamano_bloque, minimo))
+        if not bloque:
+            self.eof = True
+            return False
+        self.buffer += bloque
+        return True
+
+    def _saltar_espacios(self):
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in " \t\r\n":
+                self.pos += 1
+            if self.pos < len(self.buffer) or not self._leer():
+                return
+
+    def consumir_si(self, literal: str) -> bool:
+        self._saltar_espacios()
+        while len(self.buffer) - self.pos < len(literal) and self._leer():
+            pass
+        if self.buffer.startswith(literal, self.pos):
+            self.pos += len(literal)
+            return True
+        return False
+
+    def esperar(self, literal: str):
+        if not self.consumir_si(literal):
+            contexto = self.buffer[self.pos : self.pos + 20]
+            raise ValueError(f"JSON inválido: se esperaba {literal!r} cerca de {contexto!r}")
+
+    def valor(self):
+        self._saltar_espacios()
+        while True:
+            try:
+                valor, fin = self.decoder.raw_decode(self.buffer, self.pos)
+                # Un número al final del buffer puede estar cortado: leer más
+                if fin < len(self.buffer) or self.eof:
+                    self.pos = fin
+                    return valor
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            # El valor no cabe en el buffer actual: leer un bloque al menos
+            # tan grande como lo pendiente para no decodificar en cuadrático
+            self._leer(minimo=len(self.buffer) - self.pos)
+
+    def posicion(self) -> int:
+        return self.descartados + self.pos
+
+    def avanzar(self, caracteres: int):
+        self.pos += caracteres
+
+    def tramo(self) -> str:
+        """Texto de los elementos completos que siguen en el arreglo en curso,
+        sin consumirlos.
+
+        Corta en el último `}` seguido de `,` o `]` antes del primer `]` del
+        buffer. El corte puede caer dentro de un string: quien use el tramo
+        tiene que decodificarlo y descartarlo si no es válido.
+        """
+        self._saltar_espacios()
+        if len(self.buffer) - self.pos < self.tamano_bloque:
+            self._leer()
+        fin = self.buffer.find("]", self.pos)
+        if fin < 0:
+            fin = len(self.buffer)
+        while True:
+            fin = self.buffer.rfind("}", self.pos, fin)
+            if fin < 0:
+                return ""
+            if self.buffer[fin + 1 : fin + 65].lstrip()[:1] in (",", "]"):
+                return self.buffer[self.pos : fin + 1]
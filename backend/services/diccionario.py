@@ -0,0 +1,24 @@
+from typing import Dict, List, Optional
+
+
+class Diccionario:
+    """Codificación por diccionario de una columna de texto repetitivo."""
+
+    def __init__(self):
+        self.valores: List[str] = []
+        self.codigos: Dict[str, int] = {}
+
+    def codificar(self, valor: Optional[str]) -> int:
+        if valor is None:
+            return -1
+        codigo = self.codigos.get(valor)
+        if codigo is None:
+            codigo = self.codigos[valor] = len(self.valores)
+            self.valores.append(valor)
+        return codigo
+
+    def codigo(self, valor: str) -> int:
+        return self.codigos.get(valor, -2)
+
+    def decodificar(self, codigo: int) -> Optional[str]:
+        return None if codigo < 0 else self.valores[codigo]
@@ -0,0 +1,329 @@
+import asyncio
+import fcntl
+import hashlib
+import os
+import re
+import struct
+import time
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from graphiti_core.embedder.client import EMBEDDING_DIM, EmbedderClient
+from graphiti_core.embedder.openai import OpenAIEmbedder
+
+from services.metricas import EMBEDDINGS, EMBEDDINGS_LLAMADAS
+
+MAGIA = b"EMBCACH2"
+# magia, dimensión, vías por conjunto, conjuntos
+CABECERA = struct.Struct("<8sIIQ")
+TAMANO_CABECERA = 64
+VIAS = 8
+# Máximo de textos por llamada al proveedor (OpenAI acepta hasta 2048)
+TAMANO_LOTE = 1024
+
+
+def clave_texto(modelo: str, texto: str) -> bytes:
+    return hashlib.blake2b(f"{modelo}\0{texto}".encode("utf-8"), digest_size=16).digest()
+
+
+class CacheEmbeddings:
+    """Cache persistente de embeddings en un archivo con mmap.
+
+    El archivo es una tabla asociativa por conjuntos: cada mitad de la clave
+    (hash de 128 bits del modelo y el texto) elige un conjunto de `VIAS`
+    entradas y la clave puede quedar en cualquiera de los dos; si ambos están
+    llenos se reemplaza la entrada usada hace más tiempo (LRU). Con dos
+    conjuntos posibles casi no hay desalojos mientras la tabla no se llene. El
+    tamaño es fijo desde la creación, así que no hay que rehashear, y el
+    archivo se crea disperso: solo ocupa disco lo escrito.
+
+    Varios procesos pueden abrir el mismo archivo: las lecturas no bloquean
+    (se copia el vector y se vuelve a comprobar la clave, por si otro proceso
+    reemplazó la entrada a la vez) y las escrituras toman un `flock`.
+    """
+
+    def __init__(self, ruta: str, dimension: int = EMBEDDING_DIM, entradas: int = 100_000):
+        self.ruta = str(ruta)
+        self.dimension = dimension
+        self.dtype = np.dtype(
+            [("h1", "<u8"), ("h2", "<u8"), ("uso", "<u8"), ("vector", "<f4", (dimension,))]
+        )
+        self._fd = os.open(self.ruta, os.O_RDWR | os.O_CREAT, 0o644)
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            cabecera = os.pread(self._fd, CABECERA.size, 0)
+            if len(cabecera) < CABECERA.size:
+                conjuntos = max(1, -(-entradas // VIAS))
+                os.pwrite(self._fd, CABECERA.pack(MAGIA, dimension, VIAS, conjuntos), 0)
+                os.ftruncate(self._fd, TAMANO_CABECERA + conjuntos * VIAS * self.dtype.itemsize)
+            else:
+                magia, dim_archivo, vias, conjuntos = CABECERA.unpack(cabecera)
+                if magia != MAGIA or vias != VIAS:
+                    raise ValueError(f"{self.ruta} no es una cache de embeddings")
+                if dim_archivo != dimension:
+                    raise ValueError(
+                        f"{self.ruta} guarda embeddings de dimensión {dim_archivo}, no {dimension}"
+                    )
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        self.conjuntos = conjuntos
+        self.tabla = np.memmap(
+            self.ruta, dtype=self.dtype, mode="r+", offset=TAMANO_CABECERA,
+            shape=(conjuntos * VIAS,),
+        )
+        self._h1 = self.tabla["h1"]
+        self._h2 = self.tabla["h2"]
+        self._uso = self.tabla["uso"]
+        self._vectores = self.tabla["vector"]
+
+    def cerrar(self):
+        self.tabla.flush()
+        del self.tabla, self._h1, self._h2, self._uso, self._vectores
+        os.close(self._fd)
+
+    @staticmethod
+    def _partir(claves: List[bytes]) -> np.ndarray:
+        hashes = np.frombuffer(b"".join(claves), dtype="<u8").reshape(-1, 2).copy()
+        # (0, 0) marca una entrada vacía
+        hashes[(hashes[:, 0] == 0) & (hashes[:, 1] == 0), 0] = 1
+        return hashes
+
+    def _entradas(self, hashes: np.ndarray) -> np.ndarray:
+        # Las 2 * VIAS entradas candidatas de cada clave
+        conjuntos = (hashes % np.uint64(self.conjuntos)).astype(np.int64) * VIAS
+        return (conjuntos[:, :, None] + np.arange(VIAS)).reshape(len(hashes), 2 * VIAS)
+
+    def buscar(self, claves: List[bytes]) -> Dict[int, np.ndarray]:
+        """Devuelve {posición en `claves`: vector} de las claves encontradas."""
+        if not claves:
+            return {}
+        hashes = self._partir(claves)
+        entradas = self._entradas(hashes)
+        coincide = (self._h1[entradas] == hashes[:, :1]) & (self._h2[entradas] == hashes[:, 1:])
+        filas = np.flatnonzero(coincide.any(axis=1))
+        if not len(filas):
+            return {}
+        posiciones = entradas[filas, coincide[filas].argmax(axis=1)]
+        vectores = self._vectores[posiciones]
+        # Otro proceso pudo reemplazar la entrada mientras se copiaba
+        vigentes = (self._h1[posiciones] == hashes[filas, 0]) & (
+            self._h2[posiciones] == hashes[filas, 1]
+        )
+        self._uso[posiciones[vigentes]] = time.time_ns()
+        return {int(f): v for f, v, ok in zip(filas, vectores, vigentes) if ok}
+
+    def guardar(self, claves: List[bytes], vectores: List[List[float]]):
+        if not claves:
+            return
+        hashes = self._partir(claves)
+        entradas = self._entradas(hashes)
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            ahora = time.time_ns()
+            for (h1, h2), candidatas, vector in zip(hashes, entradas, vectores):
+                iguales = np.flatnonzero((self._h1[candidatas] == h1) & (self._h2[candidatas] == h2))
+                if len(iguales):
+                    posicion = candidatas[iguales[0]]
+                else:
+                    vacias = ((self._h1[candidatas] == 0) & (self._h2[candidatas] == 0)).reshape(2, VIAS)
+                    if vacias.any():
+                        # Se ocupa el conjunto menos lleno de los dos, no el
+                        # primero con hueco: así se reparten y tardan en llenarse
+                        conjunto = int(vacias[1].sum() > vacias[0].sum())
+                        posicion = candidatas[conjunto * VIAS + vacias[conjunto].argmax()]
+                    else:
+                        posicion = candidatas[self._uso[candidatas].argmin()]
+                # La clave se borra antes de escribir el vector y se fija al
+                # final, para que un lector nunca vea un vector a medias
+                self._h1[posicion] = 0
+                self._h2[posicion] = 0
+                self._vectores[posicion] = vector
+                self._uso[posicion] = ahora
+                self._h2[posicion] = h2
+                self._h1[posicion] = h1
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def __len__(self) -> int:
+        return int(np.count_nonzero(self._h1))
+
+
+class EmbedderCacheado(EmbedderClient):
+    """Embedder delante del proveedor: cache por contenido y lotes grandes.
+
+    Graphiti pide un embedding por nodo o arista (`create` con un solo texto)
+    en la carga por tripletes. Las llamadas concurrentes que no están en la
+    cache se juntan durante `espera` segundos (o hasta `tamano_lote` textos)
+    y se piden en una sola llamada `create_batch`, sin repetir textos iguales.
+    Lo que devuelve el proveedor se guarda en la cache, así que recargar el
+    mismo archivo casi no lo toca.
+    """
+
+    def __init__(
+        self,
+        base: EmbedderClient,
+        cache: Optional[CacheEmbeddings] = None,
+        modelo: Optional[str] = None,
+        tamano_lote: int = TAMANO_LOTE,
+        espera: float = 0.005,
+    ):
+        self.base = base
+        self.cache = cache
+        # El modelo es parte de la clave: cambiarlo no reutiliza vectores viejos
+        config = getattr(base, "config", None)
+        self.modelo = modelo or str(
+            getattr(base, "modelo", None)
+            or getattr(config, "embedding_model", None)
+            or type(base).__name__
+        )
+        self.tamano_lote = tamano_lote
+        self.espera = espera
+        self._pendientes: Dict[str, asyncio.Future] = {}
+        self._vaciado: Optional[asyncio.TimerHandle] = None
+
+    async def create(self, input_data) -> List[float]:
+        if isinstance(input_data, list) and len(input_data) == 1 and isinstance(input_data[0], str):
+            input_data = input_data[0]
+        if not isinstance(input_data, str):
+            # Tokens o varios textos: se delega sin cache
+            EMBEDDINGS_LLAMADAS.inc()
+            return await self.base.create(input_data)
+
+        encontrados = self._buscar([input_data])
+        if encontrados:
+            return encontrados[0]
+        futuro = self._pendientes.get(input_data)
+        if futuro is None:
+            futuro = self._pendientes[input_data] = asyncio.get_running_loop().create_future()
+            if len(self._pendientes) >= self.tamano_lote:
+                self._vaciar()
+            elif self._vaciado is None:
+                self._vaciado = asyncio.get_running_loop().call_later(self.espera, self._vaciar)
+        return await asyncio.shield(futuro)
+
+    async def create_batch(self, input_data_list: List[str]) -> List[List[float]]:
+        resultado: List[Optional[List[float]]] = [None] * len(input_data_list)
+        for posicion, vector in self._buscar(input_data_list).items():
+            resultado[posicion] = vector
+        faltantes: Dict[str, List[int]] = {}
+        for posicion, texto in enumerate(input_data_list):
+            if resultado[posicion] is None:
+                faltantes.setdefault(texto, []).append(posicion)
+        if faltantes:
+            textos = list(faltantes)
+            for texto, vector in zip(textos, await self._pedir(textos)):
+                for posicion in faltantes[texto]:
+                    resultado[posicion] = vector
+        return resultado
+
+    def _buscar(self, textos: List[str]) -> Dict[int, List[float]]:
+        if self.cache is None:
+            EMBEDDINGS.inc(len(textos), resultado="fallo")
+            return {}
+        encontrados = self.cache.buscar([clave_texto(self.modelo, t) for t in textos])
+        EMBEDDINGS.inc(len(encontrados), resultado="acierto")
+        EMBEDDINGS.inc(len(textos) - len(encontrados), resultado="fallo")
+        return {posicion: vector.tolist() for posicion, vector in encontrados.items()}
+
+    async def _pedir(self, textos: List[str]) -> List[List[float]]:
+        vectores: List[List[float]] = []
+        for inicio in range(0, len(textos), self.tamano_lote):
+            lote = textos[inicio : inicio + self.tamano_lote]
+            EMBEDDINGS_LLAMADAS.inc()
+            try:
+                nuevos = await self.base.create_batch(lote)
+            except NotImplementedError:
+                nuevos = await asyncio.gather(*(self.base.create([t]) for t in lote))
+            if self.cache is not None:
+                self.cache.guardar([clave_texto(self.modelo, t) for t in lote], nuevos)
+            vectores.extend(nuevos)
+        return vectores
+
+    def _vaciar(self):
+        if self._vaciado is not None:
+            self._vaciado.cancel()
+            self._vaciado = None
+        pendientes, self._pendientes = self._pendientes, {}
+        if pendientes:
+            asyncio.get_running_loop().create_task(self._resolver(pendientes))
+
+    async def _resolver(self, pendientes: Dict[str, asyncio.Future]):
+        try:
+            vectores = await self._pedir(list(pendientes))
+        except Exception as e:
+            for futuro in pendientes.values():
+                if not futuro.done():
+                    futuro.set_exception(e)
+            return
+        for futuro, vector in zip(pendientes.values(), vectores):
+            if not futuro.done():
+                futuro.set_result(vector)
+
+    def cerrar(self):
+        if self.cache is not None:
+            self.cache.cerrar()
+            self.cache = None
+
+
+_TOKENS = re.compile(r"\w+")
+
+
+class EmbedderLocal(EmbedderClient):
+    """Embedder determinista y sin red, para pruebas y cargas offline.
+
+    Proyecta palabras y trigramas de caracteres a `dimension` posiciones con
+    un hash (feature hashing) y normaliza: textos iguales dan el mismo vector
+    y textos parecidos, vectores cercanos.
+    """
+
+    def __init__(self, dimension: int = EMBEDDING_DIM, modelo: str = "local-hash-v1"):
+        self.dimension = dimension
+        self.modelo = modelo
+
+    def vector(self, texto: str) -> List[float]:
+        vector = np.zeros(self.dimension, dtype=np.float32)
+        for palabra in _TOKENS.findall(texto.lower()):
+            posiciones, signos = self._proyectar(palabra)
+            np.add.at(vector, posiciones, signos)
+        norma = np.linalg.norm(vector)
+        if norma:
+            vector /= norma
+        return vector.tolist()
+
+    @lru_cache(maxsize=1 << 16)
+    def _proyectar(self, palabra: str) -> Tuple[np.ndarray, np.ndarray]:
+        # Las palabras se repiten mucho entre textos (hechos con plantilla)
+        marcada = f"#{palabra}#"
+        tokens = [palabra] + [marcada[i : i + 3] for i in range(len(marcada) - 2)]
+        valores = [
+            int.from_bytes(hashlib.blake2b(t.encode("utf-8"), digest_size=8).digest(), "little")
+            for t in tokens
+        ]
+        return (
+            np.array([v % self.dimension for v in valores]),
+            np.array([1.0 if v >> 63 else -1.0 for v in valores], dtype=np.float32),
+        )
+
+    async def create(self, input_data) -> List[float]:
+        if isinstance(input_data, list):
+            input_data = " ".join(map(str, input_data))
+        return self.vector(str(input_data))
+
+    async def create_batch(self, input_data_list: List[str]) -> List[List[float]]:
+        return [self.vector(texto) for texto in input_data_list]
+
+
+def crear_embedder(
+    tipo: str = "openai", ruta_cache: Optional[str] = None, entradas: int = 100_000
+) -> EmbedderCacheado:
+    if tipo == "local":
+        base = EmbedderLocal()
+        dimension = base.dimension
+    elif tipo == "openai":
+        base = OpenAIEmbedder()
+        dimension = base.config.embedding_dim
+    else:
+        raise ValueError(f"Embedder desconocido: {tipo} (usa openai o local)")
+    cache = CacheEmbeddings(ruta_cache, dimension, entradas) if ruta_cache else None
+    return EmbedderCacheado(base, cache)
@@ -0,0 +1,110 @@
+import json
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Iterator, List, Optional, Union
+
+from models import Cliente, DataSetInteracciones, Interaccion
+from services.construccion_grafo import Registro, clave_cliente, registros_de
+from services.tiempo import a_utc
+
+
+class Episodio:
+    """Episodio de Graphiti con el cliente y una parte de sus interacciones."""
+
+    def __init__(
+        self,
+        cliente_id: str,
+        parte: int,
+        cuerpo: str,
+        reference_time: datetime,
+        registros: List[Registro],
+    ):
+        self.cliente_id = cliente_id
+        self.parte = parte
+        self.cuerpo = cuerpo
+        self.reference_time = reference_time
+        self.registros = registros
+
+    @property
+    def nombre(self) -> str:
+        return f"Cliente {self.cliente_id} - parte {self.parte}"
+
+
+class _Pendiente:
+    def __init__(self):
+        self.cliente: Optional[Cliente] = None
+        self.cliente_json = "null"
+        self.interacciones: List[Interaccion] = []
+        self.partes: List[str] = []
+        self.caracteres = 0
+        self.emitidos = 0
+        self.cliente_enviado = False
+
+
+def agrupar_episodios(
+    data: Union[DataSetInteracciones, Iterable[Registro]],
+    max_interacciones: int = 50,
+    max_caracteres: int = 20_000,
+) -> Iterator[Episodio]:
+    """Reparte clientes e interacciones en episodios por cliente.
+
+    Cada episodio lleva el registro del cliente y hasta `max_interacciones` de
+    sus interacciones o `max_caracteres` de JSON, lo que llegue antes, así que
+    el prompt de extracción tiene un tamaño acotado aunque el archivo crezca.
+    Un episodio se entrega apenas se llena; los que quedan a medias, al final
+    de la lectura. Las partes de un mismo cliente salen en el orden de lectura.
+
+    El `reference_time` es el timestamp de la última interacción del episodio
+    (o `fecha_prestamo` si solo trae el cliente), no la hora de la carga.
+    """
+    if max_interacciones < 1:
+        raise ValueError("max_interacciones debe ser mayor que 0")
+
+    pendientes: Dict[str, _Pendiente] = {}
+    for registro in registros_de(data):
+        cliente_id = clave_cliente(registro)
+        pendiente = pendientes.get(cliente_id)
+        if pendiente is None:
+            pendiente = pendientes[cliente_id] = _Pendiente()
+        if isinstance(registro, Cliente):
+            pendiente.cliente = registro
+            pendiente.cliente_json = json.dumps(registro.model_dump(mode="json"))
+            continue
+        parte = json.dumps(registro.model_dump(mode="json", exclude_none=True))
+        if pendiente.partes and (
+            len(pendiente.partes) >= max_interacciones
+            or pendiente.caracteres + len(parte) > max_caracteres
+        ):
+            yield _emitir(cliente_id, pendiente)
+        pendiente.interacciones.append(registro)
+        pendiente.partes.append(parte)
+        pendiente.caracteres += len(parte)
+
+    for cliente_id, pendiente in pendientes.items():
+        if pendiente.partes or (pendiente.cliente is not None and not pendiente.cliente_enviado):
+            yield _emitir(cliente_id, pendiente)
+
+
+def _emitir(cliente_id: str, pendiente: _Pendiente) -> Episodio:
+    cuerpo = f'{{"cliente": {pendiente.cliente_json}, "interacciones": [{", ".join(pendiente.partes)}]}}'
+    fechas = [a_utc(i.timestamp) for i in pendiente.interacciones if i.timestamp is not None]
+    if fechas:
+        reference_time = max(fechas)
+    elif pendiente.cliente is not None and pendiente.cliente.fecha_prestamo is not None:
+        reference_time = a_utc(pendiente.cliente.fecha_prestamo)
+    else:
+        # Sin ninguna fecha en los registros
+        reference_time = datetime.now(timezone.utc)
+    # El cliente viaja en todas sus partes (da contexto a la extracción), pero
+    # los observadores lo reciben una sola vez
+    registros: List[Registro] = []
+    if pendiente.cliente is not None and not pendiente.cliente_enviado:
+        registros.append(pendiente.cliente)
+        pendiente.cliente_enviado = True
+    registros.extend(pendiente.interacciones)
+
+    pendiente.emitidos += 1
+    episodio = Episodio(cliente_id, pendiente.emitidos, cuerpo, reference_time, registros)
+    pendiente.interacciones = []
+    pendiente.partes = []
+    pendiente.caracteres = 0
+    return episodio
@@ -0,0 +1,468 @@
+import json
+import mmap
+import os
+import struct
+import uuid
+from array import array
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+
+from models import DataSetInteracciones
+from services.construccion_grafo import ETIQUETAS_COMPARTIDAS, ConstructorGrafo, Registro
+from services.tiempo import a_microsegundos, de_microsegundos
+
+MAGIA = b"GRAFOCSR"
+VERSION = 1
+# Magia, versión, posición y largo del encabezado JSON (que va al final)
+_PRELUDIO = struct.Struct("<8sIIQQ")
+ALINEACION = 64
+
+ETIQUETAS = ("CLIENTE", "DEUDA", "AGENTE", "INTERACCION", "PAGO", "PLAN_PAGO")
+TIPOS_ARISTA = ("POSEE", "TIENE", "REALIZA", "PAGA", "PROMETE", "RENUEVA_PLAN")
+
+SALIDA = "salida"
+ENTRADA = "entrada"
+AMBAS = "ambas"
+DIRECCIONES = (SALIDA, ENTRADA, AMBAS)
+
+# Tipos de columna de atributos y su representación en el archivo
+TEXTO = "texto"  # índice en la tabla de textos, -1 si es nulo
+ENTERO = "entero"
+REAL = "real"  # NaN si es nulo
+BOOLEANO = "booleano"  # -1 si es nulo
+FECHA = "fecha"  # microsegundos desde epoch (UTC)
+NULO_ENTERO = np.iinfo(np.int64).min
+# El constructor guarda estas fechas como texto ISO
+COLUMNAS_FECHA = {"timestamp", "fecha_prestamo", "fecha_inicio", "fecha_promesa"}
+
+
+def _tipo_columna(nombre: str, valores: List) -> str:
+    tipos = {type(v) for v in valores if v is not None}
+    if not tipos:
+        return TEXTO
+    if tipos <= {bool}:
+        return BOOLEANO
+    if tipos <= {int, bool}:
+        return ENTERO
+    if tipos <= {int, bool, float}:
+        return REAL
+    if all(issubclass(t, datetime) for t in tipos):
+        return FECHA
+    if tipos <= {str, datetime} and nombre in COLUMNAS_FECHA:
+        return FECHA
+    return TEXTO
+
+
+class _Textos:
+    """Tabla de textos sin repetir: se guardan como UTF-8 con sus offsets."""
+
+    def __init__(self):
+        self.indices: Dict[str, int] = {}
+        self.valores: List[str] = []
+
+    def indice(self, valor: Optional[str]) -> int:
+        if valor is None:
+            return -1
+        indice = self.indices.get(valor)
+        if indice is None:
+            indice = self.indices[valor] = len(self.valores)
+            self.valores.append(valor)
+        return indice
+
+    def arreglos(self) -> Tuple[np.ndarray, np.ndarray]:
+        codificados = [v.encode("utf-8") for v in self.valores]
+        offsets = np.zeros(len(codificados) + 1, dtype=np.int64)
+        np.cumsum([len(c) for c in codificados], out=offsets[1:])
+        return offsets, np.frombuffer(b"".join(codificados), dtype=np.uint8)
+
+
+class _Nodos:
+    """Nodos de una etiqueta en orden de llegada, con sus atributos por columna."""
+
+    def __init__(self):
+        self.filas: Dict[str, int] = {}
+        self.uuids: List[str] = []
+        self.nombres: List[Optional[str]] = []
+        self.columnas: Dict[str, List] = {}
+
+    def agregar(self, nodo) -> int:
+        fila = self.filas.get(nodo.uuid)
+        if fila is None:
+            fila = self.filas[nodo.uuid] = len(self.uuids)
+            self.uuids.append(nodo.uuid)
+            self.nombres.append(None)
+        # Como el MERGE de la carga, la última versión del nodo gana
+        self.nombres[fila] = nodo.name
+        for clave, valor in (nodo.attributes or {}).items():
+            columna = self.columnas.setdefault(clave, [])
+            if len(columna) <= fila:
+                columna.extend([None] * (fila + 1 - len(columna)))
+            columna[fila] = valor
+        return fila
+
+    def orden(self) -> Tuple[np.ndarray, np.ndarray]:
+        # Dentro de la etiqueta los nodos se ordenan por UUID (como dos
+        # uint64), así un UUID se busca con searchsorted
+        claves = np.frombuffer(
+            b"".join(uuid.UUID(u).bytes for u in self.uuids), dtype=">u8"
+        ).reshape(-1, 2).astype(np.uint64)
+        orden = np.lexsort((claves[:, 1], claves[:, 0]))
+        return orden, claves[orden]
+
+
+def _codificar_columna(tipo: str, valores: List, textos: _Textos) -> np.ndarray:
+    if tipo == TEXTO:
+        return np.array(
+            [textos.indice(None if v is None else str(v)) for v in valores], dtype=np.int32
+        )
+    if tipo == REAL:
+        return np.array([np.nan if v is None else v for v in valores], dtype=np.float64)
+    if tipo == BOOLEANO:
+        return np.array([-1 if v is None else int(v) for v in valores], dtype=np.int8)
+    if tipo == ENTERO:
+        return np.array([NULO_ENTERO if v is None else v for v in valores], dtype=np.int64)
+    return np.array(
+        [
+            NULO_ENTERO if v is None
+            else a_microsegundos(datetime.fromisoformat(v) if isinstance(v, str) else v)
+            for v in valores
+        ],
+        dtype=np.int64,
+    )
+
+
+def _decodificar(tipo: str, valor, grafo: "GrafoCSR"):
+    if tipo == TEXTO:
+        return grafo.texto(int(valor))
+    if tipo == REAL:
+        return None if np.isnan(valor) else float(valor)
+    if tipo == BOOLEANO:
+        return None if valor < 0 else bool(valor)
+    if valor == NULO_ENTERO:
+        return None
+    return int(valor) if tipo == ENTERO else de_microsegundos(valor)
+
+
+def exportar_csr(
+    data: Union[DataSetInteracciones, Iterable[Registro]],
+    ruta,
+    namespace: str = "carga_2.0",
+) -> dict:
+    """Escribe en `ruta` el grafo de la carga como snapshot CSR.
+
+    Los nodos y aristas son los que produce `ConstructorGrafo` para `data`
+    (los mismos que escribe `cargar_datos_bulk`). En el archivo:
+
+    - Los nodos tienen IDs enteros contiguos por etiqueta (en el orden de
+      `ETIQUETAS`) y, dentro de cada etiqueta, ordenados por UUID.
+    - Las aristas están en CSR de salida y de entrada: `indptr` por nodo, el
+      nodo vecino y el tipo de arista (índice en `TIPOS_ARISTA`), sin
+      aristas repetidas.
+    - Cada etiqueta tiene sus atributos en columnas tipadas (ver
+      `_tipo_columna`); los textos van a una tabla común sin repetir.
+
+    Las secciones están alineadas a 64 bytes para que `GrafoCSR` las mapee
+    sin copiarlas. El archivo se escribe aparte y se reemplaza al final: los
+    procesos que tengan abierto el anterior lo siguen viendo entero.
+    """
+    constructor = ConstructorGrafo(namespace)
+    nodos = {etiqueta: _Nodos() for etiqueta in ETIQUETAS}
+    codigo_etiqueta = {etiqueta: i for i, etiqueta in enumerate(ETIQUETAS)}
+    codigo_tipo = {tipo: i for i, tipo in enumerate(TIPOS_ARISTA)}
+    # Los nodos compartidos son el mismo objeto en todos sus tripletes
+    compartidos: Dict[str, Tuple[object, int]] = {}
+    # Extremos de cada arista como (etiqueta, fila) en orden de llegada
+    origen_etiqueta, origen_fila = array("B"), array("q")
+    destino_etiqueta, destino_fila = array("B"), array("q")
+    tipos = array("B")
+
+    def agregar(nodo) -> Tuple[int, int]:
+        etiqueta = nodo.labels[0]
+        conocido = compartidos.get(nodo.uuid)
+        if conocido is not None and conocido[0] is nodo:
+            return codigo_etiqueta[etiqueta], conocido[1]
+        fila = nodos[etiqueta].agregar(nodo)
+        if etiqueta in ETIQUETAS_COMPARTIDAS:
+            compartidos[nodo.uuid] = (nodo, fila)
+        return codigo_etiqueta[etiqueta], fila
+
+    for _, tripletes in constructor.construir(data):
+        for origen, arista, destino in tripletes:
+            etiqueta, fila = agregar(origen)
+            origen_etiqueta.append(etiqueta)
+            origen_fila.append(fila)
+            etiqueta, fila = agregar(destino)
+            destino_etiqueta.append(etiqueta)
+            destino_fila.append(fila)
+            tipos.append(codigo_tipo[arista.name])
+
+    textos = _Textos()
+    secciones: Dict[str, np.ndarray] = {}
+    rangos: List[Tuple[str, int, int]] = []
+    columnas: Dict[str, Dict[str, str]] = {}
+    # ID final de cada fila, por etiqueta
+    ids_fila: List[np.ndarray] = []
+    claves, nombres = [], []
+    inicio = 0
+    for etiqueta in ETIQUETAS:
+        grupo = nodos[etiqueta]
+        cantidad = len(grupo.uuids)
+        if cantidad:
+            orden, claves_etiqueta = grupo.orden()
+        else:
+            orden, claves_etiqueta = np.zeros(0, dtype=np.int64), np.zeros((0, 2), dtype=np.uint64)
+        ids = np.empty(cantidad, dtype=np.int64)
+        ids[orden] = inicio + np.arange(cantidad)
+        ids_fila.append(ids)
+        claves.append(claves_etiqueta)
+        nombres.append(np.array([textos.indice(grupo.nombres[i]) for i in orden], dtype=np.int32))
+        columnas[etiqueta] = {}
+        for nombre, valores in grupo.columnas.items():
+            valores = valores + [None] * (cantidad - len(valores))
+            tipo = _tipo_columna(nombre, valores)
+            columnas[etiqueta][nombre] = tipo
+            secciones[f"atributo/{etiqueta}/{nombre}"] = _codificar_columna(
+                tipo, [valores[i] for i in orden], textos
+            )
+        rangos.append((etiqueta, inicio, inicio + cantidad))
+        inicio += cantidad
+    num_nodos = inicio
+
+    def a_ids(etiquetas: array, filas: array) -> np.ndarray:
+        etiquetas = np.frombuffer(etiquetas, dtype=np.uint8)
+        filas = np.frombuffer(filas, dtype=np.int64)
+        ids = np.empty(len(filas), dtype=np.int64)
+        for codigo, ids_etiqueta in enumerate(ids_fila):
+            mascara = etiquetas == codigo
+            ids[mascara] = ids_etiqueta[filas[mascara]]
+        return ids
+
+    origen = a_ids(origen_etiqueta, origen_fila)
+    destino = a_ids(destino_etiqueta, destino_fila)
+    tipo = np.frombuffer(tipos, dtype=np.uint8)
+    orden = np.lexsort((tipo, destino, origen))
+    origen, destino, tipo = origen[orden], destino[orden], tipo[orden]
+    unicas = np.ones(len(origen), dtype=bool)
+    unicas[1:] = (np.diff(origen) != 0) | (np.diff(destino) != 0) | (np.diff(tipo) != 0)
+    origen, destino, tipo = origen[unicas], destino[unicas], tipo[unicas]
+
+    def indptr(extremos: np.ndarray) -> np.ndarray:
+        resultado = np.zeros(num_nodos + 1, dtype=np.int64)
+        np.cumsum(np.bincount(extremos, minlength=num_nodos), out=resultado[1:])
+        return resultado
+
+    entrada = np.lexsort((tipo, origen, destino))
+    secciones.update({
+        "uuid": np.concatenate(claves),
+        "nombre": np.concatenate(nombres),
+        "salida_indptr": indptr(origen),
+        "salida_vecino": destino.astype(np.int32),
+        "salida_tipo": tipo,
+        "entrada_indptr": indptr(destino),
+        "entrada_vecino": origen[entrada].astype(np.int32),
+        "entrada_tipo": tipo[entrada],
+    })
+    secciones["textos_offsets"], secciones["textos_bytes"] = textos.arreglos()
+
+    encabezado = {
+        "version": VERSION,
+        "namespace": namespace,
+        "etiquetas": rangos,
+        "tipos_arista": TIPOS_ARISTA,
+        "columnas": columnas,
+        "secciones": {},
+    }
+    temporal = f"{ruta}.{os.getpid()}.tmp"
+    with open(temporal, "wb") as f:
+        f.write(b"\0" * ALINEACION)
+        for nombre, arreglo in secciones.items():
+            posicion = f.tell()
+            arreglo = np.ascontiguousarray(arreglo)
+            f.write(arreglo.tobytes())
+            encabezado["secciones"][nombre] = [posicion, arreglo.dtype.str, list(arreglo.shape)]
+            f.write(b"\0" * (-f.tell() % ALINEACION))
+        posicion = f.tell()
+        contenido = json.dumps(encabezado, ensure_ascii=False).encode("utf-8")
+        f.write(contenido)
+        tamano = f.tell()
+        f.seek(0)
+        f.write(_PRELUDIO.pack(MAGIA, VERSION, 0, posicion, len(contenido)))
+    os.replace(temporal, ruta)
+    return {"nodos": num_nodos, "aristas": len(origen), "bytes": tamano}
+
+
+class GrafoCSR:
+    """Snapshot CSR de `exportar_csr` mapeado en memoria, de solo lectura.
+
+    Las secciones son arreglos NumPy sobre el `mmap` del archivo, sin copiar:
+    abrirlo cuesta lo que leer el encabezado, y varios procesos que abren el
+    mismo archivo comparten sus páginas en la cache del sistema operativo.
+    `vecinos` y `grado` son un slice de `indptr`; `vecindario` expande la
+    frontera de todos los nodos a la vez.
+    """
+
+    def __init__(self, ruta):
+        self.ruta = str(ruta)
+        with open(self.ruta, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magia, version, _, posicion, largo = _PRELUDIO.unpack_from(self._mmap, 0)
+        if magia != MAGIA:
+            raise ValueError(f"{self.ruta} no es un snapshot CSR")
+        if version != VERSION:
+            raise ValueError(f"Versión de snapshot no soportada: {version}")
+        encabezado = json.loads(self._mmap[posicion: posicion + largo].decode("utf-8"))
+        self.namespace = encabezado["namespace"]
+        self.tipos_arista = tuple(encabezado["tipos_arista"])
+        self.columnas: Dict[str, Dict[str, str]] = encabezado["columnas"]
+        self.rangos = {etiqueta: (inicio, fin) for etiqueta, inicio, fin in encabezado["etiquetas"]}
+        self._etiquetas = [etiqueta for etiqueta, _, _ in encabezado["etiquetas"]]
+        self._inicios = np.array([inicio for _, inicio, _ in encabezado["etiquetas"]], dtype=np.int64)
+
+        self._secciones: Dict[str, np.ndarray] = {}
+        for nombre, (offset, dtype, forma) in encabezado["secciones"].items():
+            cantidad = int(np.prod(forma))
+            if cantidad:
+                arreglo = np.frombuffer(self._mmap, dtype=dtype, count=cantidad, offset=offset)
+            else:
+                arreglo = np.zeros(0, dtype=dtype)
+            self._secciones[nombre] = arreglo.reshape(forma)
+        self._uuid = self._secciones["uuid"]
+        self._nombre = self._secciones["nombre"]
+        self._textos_offsets = self._secciones["textos_offsets"]
+        self._textos_bytes = self._secciones["textos_bytes"]
+        self._adyacencia = {
+            SALIDA: (self._secciones["salida_indptr"], self._secciones["salida_vecino"], self._secciones["salida_tipo"]),
+            ENTRADA: (self._secciones["entrada_indptr"], self._secciones["entrada_vecino"], self._secciones["entrada_tipo"]),
+        }
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cerrar()
+
+    def cerrar(self):
+        # El mmap solo se puede cerrar cuando nadie más usa sus arreglos
+        self._secciones = {}
+        self._uuid = self._nombre = self._textos_offsets = self._textos_bytes = None
+        self._adyacencia = {}
+        try:
+            self._mmap.close()
+        except BufferError:
+            pass
+
+    @property
+    def num_nodos(self) -> int:
+        return len(self._nombre)
+
+    @property
+    def num_aristas(self) -> int:
+        return len(self._adyacencia[SALIDA][1])
+
+    def etiqueta(self, nodo: int) -> str:
+        return self._etiquetas[int(np.searchsorted(self._inicios, nodo, side="right")) - 1]
+
+    def nodos(self, etiqueta: str) -> range:
+        return range(*self.rangos[etiqueta])
+
+    def texto(self, indice: int) -> Optional[str]:
+        if indice < 0:
+            return None
+        inicio, fin = self._textos_offsets[indice], self._textos_offsets[indice + 1]
+        return self._textos_bytes[inicio:fin].tobytes().decode("utf-8")
+
+    def uuid(self, nodo: int) -> str:
+        alto, bajo = self._uuid[nodo]
+        return str(uuid.UUID(int=(int(alto) << 64) | int(bajo)))
+
+    def nombre(self, nodo: int) -> Optional[str]:
+        return self.texto(int(self._nombre[nodo]))
+
+    def buscar_uuid(self, valor: str, etiqueta: Optional[str] = None) -> Optional[int]:
+        """ID del nodo con ese UUID, o None."""
+        entero = uuid.UUID(valor).int
+        alto, bajo = np.uint64(entero >> 64), np.uint64(entero & 0xFFFFFFFFFFFFFFFF)
+        for nombre in [etiqueta] if etiqueta else self._etiquetas:
+            inicio, fin = self.rangos[nombre]
+            altos = self._uuid[inicio:fin, 0]
+            posicion = int(np.searchsorted(altos, alto))
+            while posicion < len(altos) and altos[posicion] == alto:
+                if self._uuid[inicio + posicion, 1] == bajo:
+                    return inicio + posicion
+                posicion += 1
+        return None
+
+    def buscar(self, tipo: str, clave: str) -> Optional[int]:
+        """ID del nodo por su clave de negocio, p. ej. buscar("cliente", "cliente_001")."""
+        etiqueta = tipo.upper()
+        return self.buscar_uuid(
+            ConstructorGrafo(self.namespace).uuid_nodo(tipo, clave),
+            etiqueta if etiqueta in self.rangos else None,
+        )
+
+    def atributos(self, nodo: int) -> dict:
+        etiqueta = self.etiqueta(nodo)
+        fila = nodo - self.rangos[etiqueta][0]
+        return {
+            nombre: _decodificar(tipo, self._secciones[f"atributo/{etiqueta}/{nombre}"][fila], self)
+            for nombre, tipo in self.columnas[etiqueta].items()
+        }
+
+    def columna(self, etiqueta: str, nombre: str) -> np.ndarray:
+        """Columna de atributos cruda (ver tipos en `columnas`), para análisis vectorizado."""
+        return self._secciones[f"atributo/{etiqueta}/{nombre}"]
+
+    def _direcciones(self, direccion: str) -> List[str]:
+        if direccion not in DIRECCIONES:
+            raise ValueError(f"Dirección desconocida: {direccion} (usa {', '.join(DIRECCIONES)})")
+        return [SALIDA, ENTRADA] if direccion == AMBAS else [direccion]
+
+    def vecinos(self, nodo: int, direccion: str = SALIDA, tipo: Optional[str] = None) -> np.ndarray:
+        partes = []
+        for sentido in self._direcciones(direccion):
+            indptr, vecinos, tipos = self._adyacencia[sentido]
+            inicio, fin = indptr[nodo], indptr[nodo + 1]
+            if tipo is None:
+                partes.append(vecinos[inicio:fin])
+            else:
+                codigo = self.tipos_arista.index(tipo)
+                partes.append(vecinos[inicio:fin][tipos[inicio:fin] == codigo])
+        return partes[0] if len(partes) == 1 else np.concatenate(partes)
+
+    def grado(self, nodo: int, direccion: str = SALIDA) -> int:
+        return sum(
+            int(self._adyacencia[s][0][nodo + 1] - self._adyacencia[s][0][nodo])
+            for s in self._direcciones(direccion)
+        )
+
+    def grados(self, direccion: str = SALIDA) -> np.ndarray:
+        return sum(np.diff(self._adyacencia[s][0]) for s in self._direcciones(direccion))
+
+    def vecindario(self, nodos, saltos: int = 1, direccion: str = AMBAS) -> np.ndarray:
+        """Nodos a `saltos` o menos de `nodos` (sin incluirlos), ordenados.
+
+        Por ejemplo, los clientes que atendió un agente son su vecindario a 2
+        saltos (AGENTE → INTERACCION ← CLIENTE) filtrado por `nodos("CLIENTE")`.
+        """
+        sentidos = self._direcciones(direccion)
+        origen = np.unique(np.asarray(nodos, dtype=np.int64))
+        visitados, frontera = origen, origen
+        for _ in range(saltos):
+            partes = []
+            for sentido in sentidos:
+                indptr, vecinos, _ = self._adyacencia[sentido]
+                inicios, fines = indptr[frontera], indptr[frontera + 1]
+                largos = fines - inicios
+                total = int(largos.sum())
+                if total:
+                    posiciones = np.repeat(inicios - np.cumsum(largos) + largos, largos)
+                    partes.append(vecinos[posiciones + np.arange(total)])
+            if not partes:
+                break
+            frontera = np.setdiff1d(np.concatenate(partes), visitados)
+            if not len(frontera):
+                break
+            visitados = np.union1d(visitados, frontera)
+        return np.setdiff1d(visitados, origen, assume_unique=True)
@@ -0,0 +1,139 @@
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Union
+
+from models import Cliente, Interaccion
+from services.promesas import es_pago, es_promesa
+from services.tiempo import a_microsegundos
+
+Registro = Union[Cliente, Interaccion]
+
+POSTINGS = ("interacciones", "pagos", "promesas", "planes_pago")
+
+
+class _Posting:
+    """Lista de interacciones ordenada por timestamp con sus claves en paralelo."""
+
+    __slots__ = ("claves", "items")
+
+    def __init__(self):
+        self.claves: List[int] = []
+        self.items: List[Interaccion] = []
+
+    def insertar(self, clave: int, interaccion: Interaccion):
+        # Camino rápido: la ingesta suele llegar en orden de tiempo
+        if not self.claves or clave >= self.claves[-1]:
+            self.claves.append(clave)
+            self.items.append(interaccion)
+            return
+        posicion = bisect_right(self.claves, clave)
+        self.claves.insert(posicion, clave)
+        self.items.insert(posicion, interaccion)
+
+    def eliminar(self, clave: int, interaccion_id: str):
+        posicion = bisect_left(self.claves, clave)
+        while posicion < len(self.claves) and self.claves[posicion] == clave:
+            if self.items[posicion].id == interaccion_id:
+                del self.claves[posicion]
+                del self.items[posicion]
+                return
+            posicion += 1
+
+    def rango(self, desde: Optional[int], hasta: Optional[int]) -> List[Interaccion]:
+        inicio = 0 if desde is None else bisect_left(self.claves, desde)
+        fin = len(self.claves) if hasta is None else bisect_right(self.claves, hasta)
+        return self.items[inicio:fin]
+
+
+class _EntradaCliente:
+    __slots__ = ("cliente", "postings", "claves_por_id")
+
+    def __init__(self):
+        self.cliente: Optional[Cliente] = None
+        self.postings: Dict[str, _Posting] = {p: _Posting() for p in POSTINGS}
+        self.claves_por_id: Dict[str, int] = {}
+
+
+class IndiceClientes:
+    """Índice secundario por `cliente_id` para las consultas de detalle.
+
+    Cada cliente guarda sus interacciones ordenadas por timestamp, más listas
+    separadas para pagos recibidos, promesas y renegociaciones (`nuevo_plan_pago`).
+    Un rango de tiempo se resuelve con búsqueda binaria: O(log n + k). El
+    índice se actualiza con cada lote ingerido (`aplicar_lote`).
+    """
+
+    def __init__(self):
+        self.entradas: Dict[str, _EntradaCliente] = {}
+
+    def aplicar_lote(self, registros: Iterable[Registro]):
+        for registro in registros:
+            self.aplicar(registro)
+
+    def aplicar(self, registro: Registro):
+        if isinstance(registro, Cliente):
+            self._entrada(registro.id).cliente = registro
+            return
+
+        entrada = self._entrada(registro.cliente_id)
+        clave = a_microsegundos(registro.timestamp)
+
+        # Reingerir una interacción la reemplaza en lugar de duplicarla
+        anterior = entrada.claves_por_id.get(registro.id)
+        if anterior is not None:
+            for posting in entrada.postings.values():
+                posting.eliminar(anterior, registro.id)
+        entrada.claves_por_id[registro.id] = clave
+
+        for nombre in postings_de(registro):
+            entrada.postings[nombre].insertar(clave, registro)
+
+    def _entrada(self, cliente_id: str) -> _EntradaCliente:
+        entrada = self.entradas.get(cliente_id)
+        if entrada is None:
+            entrada = self.entradas[cliente_id] = _EntradaCliente()
+        return entrada
+
+    def cliente(self, cliente_id: str) -> Optional[Cliente]:
+        entrada = self.entradas.get(cliente_id)
+        return entrada.cliente if entrada else None
+
+    def rango(
+        self,
+        cliente_id: str,
+        posting: str = "interacciones",
+        desde: Optional[datetime] = None,
+        hasta: Optional[datetime] = None,
+    ) -> List[Interaccion]:
+        entrada = self.entradas.get(cliente_id)
+        if entrada is None:
+            return []
+        return entrada.postings[posting].rango(
+            None if desde is None else a_microsegundos(desde),
+            None if hasta is None else a_microsegundos(hasta),
+        )
+
+    def detalle(
+        self,
+        cliente_id: str,
+        desde: Optional[datetime] = None,
+        hasta: Optional[datetime] = None,
+    ) -> Optional[dict]:
+        cliente = self.cliente(cliente_id)
+        if cliente is None:
+            return None
+        return {
+            "cliente": cliente,
+            **{p: self.rango(cliente_id, p, desde, hasta) for p in POSTINGS},
+        }
+
+
+def postings_de(interaccion: Interaccion) -> List[str]:
+    postings = ["interacciones"]
+    if es_pago(interaccion):
+        postings.append("pagos")
+    if es_promesa(interaccion):
+        postings.append("promesas")
+    if interaccion.nuevo_plan_pago is not None:
+        postings.append("planes_pago")
+    return postings
@@ -0,0 +1,286 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import AsyncIterable, Deque, Dict, List, Optional, Tuple, Union
+
+from models import Cliente, Interaccion
+from services.metricas import INGESTA_COLA, REGISTROS
+from services.validacion import Rechazos, describir_error, validar_linea
+
+logger = logging.getLogger(__name__)
+
+Registro = Union[Cliente, Interaccion]
+
+# Errores de validación que se devuelven en la respuesta de /ingest
+MAX_ERRORES_RESPUESTA = 100
+
+
+class ColaLlena(Exception):
+    def __init__(self, aceptados: int, linea: int, rechazos: Rechazos):
+        super().__init__(f"Cola de ingesta llena en la línea {linea}")
+        self.aceptados = aceptados
+        self.linea = linea
+        self.rechazos = rechazos
+
+
+class IngestaContinua:
+    """Ingesta en línea: cola acotada en memoria y micro-lotes en segundo plano.
+
+    `recibir` valida un cuerpo NDJSON a medida que llega y encola los
+    registros válidos. Una tarea en segundo plano junta hasta `tamano_lote`
+    registros o los que lleguen en `espera` segundos desde el primero y los
+    escribe con `cargar_datos_bulk` del cliente recibido en `iniciar`, que
+    además notifica a los modelos de lectura, y después actualiza
+    `monto_actual` en las deudas de esos clientes. El constructor y los nodos
+    compartidos escritos se conservan entre micro-lotes, así una interacción
+    se enlaza a su cliente aunque éste haya llegado en otra petición (o en la
+    carga inicial, ver `aplicar_lote`).
+
+    Si la cola está llena, `recibir` espera hasta `espera_cola` segundos a que
+    se libere lugar y si no lanza `ColaLlena`: lo anterior a esa línea quedó
+    aceptado y el cliente debe reenviar desde ahí.
+
+    Los registros de un micro-lote que falla se guardan en `fallidos` (hasta
+    `capacidad`; los más viejos se descartan) y `reintentar` los vuelve a
+    encolar. Reescribirlos es seguro: la escritura es un upsert por UUID.
+    """
+
+    def __init__(
+        self,
+        capacidad: int = 10_000,
+        tamano_lote: int = 500,
+        espera: float = 1.0,
+        espera_cola: float = 0.5,
+        concurrencia: int = 4,
+    ):
+        if capacidad < 1 or tamano_lote < 1:
+            raise ValueError("capacidad y tamano_lote deben ser mayores que 0")
+        self.client = None
+        self.capacidad = capacidad
+        self.tamano_lote = tamano_lote
+        self.espera = espera
+        self.espera_cola = espera_cola
+        self.concurrencia = concurrencia
+        # Se crea en `iniciar`: construccion_grafo importa graphiti_core, que
+        # main_api carga recién en el lifespan de cada worker
+        self.constructor = None
+        self.compartidos_escritos: set = set()
+        self._clientes_previos: Dict[str, Cliente] = {}
+
+        # (registro, instante de llegada)
+        self._cola: Deque[Tuple[Registro, float]] = deque()
+        self._hay_registros = asyncio.Event()
+        self._hay_lugar = asyncio.Event()
+        self._hay_lugar.set()
+        self._en_vuelo_desde: Optional[float] = None
+        self._tarea: Optional[asyncio.Task] = None
+        self.estadisticas = {
+            "recibidos": 0,
+            "rechazados": 0,
+            "escritos": 0,
+            "fallidos": 0,
+            "lotes": 0,
+            "lotes_fallidos": 0,
+            "respuestas_429": 0,
+            "fallidos_descartados": 0,
+        }
+        self.ultimo_lote: Optional[dict] = None
+        # (registro, error) de los micro-lotes fallidos
+        self.fallidos: Deque[Tuple[Registro, str]] = deque()
+
+    def aplicar_lote(self, registros: List[Registro]):
+        """Registra clientes que ya están en el grafo (p. ej. los de la carga
+        inicial) para que sus interacciones nuevas se enlacen sin reescribirlos."""
+        for registro in registros:
+            if isinstance(registro, Cliente):
+                self._clientes_previos[registro.id] = registro
+
+    def _preparar(self, registros: List[Registro]):
+        # Los nodos de un cliente previo se construyen recién cuando llega una
+        # interacción suya, y se marcan como escritos
+        for registro in registros:
+            if isinstance(registro, Cliente):
+                self._clientes_previos.pop(registro.id, None)
+                continue
+            cliente = self._clientes_previos.pop(registro.cliente_id, None)
+            if cliente is not None:
+                for origen, _, destino in self.constructor.tripletes_cliente(cliente):
+                    self.compartidos_escritos.update((origen.uuid, destino.uuid))
+
+    def iniciar(self, client):
+        """Empieza a escribir a través de `client` (un `GraphittiSetting`)."""
+        from services.construccion_grafo import ConstructorGrafo
+
+        self.client = client
+        if self.constructor is None:
+            self.constructor = ConstructorGrafo()
+        self._tarea = asyncio.create_task(self._escribir_continuamente())
+
+    async def cerrar(self, timeout: float = 30.0):
+        """Escribe lo que queda en la cola (hasta `timeout` segundos) y se detiene."""
+        if self._tarea is None:
+            return
+        limite = time.monotonic() + timeout
+        while (self._cola or self._en_vuelo_desde is not None) and time.monotonic() < limite:
+            await asyncio.sleep(0.05)
+        self._tarea.cancel()
+        try:
+            await self._tarea
+        except asyncio.CancelledError:
+            pass
+        self._tarea = None
+
+    async def recibir(self, cuerpo: AsyncIterable[bytes]) -> dict:
+        """Valida y encola un cuerpo NDJSON; devuelve aceptados y rechazados."""
+        rechazos = Rechazos()
+        aceptados = 0
+        numero = 0
+        resto = b""
+        async for bloque in cuerpo:
+            lineas = (resto + bloque).split(b"\n")
+            resto = lineas.pop()
+            for linea in lineas:
+                numero += 1
+                aceptados += await self._aceptar(numero, linea, aceptados, rechazos)
+        if resto.strip():
+            numero += 1
+            aceptados += await self._aceptar(numero, resto, aceptados, rechazos)
+        return {
+            "aceptados": aceptados,
+            "rechazados": len(rechazos),
+            "errores": rechazos.registros[:MAX_ERRORES_RESPUESTA],
+        }
+
+    async def _aceptar(self, numero: int, linea: bytes, aceptados: int, rechazos: Rechazos) -> int:
+        if not linea.strip():
+            return 0
+        try:
+            registro = validar_linea(linea)
+        except ValueError as e:
+            entidad = "interaccion" if b'"cliente_id"' in linea else "cliente"
+            rechazos.registrar(str(numero), entidad, None, describir_error(e))
+            self.estadisticas["rechazados"] += 1
+            return 0
+        if registro is None:
+            return 0
+        # Varias peticiones pueden despertar con el mismo lugar libre: se
+        # vuelve a comprobar la capacidad hasta agotar `espera_cola`
+        limite = time.monotonic() + self.espera_cola
+        while len(self._cola) >= self.capacidad:
+            self._hay_lugar.clear()
+            try:
+                await asyncio.wait_for(
+                    self._hay_lugar.wait(), max(limite - time.monotonic(), 0)
+                )
+            except asyncio.TimeoutError:
+                self.estadisticas["respuestas_429"] += 1
+                raise ColaLlena(aceptados, numero, rechazos)
+        self._cola.append((registro, time.monotonic()))
+        self._hay_registros.set()
+        self.estadisticas["recibidos"] += 1
+        REGISTROS.inc(
+            etapa="recepcion",
+            entidad="cliente" if isinstance(registro, Cliente) else "interaccion",
+            estado="procesado",
+        )
+        INGESTA_COLA.set(len(self._cola))
+        return 1
+
+    async def _escribir_continuamente(self):
+        while True:
+            await self._hay_registros.wait()
+            # Se espera a completar el lote o a que pase `espera` desde el
+            # registro más antiguo de la cola
+            limite = self._cola[0][1] + self.espera
+            while len(self._cola) < self.tamano_lote and time.monotonic() < limite:
+                await asyncio.sleep(min(0.05, max(limite - time.monotonic(), 0)))
+
+            n = min(self.tamano_lote, len(self._cola))
+            lote = [self._cola.popleft() for _ in range(n)]
+            if not self._cola:
+                self._hay_registros.clear()
+            if len(self._cola) < self.capacidad:
+                self._hay_lugar.set()
+            INGESTA_COLA.set(len(self._cola))
+            await self._escribir(lote)
+
+    async def _escribir(self, lote: List[Tuple[Registro, float]]):
+        self._en_vuelo_desde = lote[0][1]
+        registros = [registro for registro, _ in lote]
+        self._preparar(registros)
+        inicio = time.monotonic()
+        try:
+            resultado = await self.client.cargar_datos_bulk(
+                registros,
+                tamano_lote=self.tamano_lote,
+                concurrencia=self.concurrencia,
+                constructor=self.constructor,
+                compartidos_escritos=self.compartidos_escritos,
+            )
+            fallidos = resultado["lotes_fallidos"]
+            error = f"{fallidos} lotes fallidos" if fallidos else None
+        except Exception as e:
+            error = str(e) or type(e).__name__
+        finally:
+            self._en_vuelo_desde = None
+        if error is None:
+            # La escritura de los nodos DEUDA deja monto_actual en la deuda
+            # inicial: se vuelve a poner el saldo de los clientes del lote
+            try:
+                await self.client.actualizar_monto_actual(tamano_lote=self.tamano_lote)
+            except Exception as e:
+                logger.error(f"No se pudo actualizar monto_actual: {str(e) or type(e).__name__}")
+
+        fin = time.monotonic()
+        fallido = error is not None
+        self.estadisticas["lotes"] += 1
+        if fallido:
+            logger.error(f"Micro-lote de {len(registros)} registros: {error}")
+            self.estadisticas["lotes_fallidos"] += 1
+            self.estadisticas["fallidos"] += len(registros)
+            for registro in registros:
+                if len(self.fallidos) >= self.capacidad:
+                    self.fallidos.popleft()
+                    self.estadisticas["fallidos_descartados"] += 1
+                self.fallidos.append((registro, error))
+        else:
+            self.estadisticas["escritos"] += len(registros)
+        self.ultimo_lote = {
+            "registros": len(registros),
+            "escritura_segundos": fin - inicio,
+            # De la llegada del registro más antiguo a quedar escrito
+            "latencia_max_segundos": fin - lote[0][1],
+            "fallido": fallido,
+            "error": error,
+        }
+
+    def reintentar(self) -> int:
+        """Vuelve a encolar los registros fallidos que quepan en la cola."""
+        ahora = time.monotonic()
+        reencolados = 0
+        while self.fallidos and len(self._cola) < self.capacidad:
+            registro, _ = self.fallidos.popleft()
+            self._cola.append((registro, ahora))
+            reencolados += 1
+        if reencolados:
+            self._hay_registros.set()
+            INGESTA_COLA.set(len(self._cola))
+        return reencolados
+
+    def estado(self) -> dict:
+        ahora = time.monotonic()
+        pendientes = [self._cola[0][1]] if self._cola else []
+        if self._en_vuelo_desde is not None:
+            pendientes.append(self._en_vuelo_desde)
+        return {
+            "profundidad": len(self._cola),
+            "capacidad": self.capacidad,
+            "en_vuelo": self._en_vuelo_desde is not None,
+            # Antigüedad del registro más viejo aún no escrito
+            "lag_segundos": ahora - min(pendientes) if pendientes else 0.0,
+            "activa": self._tarea is not None and not self._tarea.done(),
+            **self.estadisticas,
+            "pendientes_reintento": len(self.fallidos),
+            "ultimo_lote": self.ultimo_lote,
+        }
@@ -0,0 +1,67 @@
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+from models import Cliente, Interaccion
+from services.construccion_grafo import Registro, huella_cliente
+from services.metricas import REGISTROS
+from services.tiempo import a_utc
+
+# (timestamp, interaccion.id): el id desempata interacciones con el mismo instante
+Watermark = Tuple[datetime, str]
+
+
+def clave_watermark(interaccion: Interaccion) -> Watermark:
+    return a_utc(interaccion.timestamp), interaccion.id or ""
+
+
+class FiltroIncremental:
+    """Decide qué registros de una recarga hay que escribir.
+
+    - Interacciones: solo las posteriores al watermark del grupo. Las que llegan
+      tarde con un timestamp anterior al watermark no se vuelven a considerar.
+    - Clientes: solo los nuevos o cuya huella cambió respecto de la guardada en
+      el grafo. Los demás siguen pasando por el constructor para que sus
+      interacciones nuevas se enlacen al nodo existente.
+    """
+
+    def __init__(
+        self,
+        watermark: Optional[Watermark],
+        huellas: Dict[str, str],
+    ):
+        self.watermark = watermark
+        self.huellas = huellas
+        self.maximo: Optional[Watermark] = None
+        self.omitidos = 0
+
+    def filtrar(self, registros: Iterable[Registro]) -> Iterator[Registro]:
+        for registro in registros:
+            if self.admitir(registro):
+                yield registro
+
+    def admitir(self, registro: Registro) -> bool:
+        if isinstance(registro, Interaccion):
+            clave = clave_watermark(registro)
+            if self.watermark is not None and clave <= self.watermark:
+                self.omitidos += 1
+                REGISTROS.inc(etapa="incremental", entidad="interaccion", estado="omitido")
+                return False
+            if self.maximo is None or clave > self.maximo:
+                self.maximo = clave
+        return True
+
+    def debe_escribir(self, registro: Registro, uuid_cliente: str) -> bool:
+        if not isinstance(registro, Cliente):
+            return True
+        if self.huellas.get(uuid_cliente) == huella_cliente(registro):
+            self.omitidos += 1
+            REGISTROS.inc(etapa="incremental", entidad="cliente", estado="omitido")
+            return False
+        return True
+
+    def nuevo_watermark(self, hubo_fallos: bool = False) -> Optional[Watermark]:
+        # Si algo falló no se avanza: la próxima recarga vuelve a escribir el
+        # mismo delta, lo cual es seguro porque la escritura es un upsert
+        if hubo_fallos:
+            return self.watermark
+        return self.maximo or self.watermark
@@ -0,0 +1,203 @@
+import asyncio
+import multiprocessing
+import queue
+import traceback
+from typing import AsyncIterator, Iterable, List, Optional, Tuple
+
+from graphiti_core.edges import EntityEdge
+from graphiti_core.nodes import EntityNode
+
+from services.construccion_grafo import (
+    ETIQUETAS_COMPARTIDAS,
+    ConstructorGrafo,
+    Registro,
+    entidad_registro,
+)
+from services.data_proceso_lectura import iterar_registros
+from services.ingesta_incremental import FiltroIncremental, Watermark
+from services.metricas import REGISTROS
+from services.validacion import Rechazos
+
+# (registro, nodos nuevos, aristas); nodos y aristas son None si el registro
+# solo se observa (omitido por el watermark o sin tripletes)
+Elemento = Tuple[Registro, Optional[List[EntityNode]], Optional[List[EntityEdge]]]
+
+
+def construir_particion(
+    path: str,
+    indice: int,
+    total: int,
+    namespace: str,
+    watermark: Optional[Watermark],
+    con_rechazos: bool,
+    tamano_mensaje: int,
+    cola,
+):
+    """Proceso de una partición: lee, valida y construye los registros de sus
+    clientes y los envía a `cola` en mensajes de `tamano_mensaje` registros.
+
+    Los nodos compartidos (cliente, deuda, agente) se envían una sola vez por
+    partición; como sus UUID salen de las claves de negocio, el mismo agente
+    construido en dos particiones es el mismo nodo y el escritor lo deduplica.
+    """
+    try:
+        constructor = ConstructorGrafo(namespace=namespace)
+        filtro = FiltroIncremental(watermark, {}) if watermark is not None else None
+        rechazos = Rechazos() if con_rechazos else None
+        enviados: set = set()
+        mensaje: List[Elemento] = []
+        for registro in iterar_registros(path, rechazos, particion=(indice, total)):
+            mensaje.append(_construir(constructor, filtro, enviados, registro))
+            if len(mensaje) >= tamano_mensaje:
+                cola.put(("lote", mensaje))
+                mensaje = []
+        if mensaje:
+            cola.put(("lote", mensaje))
+        cola.put(("fin", indice, rechazos, filtro.omitidos if filtro else 0))
+    except BaseException:
+        cola.put(("error", indice, traceback.format_exc()))
+
+
+def _construir(
+    constructor: ConstructorGrafo,
+    filtro: Optional[FiltroIncremental],
+    enviados: set,
+    registro: Registro,
+) -> Tuple[Registro, Optional[List[dict]], Optional[List[dict]]]:
+    if filtro is not None and not filtro.admitir(registro):
+        return registro, None, None
+    construidos = list(constructor.construir((registro,)))
+    if not construidos or not construidos[0][1]:
+        return registro, None, None
+
+    nodos: dict = {}
+    aristas: List[EntityEdge] = []
+    for origen, arista, destino in construidos[0][1]:
+        for nodo in (origen, destino):
+            if nodo.uuid in enviados or nodo.uuid in nodos:
+                continue
+            nodos[nodo.uuid] = nodo
+            if set(nodo.labels) & ETIQUETAS_COMPARTIDAS:
+                enviados.add(nodo.uuid)
+        aristas.append(arista)
+    return registro, [n.__dict__ for n in nodos.values()], [a.__dict__ for a in aristas]
+
+
+def _restaurar(clase, estado: dict):
+    # Los nodos y aristas viajan como el __dict__ del modelo, ya validado en la
+    # partición: restaurarlo con __setstate__ cuesta la mitad que deserializar
+    # el modelo con pickle y evita validarlo otra vez
+    modelo = clase.__new__(clase)
+    modelo.__setstate__(
+        {
+            "__dict__": estado,
+            "__pydantic_fields_set__": set(estado),
+            "__pydantic_extra__": None,
+            "__pydantic_private__": None,
+        }
+    )
+    return modelo
+
+
+class ConstruccionParticionada:
+    """Lectura, validación y construcción repartidas en `particiones` procesos.
+
+    Los registros se asignan a una partición por el hash de su `cliente_id`
+    (ver `particion_cliente`), así que cada cliente y sus interacciones se
+    procesan en orden en el mismo proceso. `recorrer` entrega lo construido
+    por todas las particiones para que un único escritor asíncrono lo envíe a
+    Neo4j. Los `observadores` reciben cada lote de registros, igual que con
+    `observar_lotes` en la lectura de un solo proceso.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        particiones: int,
+        rechazos: Optional[Rechazos] = None,
+        observadores: Iterable = (),
+        tamano_mensaje: int = 500,
+    ):
+        if particiones < 1:
+            raise ValueError("particiones debe ser mayor que 0")
+        self.path = str(path)
+        self.particiones = particiones
+        self.rechazos = rechazos
+        self.observadores = list(observadores)
+        self.tamano_mensaje = tamano_mensaje
+        self.omitidos = 0
+
+    async def recorrer(
+        self, namespace: str, watermark: Optional[Watermark] = None
+    ) -> AsyncIterator[Elemento]:
+        contexto = multiprocessing.get_context("spawn")
+        # Cola acotada: si el escritor se atrasa, las particiones esperan
+        cola = contexto.Queue(maxsize=self.particiones * 4)
+        procesos = [
+            contexto.Process(
+                target=construir_particion,
+                args=(
+                    self.path,
+                    indice,
+                    self.particiones,
+                    namespace,
+                    watermark,
+                    self.rechazos is not None,
+                    self.tamano_mensaje,
+                    cola,
+                ),
+                daemon=True,
+            )
+            for indice in range(self.particiones)
+        ]
+        for proceso in procesos:
+            proceso.start()
+
+        loop = asyncio.get_running_loop()
+        pendientes = self.particiones
+        try:
+            while pendientes:
+                mensaje = await loop.run_in_executor(None, self._recibir, cola, procesos)
+                if mensaje[0] == "lote":
+                    elementos = mensaje[1]
+                    registros = [registro for registro, _, _ in elementos]
+                    for observador in self.observadores:
+                        observador.aplicar_lote(registros)
+                    for registro in registros:
+                        REGISTROS.inc(etapa="lectura", entidad=entidad_registro(registro), estado="procesado")
+                    for registro, nodos, aristas in elementos:
+                        if nodos is None:
+                            yield registro, None, None
+                            continue
+                        yield (
+                            registro,
+                            [_restaurar(EntityNode, estado) for estado in nodos],
+                            [_restaurar(EntityEdge, estado) for estado in aristas],
+                        )
+                elif mensaje[0] == "fin":
+                    _, _, rechazos, omitidos = mensaje
+                    if rechazos is not None:
+                        self.rechazos.extender(rechazos)
+                    self.omitidos += omitidos
+                    if omitidos:
+                        REGISTROS.inc(omitidos, etapa="incremental", entidad="interaccion", estado="omitido")
+                    pendientes -= 1
+                else:
+                    raise RuntimeError(f"Falló la partición {mensaje[1]}:\n{mensaje[2]}")
+        finally:
+            for proceso in procesos:
+                if proceso.is_alive():
+                    proceso.terminate()
+                proceso.join()
+
+    @staticmethod
+    def _recibir(cola, procesos):
+        # Espera con timeout para detectar una partición que murió sin avisar
+        # (p. ej. por falta de memoria)
+        while True:
+            try:
+                return cola.get(timeout=1.0)
+            except queue.Empty:
+                muertos = [p for p in procesos if p.exitcode not in (None, 0)]
+                if muertos:
+                    return ("error", procesos.index(muertos[0]), f"exitcode {muertos[0].exitcode}")
@@ -0,0 +1,113 @@
+import math
+from datetime import datetime
+from typing import Dict, Iterable, Optional, Union
+
+from models import Cliente, DataSetInteracciones, Interaccion
+from services.promesas import CUMPLIDA, MotorPromesas, emparejar_cliente, es_pago
+
+Registro = Union[Cliente, Interaccion]
+
+
+class MotorKPIs:
+    """KPIs globales materializados y mantenidos de forma incremental.
+
+    Se calculan una vez desde el dataset (o un iterable de registros) y luego
+    cada registro ingerido los actualiza: un cliente suma su deuda, un pago
+    suma lo recuperado y una promesa o pago re-evalúa solo las promesas de ese
+    cliente (ver `MotorPromesas`). `snapshot()` devuelve el estado ya
+    calculado en O(1).
+    """
+
+    def __init__(self):
+        self.deudas: Dict[str, float] = {}
+        self.promesas = MotorPromesas(seguir_cambios=False)
+
+        self.total_deudas = 0.0
+        self.total_pagado = 0.0
+
+    @classmethod
+    def desde_dataset(cls, data: DataSetInteracciones) -> "MotorKPIs":
+        return cls.desde_registros(
+            list(data.clientes or []) + list(data.interacciones or [])
+        )
+
+    @classmethod
+    def desde_registros(cls, registros: Iterable[Registro]) -> "MotorKPIs":
+        motor = cls()
+        motor.aplicar_lote(registros)
+        return motor
+
+    def aplicar_lote(self, registros: Iterable[Registro]):
+        pendientes = set()
+        for registro in registros:
+            if isinstance(registro, Cliente):
+                self._agregar_cliente(registro)
+            elif self._agregar_evento(registro):
+                pendientes.add(registro.cliente_id)
+        # Las promesas de cada cliente afectado se evalúan una sola vez por lote
+        for cliente_id in pendientes:
+            self.promesas.reevaluar(cliente_id)
+
+    def aplicar(self, registro: Registro):
+        self.aplicar_lote([registro])
+
+    def vencer(self, ahora: Optional[datetime] = None) -> int:
+        return self.promesas.vencer(ahora)
+
+    def _agregar_cliente(self, cliente: Cliente):
+        monto = cliente.monto_deuda_inicial or 0.0
+        self.total_deudas += monto - self.deudas.get(cliente.id, 0.0)
+        self.deudas[cliente.id] = monto
+
+    def _agregar_evento(self, interaccion: Interaccion) -> bool:
+        # Reingerir un pago lo reemplaza en vez de sumarlo dos veces
+        anterior = self.promesas.eventos.get(interaccion.cliente_id, {}).get(interaccion.id)
+        if not self.promesas.agregar(interaccion):
+            return False
+        if anterior is not None and es_pago(anterior):
+            self.total_pagado -= anterior.monto
+        if es_pago(interaccion):
+            self.total_pagado += interaccion.monto
+        return True
+
+    def snapshot(self) -> dict:
+        return {
+            "total_clientes": len(self.deudas),
+            "total_deudas": self.total_deudas,
+            "promesas_cumplidas": self.promesas.total_cumplidas,
+            "tasa_recuperacion": (
+                self.total_pagado / self.total_deudas if self.total_deudas else 0.0
+            ),
+        }
+
+    def recalcular(self) -> dict:
+        """Recalcula los KPIs desde cero con los eventos guardados."""
+        total_deudas = math.fsum(self.deudas.values())
+        eventos_por_cliente = self.promesas.eventos.values()
+        total_pagado = math.fsum(
+            e.monto for eventos in eventos_por_cliente for e in eventos.values() if es_pago(e)
+        )
+        return {
+            "total_clientes": len(self.deudas),
+            "total_deudas": total_deudas,
+            "promesas_cumplidas": sum(
+                1
+                for eventos in eventos_por_cliente
+                for r in emparejar_cliente(eventos.values())
+                if r.estado == CUMPLIDA
+            ),
+            "tasa_recuperacion": total_pagado / total_deudas if total_deudas else 0.0,
+        }
+
+    def verificar_consistencia(self, tolerancia: float = 1e-9) -> Dict[str, tuple]:
+        """Compara el estado materializado con un recálculo completo.
+
+        Devuelve las diferencias como {kpi: (materializado, recalculado)}; un
+        diccionario vacío significa que el estado es consistente.
+        """
+        actual, esperado = self.snapshot(), self.recalcular()
+        return {
+            kpi: (actual[kpi], esperado[kpi])
+            for kpi in esperado
+            if not math.isclose(actual[kpi], esperado[kpi], rel_tol=tolerancia)
+        }
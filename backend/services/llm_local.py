@@ -0,0 +1,76 @@
+import asyncio
+import types
+import typing
+from typing import Any, Optional
+
+from graphiti_core.llm_client.client import LLMClient
+from graphiti_core.llm_client.config import LLMConfig
+from pydantic import BaseModel
+
+# Ventana de contexto de gpt-4o-mini
+CONTEXTO_TOKENS = 128_000
+
+
+class ContextoExcedido(ValueError):
+    """El prompt no entra en la ventana de contexto del modelo."""
+
+
+class LLMLocal(LLMClient):
+    """LLM sin red para pruebas y benchmarks de la carga por episodios.
+
+    No extrae nada: responde el mínimo válido del `response_model` que pide
+    Graphiti (listas vacías, textos vacíos). Sí reproduce lo que limita a un
+    LLM real: rechaza los prompts que exceden `contexto` tokens (estimados en
+    4 caracteres por token) y tarda `latencia` segundos más el tiempo de
+    procesar los tokens a `tokens_por_segundo`.
+    """
+
+    def __init__(
+        self,
+        contexto: int = CONTEXTO_TOKENS,
+        latencia: float = 0.0,
+        tokens_por_segundo: Optional[float] = None,
+    ):
+        super().__init__(LLMConfig(model="local", small_model="local"))
+        self.contexto = contexto
+        self.latencia = latencia
+        self.tokens_por_segundo = tokens_por_segundo
+        self.llamadas = 0
+        self.tokens = 0
+
+    async def _generate_response(
+        self, messages, response_model=None, max_tokens=None, model_size=None
+    ) -> dict:
+        tokens = sum(len(mensaje.content) for mensaje in messages) // 4
+        if tokens > self.contexto:
+            raise ContextoExcedido(
+                f"El prompt tiene ~{tokens} tokens y el contexto es de {self.contexto}"
+            )
+        self.llamadas += 1
+        self.tokens += tokens
+        espera = self.latencia + (tokens / self.tokens_por_segundo if self.tokens_por_segundo else 0)
+        if espera:
+            await asyncio.sleep(espera)
+        return _minimo(response_model) if response_model is not None else {}
+
+
+def _minimo(tipo: Any) -> Any:
+    # Valor mínimo que valida contra `tipo`; de los modelos solo se llenan los
+    # campos obligatorios
+    origen = typing.get_origin(tipo)
+    if origen in (typing.Union, types.UnionType):
+        argumentos = typing.get_args(tipo)
+        return None if type(None) in argumentos else _minimo(argumentos[0])
+    if origen is list:
+        return []
+    if origen is dict:
+        return {}
+    if origen is typing.Literal:
+        return typing.get_args(tipo)[0]
+    if isinstance(tipo, type) and issubclass(tipo, BaseModel):
+        return {
+            nombre: _minimo(campo.annotation)
+            for nombre, campo in tipo.model_fields.items()
+            if campo.is_required()
+        }
+    return {str: "", int: 0, float: 0.0, bool: False}.get(tipo)
@@ -0,0 +1,277 @@
+import os
+import time
+from bisect import bisect_left
+from threading import Lock
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Latencias desde microsegundos (parse/validación de un registro) hasta
+# decenas de segundos (un lote contra Neo4j)
+BUCKETS_LATENCIA = (
+    0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005,
+    0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0,
+)
+
+
+class _Nulo:
+    """Context manager vacío que se devuelve cuando las métricas están apagadas."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULO = _Nulo()
+
+
+class _Metrica:
+    tipo = ""
+
+    def __init__(self, registro: "RegistroMetricas", nombre: str, ayuda: str, etiquetas: Sequence[str]):
+        self.registro = registro
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self.valores: Dict[tuple, object] = {}
+        self._lock = Lock()
+
+    def _clave(self, etiquetas: dict) -> tuple:
+        return tuple(str(etiquetas.get(e, "")) for e in self.etiquetas)
+
+    def _formatear_etiquetas(self, clave: tuple, extra: str = "") -> str:
+        partes = [f'{n}="{v}"' for n, v in zip(self.etiquetas, clave)]
+        if extra:
+            partes.append(extra)
+        return "{" + ",".join(partes) + "}" if partes else ""
+
+    def reiniciar(self):
+        with self._lock:
+            self.valores.clear()
+
+
+class Contador(_Metrica):
+    tipo = "counter"
+
+    def inc(self, valor: float = 1, **etiquetas):
+        if not self.registro.habilitado:
+            return
+        clave = self._clave(etiquetas)
+        with self._lock:
+            self.valores[clave] = self.valores.get(clave, 0) + valor
+
+    def exportar(self) -> List[str]:
+        return [f"{self.nombre}{self._formatear_etiquetas(c)} {v}" for c, v in self.valores.items()]
+
+
+class Medidor(_Metrica):
+    tipo = "gauge"
+
+    def inc(self, valor: float = 1, **etiquetas):
+        if not self.registro.habilitado:
+            return
+        clave = self._clave(etiquetas)
+        with self._lock:
+            self.valores[clave] = self.valores.get(clave, 0) + valor
+
+    def dec(self, valor: float = 1, **etiquetas):
+        self.inc(-valor, **etiquetas)
+
+    def set(self, valor: float, **etiquetas):
+        if not self.registro.habilitado:
+            return
+        with self._lock:
+            self.valores[self._clave(etiquetas)] = valor
+
+    def en_curso(self, **etiquetas):
+        """Suma 1 mientras dura el bloque `with`."""
+        if not self.registro.habilitado:
+            return _NULO
+        return _EnCurso(self, etiquetas)
+
+    def exportar(self) -> List[str]:
+        return [f"{self.nombre}{self._formatear_etiquetas(c)} {v}" for c, v in self.valores.items()]
+
+
+class _EnCurso:
+    __slots__ = ("medidor", "etiquetas")
+
+    def __init__(self, medidor: Medidor, etiquetas: dict):
+        self.medidor = medidor
+        self.etiquetas = etiquetas
+
+    def __enter__(self):
+        self.medidor.inc(**self.etiquetas)
+        return self
+
+    def __exit__(self, *exc):
+        self.medidor.dec(**self.etiquetas)
+        return False
+
+
+class Histograma(_Metrica):
+    tipo = "histogram"
+
+    def __init__(self, *args, buckets: Sequence[float] = BUCKETS_LATENCIA, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(buckets)
+
+    def observar(self, valor: float, **etiquetas):
+        if not self.registro.habilitado:
+            return
+        clave = self._clave(etiquetas)
+        with self._lock:
+            estado = self.valores.get(clave)
+            if estado is None:
+                # [conteo por bucket (+Inf al final), suma, total]
+                estado = self.valores[clave] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            estado[0][bisect_left(self.buckets, valor)] += 1
+            estado[1] += valor
+            estado[2] += 1
+
+    def medir(self, **etiquetas):
+        """Observa la duración del bloque `with` en segundos."""
+        if not self.registro.habilitado:
+            return _NULO
+        return _Cronometro(self, etiquetas)
+
+    def exportar(self) -> List[str]:
+        lineas = []
+        for clave, (conteos, suma, total) in self.valores.items():
+            acumulado = 0
+            for limite, conteo in zip((*self.buckets, "+Inf"), conteos):
+                acumulado += conteo
+                le = self._formatear_etiquetas(clave, f'le="{limite}"')
+                lineas.append(f"{self.nombre}_bucket{le} {acumulado}")
+            etiquetas = self._formatear_etiquetas(clave)
+            lineas.append(f"{self.nombre}_sum{etiquetas} {suma}")
+            lineas.append(f"{self.nombre}_count{etiquetas} {total}")
+        return lineas
+
+    def cuantil(self, q: float, **etiquetas) -> Optional[float]:
+        """Cuantil aproximado: el límite superior del bucket que lo contiene."""
+        estado = self.valores.get(self._clave(etiquetas))
+        if not estado or not estado[2]:
+            return None
+        objetivo, acumulado = q * estado[2], 0
+        for limite, conteo in zip((*self.buckets, float("inf")), estado[0]):
+            acumulado += conteo
+            if acumulado >= objetivo:
+                return limite
+        return float("inf")
+
+
+class _Cronometro:
+    __slots__ = ("histograma", "etiquetas", "inicio")
+
+    def __init__(self, histograma: Histograma, etiquetas: dict):
+        self.histograma = histograma
+        self.etiquetas = etiquetas
+
+    def __enter__(self):
+        self.inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histograma.observar(time.perf_counter() - self.inicio, **self.etiquetas)
+        return False
+
+
+class RegistroMetricas:
+    """Registro de métricas en proceso con exportación en formato Prometheus.
+
+    Con `habilitado=False` cada operación retorna antes de tocar nada y los
+    context managers (`medir`, `en_curso`) son un objeto vacío compartido.
+    """
+
+    def __init__(self, habilitado: bool = True):
+        self.habilitado = habilitado
+        self.metricas: Dict[str, _Metrica] = {}
+
+    def _registrar(self, clase, nombre: str, ayuda: str, etiquetas: Sequence[str], **kwargs):
+        if nombre not in self.metricas:
+            self.metricas[nombre] = clase(self, nombre, ayuda, etiquetas, **kwargs)
+        return self.metricas[nombre]
+
+    def contador(self, nombre: str, ayuda: str, etiquetas: Sequence[str] = ()) -> Contador:
+        return self._registrar(Contador, nombre, ayuda, etiquetas)
+
+    def medidor(self, nombre: str, ayuda: str, etiquetas: Sequence[str] = ()) -> Medidor:
+        return self._registrar(Medidor, nombre, ayuda, etiquetas)
+
+    def histograma(
+        self,
+        nombre: str,
+        ayuda: str,
+        etiquetas: Sequence[str] = (),
+        buckets: Sequence[float] = BUCKETS_LATENCIA,
+    ) -> Histograma:
+        return self._registrar(Histograma, nombre, ayuda, etiquetas, buckets=buckets)
+
+    def exportar(self) -> str:
+        lineas = []
+        for metrica in self.metricas.values():
+            lineas.append(f"# HELP {metrica.nombre} {metrica.ayuda}")
+            lineas.append(f"# TYPE {metrica.nombre} {metrica.tipo}")
+            lineas.extend(metrica.exportar())
+        return "\n".join(lineas) + "\n"
+
+    def reiniciar(self):
+        for metrica in self.metricas.values():
+            metrica.reiniciar()
+
+    def resumen(self) -> str:
+        """Resumen legible de las etapas y contadores (para el final de main.py)."""
+        lineas = []
+        for metrica in self.metricas.values():
+            if isinstance(metrica, Histograma):
+                for clave, (_, suma, total) in sorted(metrica.valores.items()):
+                    etiquetas = dict(zip(metrica.etiquetas, clave))
+                    p95 = metrica.cuantil(0.95, **etiquetas)
+                    lineas.append(
+                        f"  {metrica.nombre} {_describir(clave)}: {total} obs, "
+                        f"total {suma:.2f}s, media {suma / total * 1e3:.3f}ms, p95 ≤ {p95 * 1e3:g}ms"
+                    )
+            elif isinstance(metrica, Contador):
+                for clave, valor in sorted(metrica.valores.items()):
+                    lineas.append(f"  {metrica.nombre} {_describir(clave)}: {valor:g}")
+        return "\n".join(lineas)
+
+
+def _describir(clave: Tuple[str, ...]) -> str:
+    return "/".join(v for v in clave if v) or "-"
+
+
+metricas = RegistroMetricas(habilitado=os.environ.get("METRICAS", "1") != "0")
+
+# Métricas compartidas por la ingesta y la API
+ETAPA_SEGUNDOS = metricas.histograma(
+    "ingesta_etapa_segundos",
+    "Latencia por etapa de la ingesta (parse, validacion, construccion, escritura)",
+    ("etapa",),
+)
+REGISTROS = metricas.contador(
+    "ingesta_registros_total",
+    "Registros por etapa, tipo de entidad y estado (procesado, omitido, fallido)",
+    ("etapa", "entidad", "estado"),
+)
+ESCRITURAS_EN_CURSO = metricas.medidor(
+    "ingesta_escrituras_en_curso", "Escrituras hacia Neo4j en vuelo", ("tipo",)
+)
+INGESTA_COLA = metricas.medidor(
+    "ingesta_cola_registros", "Registros en la cola de la ingesta continua (POST /ingest)"
+)
+REINTENTOS = metricas.contador(
+    "ingesta_reintentos_total", "Reintentos por errores transitorios del driver"
+)
+HTTP_SEGUNDOS = metricas.histograma(
+    "http_peticion_segundos", "Latencia de las peticiones HTTP", ("ruta", "metodo", "estado")
+)
+EMBEDDINGS = metricas.contador(
+    "embeddings_textos_total",
+    "Textos pedidos al embedder por resultado de la cache (acierto, fallo)",
+    ("resultado",),
+)
+EMBEDDINGS_LLAMADAS = metricas.contador(
+    "embeddings_llamadas_total", "Llamadas al proveedor de embeddings"
+)
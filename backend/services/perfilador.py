@@ -0,0 +1,79 @@
+import sys
+import threading
+from collections import Counter
+from typing import List, Optional, Tuple
+
+
+class PerfiladorMuestreo:
+    """Perfilador por muestreo para corridas de ingesta individuales.
+
+    Un hilo toma la pila del hilo observado cada `intervalo` segundos y cuenta
+    las pilas repetidas; no instrumenta cada llamada como cProfile, así que el
+    costo es fijo y no depende de cuántas funciones se ejecuten. `escribir`
+    guarda las pilas en formato "collapsed" (una pila por línea con su
+    conteo), que entienden flamegraph.pl y speedscope.
+
+    El hilo de muestreo necesita el GIL para leer la pila; mientras perfila se
+    baja el intervalo de cambio del intérprete para que no solo despierte
+    cuando el hilo observado hace I/O (lo que sesgaría el perfil hacia las
+    llamadas que liberan el GIL). El código en C que no suelta el GIL (p. ej.
+    la validación de pydantic) se atribuye al siguiente frame de Python que
+    corre, así que conviene leer la pila completa y no solo la cima.
+    """
+
+    def __init__(self, intervalo: float = 0.005, hilo_id: Optional[int] = None):
+        self.intervalo = intervalo
+        self.hilo_id = hilo_id if hilo_id is not None else threading.main_thread().ident
+        self.muestras: Counter = Counter()
+        self._detener = threading.Event()
+        self._hilo: Optional[threading.Thread] = None
+        self._intervalo_cambio: Optional[float] = None
+
+    def __enter__(self) -> "PerfiladorMuestreo":
+        self.iniciar()
+        return self
+
+    def __exit__(self, *exc):
+        self.detener()
+        return False
+
+    def iniciar(self):
+        self._intervalo_cambio = sys.getswitchinterval()
+        sys.setswitchinterval(min(self._intervalo_cambio, self.intervalo / 5))
+        self._detener.clear()
+        self._hilo = threading.Thread(target=self._muestrear, name="perfilador", daemon=True)
+        self._hilo.start()
+
+    def detener(self):
+        self._detener.set()
+        if self._hilo is not None:
+            self._hilo.join()
+            self._hilo = None
+        if self._intervalo_cambio is not None:
+            sys.setswitchinterval(self._intervalo_cambio)
+            self._intervalo_cambio = None
+
+    def _muestrear(self):
+        while not self._detener.wait(self.intervalo):
+            frame = sys._current_frames().get(self.hilo_id)
+            pila = []
+            while frame is not None:
+                codigo = frame.f_code
+                pila.append(f"{codigo.co_name} ({codigo.co_filename}:{frame.f_lineno})")
+                frame = frame.f_back
+            if pila:
+                self.muestras[tuple(reversed(pila))] += 1
+
+    def escribir(self, ruta: str):
+        with open(ruta, "w", encoding="utf-8") as f:
+            for pila, conteo in self.muestras.most_common():
+                f.write(";".join(pila) + f" {conteo}\n")
+
+    def top(self, n: int = 15) -> List[Tuple[str, int]]:
+        """Funciones con más muestras propias (la cima de la pila)."""
+        propias: Counter = Counter()
+        for pila, conteo in self.muestras.items():
+            # Sin la línea: se agrupa por función
+            propias[pila[-1].rsplit(":", 1)[0] + ")"] += conteo
+        return propias.most_common(n)
+
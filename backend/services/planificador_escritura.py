@@ -0,0 +1,151 @@
+import asyncio
+import logging
+import random
+import zlib
+from typing import Any, Awaitable, Callable, List, Optional, Tuple, Type
+
+from neo4j.exceptions import ServiceUnavailable, SessionExpired, TransientError
+
+from services.metricas import REINTENTOS
+
+logger = logging.getLogger(__name__)
+
+# Errores del driver que vale la pena reintentar: el mismo write puede funcionar
+# unos segundos después (deadlocks, líder del cluster cambiando, conexión caída).
+ERRORES_TRANSITORIOS: Tuple[Type[BaseException], ...] = (
+    TransientError,
+    ServiceUnavailable,
+    SessionExpired,
+    ConnectionError,
+    asyncio.TimeoutError,
+)
+
+_FIN = object()
+
+
+class PlanificadorEscritura:
+    """Pool de escritores asíncronos con cola acotada y reintentos.
+
+    Cada trabajo se envía con una clave (p. ej. `cliente_id`) y se enruta siempre
+    al mismo escritor, de modo que los trabajos de una misma clave se aplican en
+    el orden en que fueron enviados mientras claves distintas avanzan en
+    paralelo. Las colas son acotadas: `enviar` se bloquea cuando el escritor
+    correspondiente va atrasado, lo que frena al productor (backpressure).
+    """
+
+    def __init__(
+        self,
+        escribir: Callable[[Any], Awaitable[None]],
+        concurrencia: int = 8,
+        tamano_cola: int = 1000,
+        max_reintentos: int = 5,
+        espera_base: float = 0.5,
+        espera_max: float = 30.0,
+        errores_transitorios: Tuple[Type[BaseException], ...] = ERRORES_TRANSITORIOS,
+        describir: Optional[Callable[[Any], str]] = None,
+    ):
+        if concurrencia < 1:
+            raise ValueError("concurrencia debe ser mayor que 0")
+        if tamano_cola < 1:
+            raise ValueError("tamano_cola debe ser mayor que 0")
+
+        self.escribir = escribir
+        self.concurrencia = concurrencia
+        self.tamano_cola = tamano_cola
+        self.max_reintentos = max_reintentos
+        self.espera_base = espera_base
+        self.espera_max = espera_max
+        self.errores_transitorios = errores_transitorios
+        self.describir = describir or str
+
+        self.escritos = 0
+        self.reintentos = 0
+        self.fallidos: List[Tuple[Any, BaseException]] = []
+
+        self._colas: List[asyncio.Queue] = []
+        self._trabajadores: List[asyncio.Task] = []
+
+    async def __aenter__(self) -> "PlanificadorEscritura":
+        self.iniciar()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            await self.cerrar()
+        else:
+            self.cancelar()
+
+    def iniciar(self):
+        # La capacidad total se reparte entre los escritores
+        por_cola = max(1, self.tamano_cola // self.concurrencia)
+        self._colas = [asyncio.Queue(maxsize=por_cola) for _ in range(self.concurrencia)]
+        self._trabajadores = [
+            asyncio.create_task(self._trabajar(cola)) for cola in self._colas
+        ]
+
+    async def enviar(self, clave: str, trabajo: Any):
+        if not self._colas:
+            raise RuntimeError("El planificador no está iniciado")
+        indice = zlib.crc32(str(clave).encode("utf-8")) % self.concurrencia
+        await self._colas[indice].put(trabajo)
+
+    async def cerrar(self) -> dict:
+        for cola in self._colas:
+            await cola.put(_FIN)
+        await asyncio.gather(*self._trabajadores)
+        self._colas, self._trabajadores = [], []
+        return self.resumen()
+
+    def cancelar(self):
+        for tarea in self._trabajadores:
+            tarea.cancel()
+        self._colas, self._trabajadores = [], []
+
+    def en_cola(self) -> int:
+        return sum(cola.qsize() for cola in self._colas)
+
+    def resumen(self) -> dict:
+        return {
+            "escritos": self.escritos,
+            "reintentos": self.reintentos,
+            "fallidos": len(self.fallidos),
+        }
+
+    async def _trabajar(self, cola: asyncio.Queue):
+        while True:
+            trabajo = await cola.get()
+            try:
+                if trabajo is _FIN:
+                    return
+                await self._escribir_con_reintentos(trabajo)
+            finally:
+                cola.task_done()
+
+    async def _escribir_con_reintentos(self, trabajo: Any):
+        intento = 0
+        while True:
+            try:
+                await self.escribir(trabajo)
+                self.escritos += 1
+                return
+            except self.errores_transitorios as e:
+                if intento >= self.max_reintentos:
+                    self._registrar_fallo(trabajo, e)
+                    return
+                espera = min(self.espera_max, self.espera_base * 2**intento)
+                espera *= random.uniform(0.5, 1.0)
+                intento += 1
+                self.reintentos += 1
+                REINTENTOS.inc()
+                logger.warning(
+                    f"{self.describir(trabajo)}: error transitorio ({e}), "
+                    f"reintento {intento}/{self.max_reintentos} en {espera:.2f}s"
+                )
+                await asyncio.sleep(espera)
+            except Exception as e:
+                self._registrar_fallo(trabajo, e)
+                return
+
+    def _registrar_fallo(self, trabajo: Any, error: BaseException):
+        self.fallidos.append((trabajo, error))
+        logger.error(f"{self.describir(trabajo)}: {error}")
@@ -0,0 +1,215 @@
+import heapq
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+from models import Cliente, Interaccion
+from services.tiempo import a_utc
+
+Registro = Union[Cliente, Interaccion]
+
+CUMPLIDA = "cumplida"
+INCUMPLIDA = "incumplida"
+ABIERTA = "abierta"
+
+
+def es_promesa(interaccion: Interaccion) -> bool:
+    return bool(interaccion.monto_prometido) and interaccion.fecha_promesa is not None
+
+
+def es_pago(interaccion: Interaccion) -> bool:
+    return interaccion.tipo == "pago_recibido" and interaccion.monto is not None
+
+
+def vencimiento(promesa: Interaccion) -> datetime:
+    # La promesa vence al terminar el día de `fecha_promesa`
+    return a_utc(promesa.fecha_promesa).replace(
+        hour=23, minute=59, second=59, microsecond=999999
+    )
+
+
+class ResultadoPromesa:
+    """Estado de una promesa tras imputarle los pagos posteriores del cliente."""
+
+    __slots__ = (
+        "promesa_id",
+        "cliente_id",
+        "estado",
+        "monto_prometido",
+        "monto_pagado",
+        "vencimiento",
+        "pagos",
+        "fecha_resolucion",
+    )
+
+    def __init__(self, promesa: Interaccion):
+        self.promesa_id = promesa.id
+        self.cliente_id = promesa.cliente_id
+        self.estado = ABIERTA
+        self.monto_prometido = promesa.monto_prometido
+        self.monto_pagado = 0.0
+        self.vencimiento = vencimiento(promesa)
+        self.pagos: List[str] = []
+        self.fecha_resolucion: Optional[datetime] = None
+
+    def clave(self) -> tuple:
+        return self.estado, self.monto_pagado, tuple(self.pagos)
+
+    def model_dump(self) -> dict:
+        return {campo: getattr(self, campo) for campo in self.__slots__}
+
+
+def emparejar_cliente(
+    eventos: Iterable[Interaccion], ahora: Optional[datetime] = None
+) -> List[ResultadoPromesa]:
+    """Resuelve las promesas de un cliente contra sus pagos en una pasada.
+
+    Los eventos (promesas y pagos) se recorren en orden de timestamp. Cada pago
+    se imputa a las promesas abiertas en orden de creación, antes de su
+    vencimiento: un pago parcial (`pago_completo=False`) descuenta su monto y
+    la promesa se cumple cuando lo pagado alcanza lo prometido; un pago con
+    `pago_completo=True` salda la promesa en curso aunque no la cubra. Lo que
+    sobra de un pago después de cumplir una promesa se imputa a las
+    siguientes. Las promesas vencidas sin cubrir quedan incumplidas; las que
+    aún no vencen a `ahora`, abiertas.
+    """
+    ahora = a_utc(ahora) if ahora else datetime.now(timezone.utc)
+    resultados: List[ResultadoPromesa] = []
+    abiertas: List[ResultadoPromesa] = []
+
+    def cerrar_vencidas(momento: datetime):
+        nonlocal abiertas
+        vigentes = []
+        for resultado in abiertas:
+            if resultado.vencimiento < momento:
+                resultado.estado = INCUMPLIDA
+                resultado.fecha_resolucion = resultado.vencimiento
+            else:
+                vigentes.append(resultado)
+        abiertas = vigentes
+
+    for evento in sorted(eventos, key=lambda i: (a_utc(i.timestamp), i.id or "")):
+        momento = a_utc(evento.timestamp)
+        if es_promesa(evento):
+            resultado = ResultadoPromesa(evento)
+            resultados.append(resultado)
+            abiertas.append(resultado)
+            continue
+        if not es_pago(evento):
+            continue
+
+        cerrar_vencidas(momento)
+        monto = evento.monto
+        # pago_completo salda solo la primera promesa abierta; el excedente
+        # sigue imputándose como un pago parcial
+        completo = bool(evento.pago_completo)
+        while abiertas and (monto > 0 or completo):
+            actual = abiertas[0]
+            imputado = min(monto, actual.monto_prometido - actual.monto_pagado)
+            actual.monto_pagado += imputado
+            actual.pagos.append(evento.id)
+            monto -= imputado
+            if completo or actual.monto_pagado >= actual.monto_prometido:
+                actual.estado = CUMPLIDA
+                actual.fecha_resolucion = momento
+                abiertas.pop(0)
+            completo = False
+
+    cerrar_vencidas(ahora)
+    return resultados
+
+
+def emparejar(
+    interacciones: Iterable[Interaccion], ahora: Optional[datetime] = None
+) -> List[ResultadoPromesa]:
+    """Emparejamiento por lotes: agrupa por cliente y resuelve cada grupo."""
+    por_cliente: Dict[str, List[Interaccion]] = defaultdict(list)
+    for interaccion in interacciones:
+        if es_promesa(interaccion) or es_pago(interaccion):
+            por_cliente[interaccion.cliente_id].append(interaccion)
+    return [
+        resultado
+        for eventos in por_cliente.values()
+        for resultado in emparejar_cliente(eventos, ahora)
+    ]
+
+
+class MotorPromesas:
+    """Emparejamiento promesa/pago mantenido de forma incremental.
+
+    Guarda solo promesas y pagos por cliente. Cada lote ingerido re-evalúa
+    únicamente a los clientes afectados, y `cambios()` entrega las promesas
+    cuyo estado cambió desde la última llamada, para escribir al grafo solo
+    esas aristas. Las promesas abiertas se indexan por vencimiento, así
+    `vencer(ahora)` re-evalúa solo a los clientes con promesas recién vencidas.
+    """
+
+    def __init__(self, seguir_cambios: bool = True):
+        # Con seguir_cambios=False (p. ej. dentro de los KPIs) no se acumulan
+        # cambios que nadie va a consumir; los vencimientos sí, para `vencer`
+        self.seguir_cambios = seguir_cambios
+        self.eventos: Dict[str, Dict[str, Interaccion]] = defaultdict(dict)
+        self.resultados: Dict[str, Dict[str, ResultadoPromesa]] = {}
+        self.cumplidas_por_cliente: Dict[str, int] = {}
+        self.total_cumplidas = 0
+        self._vencimientos: List[Tuple[datetime, str]] = []
+        self._cambiados: Dict[str, Tuple[Optional[ResultadoPromesa], ResultadoPromesa]] = {}
+
+    def aplicar_lote(self, registros: Iterable[Registro], ahora: Optional[datetime] = None):
+        pendientes = set()
+        for registro in registros:
+            if self.agregar(registro):
+                pendientes.add(registro.cliente_id)
+        for cliente_id in pendientes:
+            self.reevaluar(cliente_id, ahora)
+
+    def agregar(self, registro: Registro) -> bool:
+        """Guarda la promesa o pago sin re-evaluar; devuelve si era relevante."""
+        if isinstance(registro, Cliente):
+            return False
+        if not (es_promesa(registro) or es_pago(registro)):
+            return False
+        self.eventos[registro.cliente_id][registro.id] = registro
+        return True
+
+    def reevaluar(self, cliente_id: str, ahora: Optional[datetime] = None):
+        anteriores = self.resultados.get(cliente_id, {})
+        nuevos = {
+            r.promesa_id: r
+            for r in emparejar_cliente(self.eventos[cliente_id].values(), ahora)
+        }
+        for promesa_id, resultado in nuevos.items():
+            if resultado.estado == ABIERTA:
+                heapq.heappush(self._vencimientos, (resultado.vencimiento, cliente_id))
+            if not self.seguir_cambios:
+                continue
+            anterior = anteriores.get(promesa_id)
+            if anterior is None or anterior.clave() != resultado.clave():
+                previo = self._cambiados.get(promesa_id, (anterior, None))[0]
+                self._cambiados[promesa_id] = (previo, resultado)
+        self.resultados[cliente_id] = nuevos
+
+        cumplidas = sum(1 for r in nuevos.values() if r.estado == CUMPLIDA)
+        self.total_cumplidas += cumplidas - self.cumplidas_por_cliente.get(cliente_id, 0)
+        self.cumplidas_por_cliente[cliente_id] = cumplidas
+
+    def vencer(self, ahora: Optional[datetime] = None) -> int:
+        """Re-evalúa a los clientes con promesas abiertas ya vencidas a `ahora`;
+        devuelve cuántos clientes re-evaluó."""
+        ahora = a_utc(ahora) if ahora else datetime.now(timezone.utc)
+        clientes = set()
+        while self._vencimientos and self._vencimientos[0][0] < ahora:
+            clientes.add(heapq.heappop(self._vencimientos)[1])
+        for cliente_id in clientes:
+            self.reevaluar(cliente_id, ahora)
+        return len(clientes)
+
+    def cambios(self) -> List[Tuple[Optional[ResultadoPromesa], ResultadoPromesa]]:
+        """Devuelve y vacía los pares (estado anterior, estado nuevo) pendientes."""
+        cambios = list(self._cambiados.values())
+        self._cambiados.clear()
+        return cambios
+
+    def todos(self) -> Iterable[ResultadoPromesa]:
+        for resultados in self.resultados.values():
+            yield from resultados.values()
@@ -0,0 +1,397 @@
+import base64
+import json
+import heapq
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from itertools import islice
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union
+
+from models import Cliente, Interaccion
+from services.tiempo import a_microsegundos
+
+Registro = Union[Cliente, Interaccion]
+Clave = Tuple[int, str]
+
+ETIQUETAS = ("CLIENTE", "AGENTE", "INTERACCION", "PAGO", "PLAN_PAGO")
+GRUPOS = {etiqueta: i for i, etiqueta in enumerate(ETIQUETAS, start=1)}
+
+LIMITE_MAXIMO = 10_000
+
+
+def codificar_cursor(*partes) -> str:
+    # JSON y no un separador: los ids pueden contener cualquier carácter
+    texto = json.dumps(partes, ensure_ascii=False, separators=(",", ":"))
+    return base64.urlsafe_b64encode(texto.encode("utf-8")).decode("ascii")
+
+
+def decodificar_cursor(cursor: str, partes: int) -> list:
+    try:
+        valores = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8"))
+    except Exception:
+        raise ValueError("Cursor inválido")
+    if (
+        not isinstance(valores, list)
+        or len(valores) != partes
+        or not all(isinstance(v, (str, int)) for v in valores)
+    ):
+        raise ValueError("Cursor inválido")
+    return valores
+
+
+class _Serie:
+    """Claves (timestamp µs, id) ordenadas con sus interacciones en paralelo."""
+
+    __slots__ = ("claves", "items")
+
+    def __init__(self):
+        self.claves: List[Clave] = []
+        self.items: List[Interaccion] = []
+
+    def insertar(self, clave: Clave, interaccion: Interaccion):
+        if not self.claves or clave > self.claves[-1]:
+            self.claves.append(clave)
+            self.items.append(interaccion)
+            return
+        posicion = bisect_left(self.claves, clave)
+        if posicion < len(self.claves) and self.claves[posicion] == clave:
+            self.items[posicion] = interaccion
+            return
+        self.claves.insert(posicion, clave)
+        self.items.insert(posicion, interaccion)
+
+    def eliminar(self, clave: Clave):
+        posicion = bisect_left(self.claves, clave)
+        if posicion < len(self.claves) and self.claves[posicion] == clave:
+            del self.claves[posicion]
+            del self.items[posicion]
+
+    def desde(
+        self, inicio: Optional[Clave], hasta: Optional[int]
+    ) -> Iterator[Tuple[Clave, Interaccion]]:
+        """Recorre en orden desde `inicio` (exclusivo) hasta `hasta` µs (inclusive)."""
+        i = 0 if inicio is None else bisect_right(self.claves, inicio)
+        fin = len(self.claves) if hasta is None else bisect_right(self.claves, (hasta, "\U0010ffff"))
+        for j in range(i, fin):
+            yield self.claves[j], self.items[j]
+
+
+class _Agregado:
+    __slots__ = ("interacciones", "monto", "monto_prometido", "por_tipo")
+
+    def __init__(self):
+        self.interacciones = 0
+        self.monto = 0.0
+        self.monto_prometido = 0.0
+        self.por_tipo: Dict[str, int] = defaultdict(int)
+
+    def sumar(self, interaccion: Interaccion, signo: int = 1):
+        self.interacciones += signo
+        self.monto += signo * (interaccion.monto or 0.0)
+        self.monto_prometido += signo * (interaccion.monto_prometido or 0.0)
+        self.por_tipo[interaccion.tipo] += signo
+
+
+class ProyeccionGrafo:
+    """Proyección en memoria del grafo para la vista `/grafo`.
+
+    Las interacciones se guardan ordenadas por (timestamp, id), una serie
+    global y una por `tipo`, así un filtro por tipo y ventana de tiempo es una
+    búsqueda binaria más un merge de las series elegidas, y la paginación usa
+    la última clave entregada como cursor (estable aunque entren datos).
+
+    Hay dos niveles de detalle:
+    - `proyectar`: nodos CLIENTE/AGENTE/INTERACCION/PAGO/PLAN_PAGO con las
+      mismas relaciones que escribe `ConstructorGrafo`, por páginas de
+      interacciones.
+    - `agregar`: cada par cliente–agente colapsado en una arista con conteos
+      y montos. El agregado sin ventana de tiempo se mantiene incrementalmente.
+    """
+
+    def __init__(self):
+        self.clientes: Dict[str, Cliente] = {}
+        self.todas = _Serie()
+        self.por_tipo: Dict[str, _Serie] = defaultdict(_Serie)
+        self.claves_por_id: Dict[str, Clave] = {}
+        self.agregados: Dict[Tuple[str, str], _Agregado] = defaultdict(_Agregado)
+        # Pares cliente–agente ordenados; se rehace solo cuando aparece un par nuevo
+        self._pares: Optional[List[Tuple[str, str]]] = None
+
+    def aplicar_lote(self, registros: Iterable[Registro]):
+        for registro in registros:
+            self.aplicar(registro)
+
+    def aplicar(self, registro: Registro):
+        if isinstance(registro, Cliente):
+            self.clientes[registro.id] = registro
+            return
+
+        # Reingerir una interacción la reemplaza en lugar de duplicarla
+        anterior = self.claves_por_id.get(registro.id)
+        if anterior is not None:
+            posicion = bisect_left(self.todas.claves, anterior)
+            previa = self.todas.items[posicion]
+            self.todas.eliminar(anterior)
+            self.por_tipo[previa.tipo].eliminar(anterior)
+            if previa.agente_id:
+                self.agregados[(previa.cliente_id, previa.agente_id)].sumar(previa, -1)
+
+        clave = (a_microsegundos(registro.timestamp), registro.id or "")
+        self.claves_por_id[registro.id] = clave
+        self.todas.insertar(clave, registro)
+        self.por_tipo[registro.tipo].insertar(clave, registro)
+        if registro.agente_id:
+            par = (registro.cliente_id, registro.agente_id)
+            if par not in self.agregados:
+                self._pares = None
+            self.agregados[par].sumar(registro)
+
+    def _recorrer(
+        self,
+        tipos: Optional[List[str]],
+        desde: Optional[datetime],
+        hasta: Optional[datetime],
+        inicio: Optional[Clave],
+    ) -> Iterator[Tuple[Clave, Interaccion]]:
+        hasta_us = None if hasta is None else a_microsegundos(hasta)
+        if desde is not None:
+            # Arrancar justo antes de cualquier clave del instante `desde`
+            piso = (a_microsegundos(desde) - 1, "\U0010ffff")
+            if inicio is None or piso > inicio:
+                inicio = piso
+        if not tipos:
+            return self.todas.desde(inicio, hasta_us)
+        series = [self.por_tipo[t].desde(inicio, hasta_us) for t in tipos if t in self.por_tipo]
+        return heapq.merge(*series, key=lambda par: par[0])
+
+    def proyectar(
+        self,
+        tipos: Optional[List[str]] = None,
+        etiquetas: Optional[Iterable[str]] = None,
+        desde: Optional[datetime] = None,
+        hasta: Optional[datetime] = None,
+        cursor: Optional[str] = None,
+        limite: int = 1000,
+    ) -> Tuple[Iterator[Tuple[str, dict]], dict]:
+        """Página de `limite` interacciones proyectadas como nodos y aristas.
+
+        Devuelve un generador de elementos `("nodes" | "edges", dict)` y un
+        diccionario con `siguiente` (el cursor de la página siguiente o None).
+        Los nodos compartidos (clientes, agentes) se emiten una vez por página.
+
+        Las interacciones de la página se toman al llamar, no al consumir el
+        generador: éste puede recorrerse en otro hilo (StreamingResponse)
+        mientras la ingesta modifica las series.
+        """
+        limite = max(1, min(limite, LIMITE_MAXIMO))
+        inicio = None
+        if cursor:
+            microsegundos, interaccion_id = decodificar_cursor(cursor, 2)
+            inicio = (int(microsegundos), interaccion_id)
+        etiquetas = set(etiquetas) if etiquetas else set(ETIQUETAS)
+        tomadas = list(islice(self._recorrer(tipos, desde, hasta, inicio), limite + 1))
+        pagina = {"siguiente": None}
+        if len(tomadas) > limite:
+            pagina["siguiente"] = codificar_cursor(*tomadas[limite - 1][0])
+            del tomadas[limite:]
+
+        def elementos():
+            emitidos: Set[str] = set()
+            for _, interaccion in tomadas:
+                yield from self._elementos_interaccion(interaccion, etiquetas, emitidos)
+
+        return elementos(), pagina
+
+    def _elementos_interaccion(
+        self, interaccion: Interaccion, etiquetas: Set[str], emitidos: Set[str]
+    ) -> Iterator[Tuple[str, dict]]:
+        incluidos: Dict[str, str] = {}
+
+        def nodo(etiqueta: str, nodo_id: str, name: str, **propiedades):
+            if etiqueta not in etiquetas:
+                return
+            incluidos[etiqueta] = nodo_id
+            if nodo_id in emitidos:
+                return
+            emitidos.add(nodo_id)
+            return (
+                "nodes",
+                {
+                    "id": nodo_id,
+                    "name": name,
+                    "tipo": etiqueta.lower(),
+                    "label": etiqueta,
+                    "group": GRUPOS[etiqueta],
+                    **propiedades,
+                },
+            )
+
+        def arista(nombre: str, origen: str, destino: str):
+            if origen in incluidos and destino in incluidos:
+                return (
+                    "edges",
+                    {
+                        "source": incluidos[origen],
+                        "target": incluidos[destino],
+                        "tipo": nombre,
+                        "interaccion_id": interaccion.id,
+                    },
+                )
+
+        cliente = self.clientes.get(interaccion.cliente_id)
+        pendientes = [
+            nodo(
+                "CLIENTE",
+                interaccion.cliente_id,
+                cliente.nombre if cliente and cliente.nombre else interaccion.cliente_id,
+            ),
+            nodo(
+                "INTERACCION",
+                f"Interaccion_{interaccion.id}",
+                interaccion.tipo,
+                timestamp=interaccion.timestamp.isoformat(),
+                tipo_interaccion=interaccion.tipo,
+                resultado=interaccion.resultado,
+                sentimiento=interaccion.sentimiento,
+            ),
+            arista("TIENE", "CLIENTE", "INTERACCION"),
+        ]
+        if interaccion.agente_id:
+            pendientes += [
+                nodo("AGENTE", interaccion.agente_id, interaccion.agente_id),
+                arista("REALIZA", "AGENTE", "INTERACCION"),
+            ]
+        if interaccion.tipo == "pago_recibido" or interaccion.monto_prometido:
+            pendientes += [
+                nodo(
+                    "PAGO",
+                    f"Pago_{interaccion.id}",
+                    f"Pago_{interaccion.id}",
+                    monto=interaccion.monto or interaccion.monto_prometido,
+                ),
+                arista(
+                    "PROMETE" if interaccion.monto_prometido else "PAGA",
+                    "INTERACCION",
+                    "PAGO",
+                ),
+                arista("PAGA", "CLIENTE", "PAGO"),
+            ]
+        if interaccion.nuevo_plan_pago:
+            plan = interaccion.nuevo_plan_pago
+            pendientes += [
+                nodo(
+                    "PLAN_PAGO",
+                    f"PlanPago_{interaccion.id}",
+                    f"PlanPago_{interaccion.id}",
+                    cuotas=plan.cuotas,
+                    monto_mensual=plan.monto_mensual,
+                ),
+                arista("RENUEVA_PLAN", "INTERACCION", "PLAN_PAGO"),
+            ]
+        for elemento in pendientes:
+            if elemento is not None:
+                yield elemento
+
+    def agregar(
+        self,
+        tipos: Optional[List[str]] = None,
+        desde: Optional[datetime] = None,
+        hasta: Optional[datetime] = None,
+        cursor: Optional[str] = None,
+        limite: int = 1000,
+    ) -> Tuple[Iterator[Tuple[str, dict]], dict]:
+        """Nivel de detalle agregado: una arista ponderada por par cliente–agente.
+
+        Misma forma de respuesta que `proyectar`; la página se ordena por
+        (cliente, agente) y el cursor es el último par entregado.
+        """
+        limite = max(1, min(limite, LIMITE_MAXIMO))
+        if not tipos and desde is None and hasta is None:
+            agregados = self.agregados
+            if self._pares is None:
+                self._pares = sorted(self.agregados)
+            ordenados = self._pares
+        else:
+            agregados = defaultdict(_Agregado)
+            for _, interaccion in self._recorrer(tipos, desde, hasta, None):
+                if interaccion.agente_id:
+                    agregados[(interaccion.cliente_id, interaccion.agente_id)].sumar(interaccion)
+            ordenados = sorted(agregados)
+
+        posicion = 0
+        if cursor:
+            posicion = bisect_right(ordenados, tuple(map(str, decodificar_cursor(cursor, 2))))
+        pares: List[Tuple[str, str]] = []
+        siguiente = None
+        for par in islice(ordenados, posicion, None):
+            if agregados[par].interacciones <= 0:
+                continue
+            if len(pares) == limite:
+                siguiente = codificar_cursor(*pares[-1])
+                break
+            pares.append(par)
+        pagina = {"siguiente": siguiente}
+        # Copia de los agregados de la página, por lo mismo que en `proyectar`
+        filas = []
+        for par in pares:
+            agregado = agregados[par]
+            filas.append(
+                (
+                    par,
+                    agregado.interacciones,
+                    agregado.monto,
+                    agregado.monto_prometido,
+                    {t: n for t, n in agregado.por_tipo.items() if n},
+                )
+            )
+
+        def elementos():
+            emitidos: Set[str] = set()
+            for (cliente_id, agente_id), interacciones, monto, monto_prometido, por_tipo in filas:
+                for etiqueta, nodo_id in (("CLIENTE", cliente_id), ("AGENTE", agente_id)):
+                    if nodo_id in emitidos:
+                        continue
+                    emitidos.add(nodo_id)
+                    cliente = self.clientes.get(nodo_id) if etiqueta == "CLIENTE" else None
+                    yield "nodes", {
+                        "id": nodo_id,
+                        "name": cliente.nombre if cliente and cliente.nombre else nodo_id,
+                        "tipo": etiqueta.lower(),
+                        "label": etiqueta,
+                        "group": GRUPOS[etiqueta],
+                    }
+                yield "edges", {
+                    "source": cliente_id,
+                    "target": agente_id,
+                    "tipo": "INTERACTUA_CON",
+                    "interacciones": interacciones,
+                    "monto": monto,
+                    "monto_prometido": monto_prometido,
+                    "por_tipo": por_tipo,
+                }
+
+        return elementos(), pagina
+
+
+def a_json(elementos: Iterator[Tuple[str, dict]], pagina: dict, bloque: int = 500) -> Iterator[str]:
+    """Serializa una página como `{"nodes": [...], "edges": [...], "siguiente": ...}`
+    en fragmentos: los nodos salen a medida que se generan y las aristas se
+    guardan ya codificadas hasta cerrar la lista de nodos."""
+    yield '{"nodes":['
+    fragmento: List[str] = []
+    aristas: List[str] = []
+    primero = True
+    for tipo, elemento in elementos:
+        if tipo == "edges":
+            aristas.append(json.dumps(elemento))
+            continue
+        fragmento.append(json.dumps(elemento))
+        if len(fragmento) >= bloque:
+            yield ("" if primero else ",") + ",".join(fragmento)
+            primero, fragmento = False, []
+    if fragmento:
+        yield ("" if primero else ",") + ",".join(fragmento)
+    yield '],"edges":['
+    for i in range(0, len(aristas), bloque):
+        yield ("," if i else "") + ",".join(aristas[i : i + bloque])
+    yield '],"siguiente":' + json.dumps(pagina["siguiente"]) + "}"
@@ -0,0 +1,223 @@
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+
+from models import Cliente, Interaccion
+from services.promesas import es_pago, es_promesa
+from services.tiempo import a_microsegundos, a_utc
+
+Registro = Union[Cliente, Interaccion]
+
+
+class _SerieCliente:
+    """Pagos de un cliente ordenados por timestamp con su suma acumulada."""
+
+    __slots__ = ("monto_inicial", "claves", "ids", "montos", "acumulado", "pagos", "planes")
+
+    def __init__(self):
+        self.monto_inicial = 0.0
+        self.claves: List[int] = []
+        # id de cada pago, en paralelo a `claves` (puede haber claves repetidas)
+        self.ids: List[str] = []
+        self.montos: List[float] = []
+        self.acumulado: List[float] = []
+        # id de pago -> clave, para reemplazar un pago reingerido
+        self.pagos: Dict[str, int] = {}
+        # Renegociaciones (puntos de cambio del plan vigente)
+        self.planes: List[Tuple[int, Interaccion]] = []
+
+    def agregar_pago(self, pago_id: str, clave: int, monto: float):
+        if pago_id in self.pagos:
+            self._quitar_pago(pago_id)
+        self.pagos[pago_id] = clave
+
+        # Camino rápido: la ingesta suele llegar en orden de tiempo
+        if not self.claves or clave >= self.claves[-1]:
+            previo = self.acumulado[-1] if self.acumulado else 0.0
+            self.claves.append(clave)
+            self.ids.append(pago_id)
+            self.montos.append(monto)
+            self.acumulado.append(previo + monto)
+            return
+        posicion = bisect_right(self.claves, clave)
+        self.claves.insert(posicion, clave)
+        self.ids.insert(posicion, pago_id)
+        self.montos.insert(posicion, monto)
+        self.acumulado.insert(posicion, 0.0)
+        self._reacumular(posicion)
+
+    def _quitar_pago(self, pago_id: str):
+        clave = self.pagos.pop(pago_id)
+        # Entre los pagos con el mismo timestamp se quita el de ese id
+        posicion = bisect_left(self.claves, clave)
+        while self.ids[posicion] != pago_id:
+            posicion += 1
+        del self.claves[posicion]
+        del self.ids[posicion]
+        del self.montos[posicion]
+        del self.acumulado[posicion]
+        self._reacumular(posicion)
+
+    def _reacumular(self, desde: int):
+        total = self.acumulado[desde - 1] if desde else 0.0
+        for i in range(desde, len(self.montos)):
+            total += self.montos[i]
+            self.acumulado[i] = total
+
+    def agregar_plan(self, clave: int, interaccion: Interaccion):
+        self.planes = [p for p in self.planes if p[1].id != interaccion.id]
+        posicion = bisect_right([c for c, _ in self.planes], clave)
+        self.planes.insert(posicion, (clave, interaccion))
+
+    def pagado_hasta(self, clave: Optional[int]) -> Tuple[float, int]:
+        cantidad = len(self.claves) if clave is None else bisect_right(self.claves, clave)
+        return (self.acumulado[cantidad - 1] if cantidad else 0.0), cantidad
+
+    def plan_hasta(self, clave: Optional[int]) -> Optional[Interaccion]:
+        vigente = None
+        for clave_plan, interaccion in self.planes:
+            if clave is not None and clave_plan > clave:
+                break
+            vigente = interaccion
+        return vigente
+
+
+class MotorSaldos:
+    """Saldo de la deuda de cada cliente en cualquier punto en el tiempo.
+
+    Por cliente se guarda la serie de pagos ordenada por timestamp con su suma
+    acumulada, así el saldo a una fecha es `monto_deuda_inicial - acumulado`
+    con una búsqueda binaria en lugar de recorrer la historia. Las
+    renegociaciones (`nuevo_plan_pago`) se guardan como puntos de cambio del
+    plan vigente; no alteran el saldo (cuotas × monto_mensual incluye
+    intereses y no coincide con lo adeudado).
+
+    Para el saldo de todos los clientes a una fecha (`saldos`) las series se
+    compactan en arreglos NumPy estilo CSR, que se reconstruyen solo cuando
+    entra un lote nuevo.
+    """
+
+    def __init__(self):
+        self.series: Dict[str, _SerieCliente] = {}
+        # Clientes con registros nuevos en el grafo desde la última escritura de
+        # saldos (ver `marcar`)
+        self.sucios: set = set()
+        self._compacto: Optional[dict] = None
+
+    def aplicar_lote(self, registros: Iterable[Registro]):
+        for registro in registros:
+            if isinstance(registro, Cliente):
+                self._serie(registro.id).monto_inicial = registro.monto_deuda_inicial or 0.0
+            elif es_pago(registro):
+                self._serie(registro.cliente_id).agregar_pago(
+                    registro.id, a_microsegundos(registro.timestamp), registro.monto
+                )
+            elif registro.nuevo_plan_pago is not None:
+                self._serie(registro.cliente_id).agregar_plan(
+                    a_microsegundos(registro.timestamp), registro
+                )
+            else:
+                continue
+            self._compacto = None
+
+    def aplicar(self, registro: Registro):
+        self.aplicar_lote([registro])
+
+    def marcar(self, registros: Iterable[Registro]):
+        """Marca los clientes cuyo saldo hay que volver a escribir.
+
+        Se llama con lo que se escribió en el grafo, no con lo leído: en una
+        recarga incremental el archivo se lee completo para reconstruir la
+        historia, pero solo cambian los clientes nuevos o modificados y los
+        que tienen pagos o promesas nuevos.
+        """
+        for registro in registros:
+            if isinstance(registro, Cliente):
+                self.sucios.add(registro.id)
+            elif es_pago(registro) or es_promesa(registro):
+                self.sucios.add(registro.cliente_id)
+
+    def _serie(self, cliente_id: str) -> _SerieCliente:
+        serie = self.series.get(cliente_id)
+        if serie is None:
+            serie = self.series[cliente_id] = _SerieCliente()
+        return serie
+
+    def saldo(self, cliente_id: str, as_of: Optional[datetime] = None) -> Optional[dict]:
+        serie = self.series.get(cliente_id)
+        if serie is None:
+            return None
+        clave = None if as_of is None else a_microsegundos(as_of)
+        pagado, pagos = serie.pagado_hasta(clave)
+        plan = serie.plan_hasta(clave)
+        return {
+            "cliente_id": cliente_id,
+            "as_of": None if as_of is None else a_utc(as_of),
+            "monto_inicial": serie.monto_inicial,
+            "total_pagado": pagado,
+            "pagos": pagos,
+            "saldo": max(serie.monto_inicial - pagado, 0.0),
+            "plan_vigente": plan.nuevo_plan_pago if plan else None,
+            "fecha_plan": plan.timestamp if plan else None,
+        }
+
+    def saldos(self, as_of: Optional[datetime] = None) -> Dict[str, float]:
+        """Saldo de todos los clientes a una fecha, vectorizado."""
+        compacto = self._compactar()
+        ids, inicio = compacto["ids"], compacto["inicio"]
+        if as_of is None:
+            cantidad = np.diff(inicio)
+        else:
+            # Cada serie está ordenada, así que los pagos <= as_of de un cliente
+            # son un prefijo de su tramo: basta contarlos
+            hasta = compacto["claves"] <= a_microsegundos(as_of)
+            cantidad = np.bincount(
+                compacto["fila_cliente"][hasta], minlength=len(ids)
+            )
+        pagado = np.zeros(len(ids))
+        if len(compacto["acumulado"]):
+            ultimo = np.maximum(inicio[:-1] + cantidad - 1, 0)
+            pagado = np.where(cantidad > 0, compacto["acumulado"][ultimo], 0.0)
+        saldo = np.maximum(compacto["monto_inicial"] - pagado, 0.0)
+        return dict(zip(ids, saldo.tolist()))
+
+    def _compactar(self) -> dict:
+        if self._compacto is not None:
+            return self._compacto
+        ids = list(self.series)
+        conteos = np.fromiter(
+            (len(self.series[c].claves) for c in ids), dtype=np.int64, count=len(ids)
+        )
+        inicio = np.concatenate(([0], np.cumsum(conteos))).astype(np.int64)
+        total = int(inicio[-1])
+        self._compacto = {
+            "ids": ids,
+            "inicio": inicio,
+            "fila_cliente": np.repeat(np.arange(len(ids)), conteos),
+            "claves": np.fromiter(
+                (c for i in ids for c in self.series[i].claves), dtype=np.int64, count=total
+            ),
+            "acumulado": np.fromiter(
+                (a for i in ids for a in self.series[i].acumulado),
+                dtype=np.float64,
+                count=total,
+            ),
+            "monto_inicial": np.fromiter(
+                (self.series[i].monto_inicial for i in ids), dtype=np.float64, count=len(ids)
+            ),
+        }
+        return self._compacto
+
+    def pendientes(self) -> List[Tuple[str, float]]:
+        """Devuelve y vacía los (cliente_id, saldo actual) que cambiaron."""
+        pendientes = []
+        for cliente_id in self.sucios:
+            serie = self.series.get(cliente_id)
+            if serie is None:
+                continue
+            pagado, _ = serie.pagado_hasta(None)
+            pendientes.append((cliente_id, max(serie.monto_inicial - pagado, 0.0)))
+        self.sucios = set()
+        return pendientes
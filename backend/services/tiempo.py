@@ -0,0 +1,26 @@
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+
+def a_utc(fecha: Optional[datetime]) -> Optional[datetime]:
+    # Las fechas del modelo mezclan timestamps con zona ("...Z") y fechas sin
+    # zona ("YYYY-MM-DD"); las sin zona se interpretan como UTC para poder
+    # compararlas entre sí
+    if fecha is None:
+        return None
+    if fecha.tzinfo is None:
+        return fecha.replace(tzinfo=timezone.utc)
+    return fecha.astimezone(timezone.utc)
+
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def a_microsegundos(fecha: datetime) -> int:
+    # Microsegundos desde epoch (UTC): clave entera para ordenar y buscar
+    delta = a_utc(fecha) - EPOCH
+    return (delta.days * 86400 + delta.seconds) * 1_000_000 + delta.microseconds
+
+
+def de_microsegundos(valor) -> datetime:
+    return EPOCH + timedelta(microseconds=int(valor))
@@ -0,0 +1,251 @@
+import json
+import logging
+import multiprocessing
+import os
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple, Union
+
+from pydantic import TypeAdapter, ValidationError
+
+from models import ClienteEstricto, InteraccionTipada
+from services.metricas import ETAPA_SEGUNDOS, REGISTROS, metricas
+
+logger = logging.getLogger(__name__)
+
+Registro = Union[ClienteEstricto, InteraccionTipada]
+
+INTERACCION = TypeAdapter(InteraccionTipada)
+# Tramos de los arreglos de un documento JSON, validados directo desde el texto
+ARREGLO_CLIENTES = TypeAdapter(List[ClienteEstricto])
+ARREGLO_INTERACCIONES = TypeAdapter(List[InteraccionTipada])
+EXTENSIONES_NDJSON = {".ndjson", ".jsonl"}
+# Bytes por tarea del pool: suficiente para amortizar el arranque de cada tarea
+TAMANO_RANGO = 8 << 20
+
+
+class Rechazos:
+    """Registros inválidos de una lectura: se acumulan en lugar de abortar.
+
+    `ubicacion` es la línea (NDJSON) o la posición en el arreglo del documento
+    JSON. `escribir` guarda el reporte en NDJSON, un rechazo por línea.
+    """
+
+    def __init__(self):
+        self.registros: List[dict] = []
+        self.motivos: Counter = Counter()
+
+    def __len__(self) -> int:
+        return len(self.registros)
+
+    def registrar(self, ubicacion: str, entidad: str, raw_id: Optional[str], errores: List[str]):
+        self.registros.append(
+            {"ubicacion": ubicacion, "entidad": entidad, "id": raw_id, "errores": errores}
+        )
+        self.motivos.update(e.split(":", 1)[0] for e in errores)
+        REGISTROS.inc(etapa="validacion", entidad=entidad, estado="fallido")
+
+    def extender(self, otros: "Rechazos"):
+        self.registros.extend(otros.registros)
+        self.motivos.update(otros.motivos)
+
+    def resumen(self) -> dict:
+        return {"rechazados": len(self.registros), "motivos": dict(self.motivos.most_common(10))}
+
+    def escribir(self, ruta: str):
+        with open(ruta, "w", encoding="utf-8") as f:
+            for rechazo in self.registros:
+                f.write(json.dumps(rechazo, ensure_ascii=False) + "\n")
+
+
+def describir_error(error: Exception) -> List[str]:
+    if isinstance(error, ValidationError):
+        return [
+            f"{'.'.join(str(p) for p in e['loc']) or 'registro'}: {e['msg']}"
+            for e in error.errors(include_url=False, include_input=False)
+        ]
+    return [f"registro: {error}"]
+
+
+def validar_dict(raw: dict) -> Registro:
+    """Valida un registro ya decodificado con el esquema estricto.
+
+    Igual que `validar_registro`, acepta `"registro": "cliente" | "interaccion"`
+    y si falta considera interacción a todo registro con `cliente_id`.
+    """
+    raw = dict(raw)
+    tipo_registro = raw.pop("registro", None)
+    if tipo_registro is None:
+        tipo_registro = "interaccion" if "cliente_id" in raw else "cliente"
+    if tipo_registro == "cliente":
+        return ClienteEstricto.model_validate(raw)
+    if tipo_registro == "interaccion":
+        return INTERACCION.validate_python(raw)
+    raise ValueError(f"Tipo de registro desconocido: {tipo_registro}")
+
+
+def validar_linea(linea: bytes) -> Optional[Registro]:
+    """Valida una línea NDJSON directamente desde los bytes.
+
+    pydantic decodifica y valida en una sola pasada, sin construir el dict
+    intermedio de `json.loads`. Una línea con `cliente_id` es una interacción;
+    las demás (clientes, metadata o líneas con `registro`) se revisan aparte.
+    La metadata devuelve None.
+    """
+    if b'"cliente_id"' in linea:
+        return _validar_interaccion(linea)
+    if b'"registro"' in linea or b'"metadata"' in linea:
+        raw = json.loads(linea)
+        if "metadata" in raw:
+            return None
+        return validar_dict(raw)
+    return _validar_cliente(linea)
+
+
+# Validadores de pydantic-core sin el envoltorio de TypeAdapter / BaseModel
+_validar_interaccion = INTERACCION.validator.validate_json
+_validar_cliente = ClienteEstricto.__pydantic_validator__.validate_json
+
+
+def _id_crudo(linea: bytes) -> Optional[str]:
+    try:
+        raw = json.loads(linea)
+    except ValueError:
+        return None
+    return raw.get("id") if isinstance(raw, dict) else None
+
+
+def _validar_lineas(
+    lineas: Iterable[Tuple[int, bytes]], rechazos: Optional[Rechazos]
+) -> Iterator[Registro]:
+    # `lineas` son pares (número de línea, bytes)
+    medir = metricas.habilitado
+    reloj = time.perf_counter
+    for numero, linea in lineas:
+        if medir:
+            inicio = reloj()
+        try:
+            registro = validar_linea(linea)
+        except ValueError as e:  # ValidationError es un ValueError
+            # Las líneas en blanco se descartan aquí para no revisarlas antes
+            linea = linea.strip()
+            if not linea:
+                continue
+            if rechazos is None:
+                logger.error(f"Error de validación en la línea {numero}: {e}")
+                raise
+            entidad = "interaccion" if b'"cliente_id"' in linea else "cliente"
+            rechazos.registrar(str(numero), entidad, _id_crudo(linea), describir_error(e))
+            continue
+        if registro is not None:
+            if medir:
+                ETAPA_SEGUNDOS.observar(reloj() - inicio, etapa="validacion")
+            yield registro
+
+
+def iterar_ndjson_estricto(
+    path: str,
+    rechazos: Optional[Rechazos] = None,
+    seleccionar: Optional[Callable[[bytes], bool]] = None,
+) -> Iterator[Registro]:
+    """Entrega los registros válidos de un NDJSON en el orden del archivo.
+
+    Sin `rechazos` el primer registro inválido aborta la lectura, como la
+    lectura original; con `rechazos` se anota y se sigue. Parse y validación
+    ocurren juntos, así que se miden como una sola etapa. `seleccionar`
+    descarta líneas antes de validarlas (p. ej. las de otra partición).
+    """
+    with open(path, "rb") as f:
+        lineas = enumerate(f, start=1)
+        if seleccionar is not None:
+            lineas = ((n, linea) for n, linea in lineas if seleccionar(linea))
+        yield from _validar_lineas(lineas, rechazos)
+
+
+def _leer_rango(path: str, inicio: int, fin: int) -> List[bytes]:
+    # Líneas que empiezan en [inicio, fin): si `inicio` cae a mitad de una
+    # línea, ésta pertenece al rango anterior
+    with open(path, "rb") as f:
+        if inicio:
+            f.seek(inicio - 1)
+            if f.read(1) != b"\n":
+                f.readline()
+        desde = f.tell()
+        if desde >= fin:
+            return []
+        datos = f.read(fin - desde)
+        if not datos.endswith(b"\n"):
+            datos += f.readline()
+    lineas = datos.split(b"\n")
+    if not lineas[-1]:
+        lineas.pop()
+    return lineas
+
+
+def _validar_rango(path: str, inicio: int, fin: int) -> Tuple[Counter, int, Rechazos]:
+    # Tarea del pool: solo devuelve conteos y rechazos (con números de línea
+    # relativos al rango); pasar los modelos de vuelta al proceso principal
+    # costaría más que validarlos
+    lineas = _leer_rango(path, inicio, fin)
+    rechazos = Rechazos()
+    conteos: Counter = Counter()
+    for registro in _validar_lineas(enumerate(lineas, start=1), rechazos):
+        conteos[_entidad(registro)] += 1
+    return conteos, len(lineas), rechazos
+
+
+def _entidad(registro: Registro) -> str:
+    return "cliente" if isinstance(registro, ClienteEstricto) else "interaccion"
+
+
+def validar_archivo(
+    path: str, procesos: Optional[int] = None, tamano_rango: int = TAMANO_RANGO
+) -> Tuple[dict, Rechazos]:
+    """Valida el archivo completo con el esquema estricto y devuelve
+    (conteos por entidad, rechazos) sin abortar en el primer error.
+
+    Los NDJSON se parten en rangos de bytes que se validan en paralelo en un
+    pool de `procesos` (por defecto, uno por CPU). Los documentos JSON no se
+    pueden partir sin decodificarlos: se validan en streaming en este proceso,
+    por tramos de texto de cada arreglo (ver `iterar_registros`).
+
+    La carga no usa este pool: valida mientras lee (`iterar_registros`) o
+    reparte lectura y validación con `--particiones`.
+    """
+    from services.data_proceso_lectura import iterar_registros
+
+    rechazos = Rechazos()
+    if Path(path).suffix not in EXTENSIONES_NDJSON:
+        conteos: Counter = Counter()
+        for registro in iterar_registros(path, rechazos=rechazos):
+            conteos[_entidad(registro)] += 1
+        return dict(conteos), rechazos
+
+    tamano = os.path.getsize(path)
+    rangos = [(i, min(i + tamano_rango, tamano)) for i in range(0, tamano, tamano_rango)]
+    procesos = procesos or os.cpu_count() or 1
+    if procesos == 1 or len(rangos) == 1:
+        resultados = [_validar_rango(path, inicio, fin) for inicio, fin in rangos]
+    else:
+        contexto = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=procesos, mp_context=contexto) as pool:
+            resultados = list(
+                pool.map(_validar_rango, [path] * len(rangos), *zip(*rangos))
+            )
+
+        # Los rechazos de los otros procesos no pasaron por sus métricas
+        for resultado in resultados:
+            for rechazo in resultado[2].registros:
+                REGISTROS.inc(etapa="validacion", entidad=rechazo["entidad"], estado="fallido")
+
+    conteos = Counter()
+    desplazamiento = 0
+    for conteo, lineas, parciales in resultados:
+        conteos.update(conteo)
+        for rechazo in parciales.registros:
+            rechazo["ubicacion"] = str(int(rechazo["ubicacion"]) + desplazamiento)
+        rechazos.extender(parciales)
+        desplazamiento += lineas
+    return dict(conteos), rechazos